@@ -0,0 +1,135 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from app.core.index_store import IndexStore
+from app.core.ngram_index import TrigramIndex
+
+# =========================
+# 二进制索引文件
+# =========================
+# 布局（小端）：
+#   magic "KIDX" | version u32 | header_len u64 | header (UTF-8 JSON) | 各数据段（8 字节对齐）
+# header 中记录 meta、扩展名表、根目录表以及段表 {name: [dtype, offset, count]}。
+# 数值列为定长数组，字符串列为「字节堆 + 偏移数组」。
+# 读取时整个文件 mmap 只读映射，各段直接用 np.frombuffer / memoryview 引用，不逐条反序列化；
+# 保存时先写临时文件并 fsync，再 os.replace 原子替换，保存过程中崩溃不会损坏已有索引。
+
+MAGIC = b"KIDX"
+VERSION = 5
+_PREFIX = struct.Struct("<4sIQ")
+_ALIGN = 8
+
+
+class IndexFileError(ValueError):
+    """索引文件格式不正确或版本不兼容。"""
+
+
+def _pad(n):
+    return -n % _ALIGN
+
+
+def _sections(store, indexes):
+    """(段名, dtype, 缓冲区) 列表。"""
+    out = []
+    for attr in IndexStore.NUMERIC_COLUMNS:
+        out.append((f"store.{attr}", getattr(store, attr).values))
+    for attr in IndexStore.STRING_COLUMNS:
+        col = getattr(store, attr)
+        out.append((f"store.{attr}.heap", np.frombuffer(col.heap, dtype=np.uint8)))
+        out.append((f"store.{attr}.offsets", col.offsets))
+    for name, index in indexes.items():
+        arrays = index.to_arrays()
+        out.append((f"{name}.grams_heap", np.frombuffer(arrays["grams_heap"], dtype=np.uint8)))
+        for key in ("grams_offsets", "offsets", "rows"):
+            out.append((f"{name}.{key}", arrays[key]))
+    return out
+
+
+def save(path, meta, store, indexes):
+    """原子保存：写入 path.tmp 后替换 path。indexes 为 {名称: TrigramIndex}。"""
+    sections = _sections(store, indexes)
+
+    table = {}
+    offset = 0
+    for name, arr in sections:
+        arr = np.ascontiguousarray(arr)
+        table[name] = [arr.dtype.str, offset, len(arr)]
+        offset += arr.nbytes + _pad(arr.nbytes)
+
+    header = json.dumps(
+        {"meta": meta, "exts": store.exts, "roots": store.roots, "rows": len(store), "sections": table},
+        ensure_ascii=False,
+    ).encode("utf-8")
+    data_start = _PREFIX.size + len(header)
+    data_start += _pad(data_start)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - _PREFIX.size - len(header)))
+        for _, arr in sections:
+            arr = np.ascontiguousarray(arr)
+            f.write(memoryview(arr).cast("B"))
+            f.write(b"\0" * _pad(arr.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, path)
+
+
+def load(path, index_names=()):
+    """
+    mmap 打开索引文件，返回 (meta, IndexStore, {名称: TrigramIndex})。
+    返回的列直接引用映射内存，修改时才会复制。
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mm) < _PREFIX.size:
+        raise IndexFileError("索引文件不完整")
+    magic, version, header_len = _PREFIX.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise IndexFileError("不是索引文件")
+    if version != VERSION:
+        raise IndexFileError(f"不支持的索引版本: {version}")
+
+    header = json.loads(mm[_PREFIX.size:_PREFIX.size + header_len].decode("utf-8"))
+    data_start = _PREFIX.size + header_len
+    data_start += _pad(data_start)
+
+    view = memoryview(mm)
+
+    def section(name):
+        dtype, offset, count = header["sections"][name]
+        dtype = np.dtype(dtype)
+        start = data_start + offset
+        if start + dtype.itemsize * count > len(mm):
+            raise IndexFileError(f"索引文件段越界: {name}")
+        return np.frombuffer(mm, dtype=dtype, count=count, offset=start)
+
+    def heap(name):
+        _, offset, count = header["sections"][name]
+        start = data_start + offset
+        return view[start:start + count]
+
+    numeric = {attr: section(f"store.{attr}") for attr in IndexStore.NUMERIC_COLUMNS}
+    strings = {
+        attr: (heap(f"store.{attr}.heap"), section(f"store.{attr}.offsets"))
+        for attr in IndexStore.STRING_COLUMNS
+    }
+    store = IndexStore.from_columns(header["exts"], header["roots"], numeric, strings, copy=False)
+
+    indexes = {}
+    for name in index_names:
+        indexes[name] = TrigramIndex.from_arrays({
+            "grams_heap": heap(f"{name}.grams_heap"),
+            "grams_offsets": section(f"{name}.grams_offsets"),
+            "offsets": section(f"{name}.offsets"),
+            "rows": section(f"{name}.rows"),
+        })
+    return header["meta"], store, indexes
@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+
+from app.core.index_watcher import IndexWatcher
+from app.core.sharded_indexer import ShardedIndexer
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# 索引服务（后台初始化）
+# =========================
+# 加载 / 构建索引可能需要几十秒到几分钟，放到后台线程中进行，
+# 服务启动后立即可以接受请求，/health 报告就绪状态。
+# 就绪后（可选，FILE_INDEX_WATCH=1）启动文件系统监听，实时增量更新索引；
+# 只监听显式配置的根目录（FILE_INDEX_ROOTS），不会对默认的盘符 / 挂载点（如 "/"）递归监听整个文件系统。
+# 索引按根目录分片（见 sharded_indexer.py），各盘分别加载 / 构建，可单独重载。
+
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+IDLE = "idle"
+
+
+class IndexNotReady(RuntimeError):
+    """索引仍在加载 / 构建中，或初始化失败。"""
+
+    def __init__(self, status):
+        super().__init__(status["state"])
+        self.status = status
+
+
+class IndexService:
+    def __init__(self, factory=ShardedIndexer, watch=False, **kwargs):
+        self._factory = factory
+        self._kwargs = kwargs
+        self._watch = watch
+        self._lock = threading.Lock()
+        self._thread = None
+        self._ready = threading.Event()
+
+        self.indexer = None
+        self.watcher = None
+        self.state = IDLE
+        self.error = None
+        self.started_at = None
+        self.ready_at = None
+
+    def start(self):
+        """启动后台初始化，重复调用无副作用。"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = WARMING
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="index-init", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            indexer = self._factory(**self._kwargs)
+        except Exception as e:
+            self.error = repr(e)
+            self.state = FAILED
+            logger.error("索引初始化失败：%s", self.error)
+            return
+
+        self.indexer = indexer
+        self.ready_at = time.time()
+        self.state = READY
+        self._ready.set()
+
+        if self._watch:
+            self._start_watcher()
+
+    def _start_watcher(self):
+        roots = self._kwargs.get("roots")
+        if not roots:
+            logger.warning("未配置索引根目录（FILE_INDEX_ROOTS），不启动文件监听")
+            return
+        watcher = IndexWatcher(self.indexer, roots=roots)
+        try:
+            watcher.start()
+        except Exception as e:
+            # 监听失败不影响搜索，只是退化为手动 reload
+            logger.warning("文件监听启动失败：%r", e)
+            return
+        self.watcher = watcher
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def get(self):
+        """返回已就绪的 DiskIndexer，未就绪时抛出 IndexNotReady。"""
+        if self.state != READY:
+            raise IndexNotReady(self.status())
+        return self.indexer
+
+    def status(self):
+        status = {"state": self.state}
+        if self.started_at is not None:
+            end = self.ready_at or time.time()
+            status["elapsed"] = round(end - self.started_at, 3)
+        if self.state == READY:
+            status.update(self.indexer.status())
+        if self.watcher is not None:
+            status["watcher"] = dict(self.watcher.stats)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+def configured_roots():
+    """FILE_INDEX_ROOTS 环境变量（按 os.pathsep 分隔）指定索引根目录，未设置时使用盘符 / 挂载点。"""
+    value = os.environ.get("FILE_INDEX_ROOTS", "")
+    return [r for r in value.split(os.pathsep) if r] or None
+
+
+def configured_watch():
+    """FILE_INDEX_WATCH=1 时监听 FILE_INDEX_ROOTS 下的文件变化，默认关闭。"""
+    return os.environ.get("FILE_INDEX_WATCH", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def configured_cache_bytes():
+    """FILE_INDEX_CACHE_MB 环境变量指定查询结果缓存的内存预算（MB），0 表示关闭，默认 64。"""
+    value = os.environ.get("FILE_INDEX_CACHE_MB", "")
+    try:
+        return int(float(value) * 1024 ** 2) if value else 64 * 1024 ** 2
+    except ValueError:
+        logger.warning("FILE_INDEX_CACHE_MB 无效，使用默认值：%s", value)
+        return 64 * 1024 ** 2
+
+
+def configured_scan_workers():
+    """FILE_INDEX_SCAN_WORKERS 环境变量指定每个分片的扫描线程数，默认 1（见 DiskIndexer.scan_workers）。"""
+    value = os.environ.get("FILE_INDEX_SCAN_WORKERS", "")
+    try:
+        return max(1, int(value)) if value else 1
+    except ValueError:
+        logger.warning("FILE_INDEX_SCAN_WORKERS 无效，使用默认值：%s", value)
+        return 1
+
+
+index_service = IndexService(
+    watch=configured_watch(),
+    roots=configured_roots(),
+    result_cache_bytes=configured_cache_bytes(),
+    scan_workers=configured_scan_workers(),
+)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from app.core.index_store import IndexStore
+from app.core.ngram_index import TrigramIndex
+from app.core.subtree_index import SubtreeIndex
+
+# =========================
+# 索引快照
+# =========================
+# 一代索引 = 存储 + 文件名 / 目录路径 / 拼音三元组索引 + 代数。
+# 快照发布后不再修改：搜索时先取当前快照的引用，整个查询都在这一代上完成，无需加锁；
+# 重建 / 增量更新在 clone() 出的下一代上进行（写时复制），完成后一次赋值替换当前快照。
+# 子树区间 (subtree) 只在范围搜索时用到，每一代首次访问时才构建。
+# 文件名补全表 (suggester) 由 DiskIndexer 在发布快照前设置（见 DiskIndexer._publish）。
+
+
+class IndexSnapshot:
+    __slots__ = ("store", "name_index", "path_index", "pinyin_index", "generation", "suggester", "_subtree")
+
+    def __init__(self, store, name_index, path_index, pinyin_index, generation, suggester=None):
+        self.store = store
+        self.name_index = name_index  # NameLC 三元组索引
+        self.path_index = path_index  # 目录小写路径三元组索引（文件夹模式）
+        self.pinyin_index = pinyin_index  # 含汉字文件名的拼音三元组索引（match=pinyin）
+        self.generation = generation  # 索引每次变化 +1，分页游标据此判断是否失效
+        self.suggester = suggester  # NameSuggester；None 表示尚未构建
+        self._subtree = None
+
+    @property
+    def subtree(self):
+        """先序编号的子树区间；并发读者可能各自构建一次，结果相同，后赋值的覆盖先赋值的。"""
+        if self._subtree is None:
+            self._subtree = SubtreeIndex(self.store)
+        return self._subtree
+
+    @classmethod
+    def empty(cls, generation=0):
+        return cls(IndexStore(), TrigramIndex(), TrigramIndex(), TrigramIndex(), generation)
+
+    @classmethod
+    def from_store(cls, store, generation, suggester=None):
+        """按存储构建三元组索引（跳过已删除的行）。"""
+        rows = np.flatnonzero(store.alive.values)
+
+        name_index = TrigramIndex()
+        for i, name_lc in zip(rows.tolist(), store.names_lc.get_many(rows)):
+            name_index.add(i, name_lc)
+
+        path_index = TrigramIndex()
+        dirs = rows[store.is_dir.values[rows]]
+        for i, path_lc in zip(dirs.tolist(), store.paths_lc.get_many(dirs)):
+            path_index.add(i, path_lc)
+
+        pinyin_index = TrigramIndex()
+        for i, text in zip(rows.tolist(), store.pinyin.get_many(rows)):
+            if text:
+                pinyin_index.add(i, text)
+
+        return cls(store, name_index, path_index, pinyin_index, generation, suggester)
+
+    def clone(self):
+        """下一代的写时复制副本；补全表由发布时按变化的行更新。"""
+        return IndexSnapshot(
+            self.store.clone(),
+            self.name_index.clone(),
+            self.path_index.clone(),
+            self.pinyin_index.clone(),
+            self.generation + 1,
+        )
@@ -0,0 +1,604 @@
+import os
+import re
+
+import numpy as np
+
+from app.core.pinyin import pinyin_text
+from app.core.text_fold import fold
+from app.core.windows_utils import filetime_ticks_to_str
+
+# =========================
+# 列式存储
+# =========================
+# 每个文件不再保存一个 dict，而是按列存放：
+#   数值列 (大小 / 修改时间 / 类型 / 扩展名 id) 使用 NumPy 数组；
+#   字符串列 (文件名 / 规范化文件名 / 目录的规范化路径 / 拼音) 使用连续的 UTF-8 字节堆 + 偏移数组。
+# 查询用的规范化文本 (NFKC + casefold，见 text_fold) 在写入时一次算好，查询时不再逐行转换。
+# 只有在返回结果时才把某一行还原成 dict。
+#
+# 路径按层级存放：每行只记录父目录的行号和自身名称，完整路径在需要时沿父目录链拼出
+# (paths_of)。根目录（盘符 / 挂载点）不占行，记录在 roots 表中，
+# 根目录下的条目的父目录编号为 -1 - 根目录序号。
+# 列数据可以直接引用索引文件的 mmap 只读视图 (见 index_file)，首次写入时才复制到内存。
+#
+# clone() 得到的副本与原存储共享缓冲区（写时复制），用于生成新一代索引快照：
+#   - 修改已有行（更新 / 打墓碑）前先复制整列，原存储看到的数据不变；
+#   - 追加只写入原存储长度之外的位置，原存储按自己的长度读取，同样看不到。
+# 约定同一时刻只有最新的副本会被写入（DiskIndexer 的写锁保证）。
+
+_STR_ENCODING = "utf-8"
+_STR_ERRORS = "surrogatepass"
+_STR_SEP = 0  # "\0" 不会出现在 Windows / POSIX 文件名中，用作行分隔符
+_CONTAINS_CHUNK = 65536  # chunks() 每次拼接的行数，限制临时数组大小
+
+
+class NumericColumn:
+    """可追加的一维 NumPy 列，容量按倍数增长；只读 (mmap) 或共享的数据在首次修改时复制。"""
+
+    __slots__ = ("_buf", "_n", "_shared")
+
+    def __init__(self, dtype, data=None, capacity=1024, copy=True):
+        if data is not None:
+            data = np.asarray(data, dtype=dtype)
+            self._buf = data.copy() if copy else data
+            self._n = len(data)
+        else:
+            self._buf = np.empty(capacity, dtype=dtype)
+            self._n = 0
+        self._shared = False
+
+    def clone(self):
+        """共享缓冲区的副本，修改已有数据时才复制。"""
+        col = NumericColumn.__new__(NumericColumn)
+        col._buf = self._buf
+        col._n = self._n
+        col._shared = True
+        return col
+
+    def __len__(self):
+        return self._n
+
+    def _grow(self, need):
+        cap = max(need, len(self._buf) * 2, 1024)
+        buf = np.empty(cap, dtype=self._buf.dtype)
+        buf[:self._n] = self._buf[:self._n]
+        self._buf = buf
+        self._shared = False
+
+    def append(self, value):
+        if self._n == len(self._buf) or not self._buf.flags.writeable:
+            self._grow(self._n + 1)
+        self._buf[self._n] = value
+        self._n += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._buf.dtype)
+        end = self._n + len(values)
+        if end > len(self._buf) or not self._buf.flags.writeable:
+            self._grow(end)
+        self._buf[self._n:end] = values
+        self._n = end
+
+    def __getitem__(self, i):
+        return self._buf[:self._n][i]
+
+    def __setitem__(self, i, value):
+        if self._shared or not self._buf.flags.writeable:
+            self._buf = self._buf[:self._n].copy()
+            self._shared = False
+        self._buf[:self._n][i] = value
+
+    @property
+    def values(self):
+        """当前有效数据的视图（不拷贝）。"""
+        return self._buf[:self._n]
+
+    def materialize(self):
+        """把只读 (mmap) 数据复制到内存。"""
+        if not self._buf.flags.writeable:
+            self._buf = self._buf[:self._n].copy()
+
+
+class StringColumn:
+    """
+    紧凑字符串列：所有字符串以 UTF-8 编码后连续存放在一个字节堆中，
+    每行以 \\0 结尾，offsets[i] 为第 i 行的起始位置。
+    字节堆可以是 bytearray，也可以是 mmap 的只读 memoryview（首次追加时复制为 bytearray）。
+    bytearray 堆像 NumericColumn 一样预留容量：offsets[-1] 之后的字节是尚未使用的空间。
+    字节堆可能与已发布的快照共享、正被搜索线程读取（正则 / np.frombuffer 持有其缓冲区导出），
+    因此从不原地改变它的大小（那会抛出 BufferError）：追加只做等长写入，容量不足时换一个新的字节堆。
+    """
+
+    __slots__ = ("_heap", "_offsets")
+
+    def __init__(self, heap=None, offsets=None, copy=True):
+        if heap is None:
+            self._heap = bytearray()
+            self._offsets = NumericColumn(np.int64)
+            self._offsets.append(0)
+        else:
+            self._heap = bytearray(heap) if copy else heap
+            self._offsets = NumericColumn(np.int64, offsets, copy=copy)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _grow(self, end, need):
+        # 换一个更大的字节堆；旧堆原样留给仍在读取它的快照
+        heap = bytearray(max(need, len(self._heap) * 2, 4096))
+        heap[:end] = self._heap[:end]
+        self._heap = heap
+        return heap
+
+    def append(self, s):
+        data = s.encode(_STR_ENCODING, _STR_ERRORS) + b"\0"
+        end = int(self._offsets.values[-1])
+        new_end = end + len(data)
+        heap = self._heap
+        if new_end > len(heap) or not isinstance(heap, bytearray):
+            heap = self._grow(end, new_end)
+        # 等长写入已发布范围之外的空闲容量，不改变字节堆大小；共享该堆的快照只读到自己的 offsets[-1] 为止。
+        # 被放弃的副本写入的数据会被下一个副本覆盖
+        heap[end:new_end] = data
+        self._offsets.append(new_end)
+
+    def __getitem__(self, i):
+        offs = self._offsets.values
+        return str(self._heap[offs[i]:offs[i + 1] - 1], _STR_ENCODING, _STR_ERRORS)
+
+    def get_many(self, rows):
+        """批量读取多行，比逐行 __getitem__ 少一次 NumPy 标量转换。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        offs = self._offsets.values
+        heap = self._heap
+        return [
+            str(heap[s:e - 1], _STR_ENCODING, _STR_ERRORS)
+            for s, e in zip(offs[rows].tolist(), offs[rows + 1].tolist())
+        ]
+
+    def chunks(self, rows):
+        """
+        按块产出 (块起始下标, 字节, 各行结束位置)：字节为这些行的 UTF-8 内容连同 \\0 分隔符拼成的一段，
+        第 i 行位于 [ends[i-1], ends[i]) 且以 \\0 结尾。每块不超过 _CONTAINS_CHUNK 行，限制临时数组大小。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        offs = self._offsets.values
+        # 只看已发布的部分：其后的空闲容量可能正被写入方的副本写入
+        heap = np.frombuffer(self._heap, dtype=np.uint8, count=int(offs[-1]))
+        for lo in range(0, len(rows), _CONTAINS_CHUNK):
+            chunk = rows[lo:lo + _CONTAINS_CHUNK]
+            starts = offs[chunk]
+            lens = offs[chunk + 1] - starts
+            ends = np.cumsum(lens)
+            idx = np.repeat(starts - (ends - lens), lens)
+            idx += np.arange(int(ends[-1]))
+            yield lo, heap[idx].tobytes(), ends
+
+    def contains(self, rows, sub):
+        """
+        各行是否包含子串 sub（rows 与结果一一对应）。
+        直接在 UTF-8 字节上查找，不解码成 str：用正则一次找出所有命中位置，再换算成行。
+        rows 占了字节堆的大部分时直接在整个堆上查找，省去拼接；否则只拼接这些行。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        pattern = re.compile(re.escape(sub.encode(_STR_ENCODING, _STR_ERRORS)))
+        offs = self._offsets.values
+        end = int(offs[-1])
+        if int((offs[rows + 1] - offs[rows]).sum()) * 2 > end:
+            # 在已发布部分的只读视图上查找：写入方只会写 end 之后的空闲容量或换新堆，这段字节不会变
+            heap = memoryview(self._heap)[:end].toreadonly()
+            hits = np.fromiter((m.start() for m in pattern.finditer(heap)), dtype=np.int64)
+            found = np.zeros(len(self), dtype=np.bool_)
+            found[np.searchsorted(offs, hits, side="right") - 1] = True
+            return found[rows]
+
+        mask = np.zeros(len(rows), dtype=np.bool_)
+        for lo, buf, ends in self.chunks(rows):
+            hits = np.fromiter((m.start() for m in pattern.finditer(buf)), dtype=np.int64)
+            mask[lo + np.searchsorted(ends, hits, side="right")] = True
+        return mask
+
+    def take(self, rows):
+        """按行号抽取子集，返回新的 StringColumn：字节按块用 chunks() 的花式索引拼接，不逐行复制。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        offs = self._offsets.values
+        heap = bytearray().join(buf for _, buf, _ in self.chunks(rows))
+        offsets = np.concatenate([[0], np.cumsum(offs[rows + 1] - offs[rows])]).astype(np.int64)
+        return StringColumn(heap, offsets, copy=False)
+
+    def clone(self):
+        """共享字节堆的副本：只会写入原列 offsets[-1] 之后的空闲容量或换新堆，原列读取的字节不变。"""
+        col = StringColumn.__new__(StringColumn)
+        col._heap = self._heap
+        col._offsets = self._offsets.clone()
+        return col
+
+    def materialize(self):
+        if not isinstance(self._heap, bytearray):
+            self._heap = bytearray(self._heap)
+        self._offsets.materialize()
+
+    @property
+    def heap(self):
+        """已使用部分的字节堆（不含预留容量）。"""
+        return memoryview(self._heap)[:int(self._offsets.values[-1])]
+
+    @property
+    def offsets(self):
+        return self._offsets.values
+
+    @property
+    def nbytes(self):
+        return len(self._heap) + self._offsets.values.nbytes
+
+
+class IndexStore:
+    """
+    DiskIndexer 的列式索引存储。
+    行号即文件在存储中的位置。删除只打墓碑标记 (alive=False)，
+    compact 时才整体压缩并重新编号。
+    """
+
+    def __init__(self):
+        self.size = NumericColumn(np.int64)
+        self.mtime = NumericColumn(np.int64)  # FILETIME (100ns, 1601 纪元)
+        self.is_dir = NumericColumn(np.bool_)
+        self.ext_id = NumericColumn(np.int32)
+        self.alive = NumericColumn(np.bool_)
+        self.parent = NumericColumn(np.int32)  # 父目录的行号；根目录下的条目为 -1 - 根目录序号
+        self.scan_mtime = NumericColumn(np.int64)  # 目录上次被列出时的修改时间，0 表示未知
+
+        self.names = StringColumn()
+        self.names_lc = StringColumn()  # 规范化 (NFKC + casefold) 的文件名
+        self.paths_lc = StringColumn()  # 目录的规范化完整路径（文件夹模式匹配用），文件为空
+        self.pinyin = StringColumn()  # 含汉字的文件名的「全拼 \x01 首字母」，其余为空（见 pinyin）
+
+        # 扩展名字典表：ext_id -> ext
+        self.exts = [""]
+        self._ext_ids = {"": 0}
+        self.ext_categories = None  # (type_map, 分类查找表) 的缓存，见 search_filter.category_lut
+
+        # 根目录表：根目录序号 -> 路径
+        self.roots = []
+        self._root_ids = {}
+
+    def __len__(self):
+        return len(self.size)
+
+    @property
+    def live_count(self):
+        return int(np.count_nonzero(self.alive.values))
+
+    @property
+    def dead_count(self):
+        """已打墓碑、尚未压缩掉的行数。"""
+        return len(self) - self.live_count
+
+    # =========================
+    # 写入
+    # =========================
+    def ext_to_id(self, ext):
+        eid = self._ext_ids.get(ext)
+        if eid is None:
+            eid = len(self.exts)
+            self.exts.append(ext)
+            self._ext_ids[ext] = eid
+        return eid
+
+    def root_node(self, root):
+        """根目录作为父目录时的编号 (-1 - 根目录序号)，不存在时登记。"""
+        rid = self._root_ids.get(root)
+        if rid is None:
+            rid = len(self.roots)
+            self.roots.append(root)
+            self._root_ids[root] = rid
+        return -1 - rid
+
+    def append(self, name, is_dir, size, mtime, parent):
+        ext = "" if is_dir else os.path.splitext(name)[1].lower()
+
+        row = len(self.size)
+        self.size.append(0 if is_dir else size)
+        self.mtime.append(mtime)
+        self.is_dir.append(is_dir)
+        self.ext_id.append(self.ext_to_id(ext))
+        self.alive.append(True)
+        self.parent.append(parent)
+        self.scan_mtime.append(0)
+
+        name_lc = fold(name)
+        self.names.append(name)
+        self.names_lc.append(name_lc)
+        self.paths_lc.append(join_path(self._folded_path(parent), name_lc) if is_dir else "")
+        self.pinyin.append(pinyin_text(name))
+        return row
+
+    def _folded_path(self, node):
+        """目录（或根目录编号）的规范化路径。"""
+        return self.paths_lc[node] if node >= 0 else fold(self.roots[-1 - node])
+
+    def update(self, row, size, mtime):
+        if not self.is_dir[row]:
+            self.size[row] = size
+        self.mtime[row] = mtime
+
+    def delete_many(self, rows):
+        """批量打墓碑（O(删除行数)），行号保持不变。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            self.alive[rows] = False
+
+    def fingerprint(self, row):
+        return int(self.size[row]), int(self.mtime[row])
+
+    def take(self, rows):
+        """
+        按行号抽取子集（用于删除后的压缩），返回新的 IndexStore；父目录行号随之重新映射。
+        上级目录不在子集中的行无法还原路径，一并去掉。
+        """
+        parent = self.parent.values
+        keep = np.zeros(len(self), dtype=np.bool_)
+        keep[np.asarray(rows, dtype=np.int64)] = True
+        while True:
+            orphan = keep & (parent >= 0) & ~keep[np.maximum(parent, 0)]
+            if not orphan.any():
+                break
+            keep &= ~orphan
+        rows = np.flatnonzero(keep)
+
+        store = IndexStore()
+        for attr in self.NUMERIC_COLUMNS:
+            col = getattr(self, attr)
+            setattr(store, attr, NumericColumn(col.values.dtype, col.values[rows]))
+        for attr in self.STRING_COLUMNS:
+            setattr(store, attr, getattr(self, attr).take(rows))
+
+        # 旧行号 -> 新行号；根目录编号（负数）保持不变
+        remap = np.zeros(len(self), dtype=np.int32)
+        remap[rows] = np.arange(len(rows), dtype=np.int32)
+        parent = store.parent.values
+        store.parent = NumericColumn(np.int32, np.where(parent >= 0, remap[np.maximum(parent, 0)], parent))
+
+        store._copy_tables(self)
+        return store
+
+    def _copy_tables(self, other):
+        self.exts = list(other.exts)
+        self._ext_ids = dict(other._ext_ids)
+        self.ext_categories = other.ext_categories
+        self.roots = list(other.roots)
+        self._root_ids = dict(other._root_ids)
+
+    def clone(self):
+        """写时复制的副本，用于在不影响读者的前提下生成新一代索引。"""
+        store = IndexStore.__new__(IndexStore)
+        for attr in self.NUMERIC_COLUMNS:
+            setattr(store, attr, getattr(self, attr).clone())
+        for attr in self.STRING_COLUMNS:
+            setattr(store, attr, getattr(self, attr).clone())
+        store._copy_tables(self)
+        return store
+
+    def compact(self):
+        return self.take(np.flatnonzero(self.alive.values))
+
+    def child_lists(self):
+        """
+        按父目录分组的存活行：返回 (rows, bounds)，
+        行号为 d 的目录的子项为 rows[bounds[d]:bounds[d + 1]]。
+        """
+        live = np.flatnonzero(self.alive.values)
+        parents = self.parent.values[live]
+        order = np.argsort(parents, kind="stable")
+        bounds = np.searchsorted(parents[order], np.arange(len(self) + 1))
+        return live[order], bounds
+
+    def depth_of(self, rows):
+        """各行的目录深度：根目录下的条目为 0（沿父目录链向上，按层向量化）。"""
+        parent = self.parent.values
+        node = parent[np.asarray(rows, dtype=np.int64)].astype(np.int64)
+        depth = np.zeros(len(node), dtype=np.int32)
+        up = node >= 0
+        while up.any():
+            depth[up] += 1
+            node[up] = parent[node[up]]
+            up = node >= 0
+        return depth
+
+    def root_of(self, rows):
+        """各行所在根目录的序号（沿父目录链向上，按层向量化）。"""
+        parent = self.parent.values
+        node = parent[np.asarray(rows, dtype=np.int64)].astype(np.int64)
+        up = node >= 0
+        while up.any():
+            node[up] = parent[node[up]]
+            up = node >= 0
+        return -1 - node
+
+    # =========================
+    # 路径
+    # =========================
+    def paths_of(self, rows, cache=None):
+        """
+        沿父目录链拼出完整路径；同一批中共享的上级目录只拼接一次。
+        cache 为 {目录行号: 以分隔符结尾的路径前缀}，分批调用时传入同一个 dict，之前拼过的上级目录不再处理。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        parent = self.parent.values
+        parents = parent[rows]
+        cache = {} if cache is None else cache
+
+        def pending(nodes):
+            nodes = np.unique(nodes[nodes >= 0])
+            if cache:
+                nodes = nodes[np.fromiter((n not in cache for n in nodes.tolist()), dtype=np.bool_, count=len(nodes))]
+            return nodes
+
+        # 按层向上收集所有用到的上级目录，名称一次性解码
+        marked = np.zeros(len(self), dtype=np.bool_)
+        level = pending(parents)
+        while len(level):
+            level = level[~marked[level]]
+            marked[level] = True
+            level = pending(parent[level])
+        dirs = np.flatnonzero(marked)
+        dir_names = dict(zip(dirs.tolist(), self.names.get_many(dirs)))
+
+        def prefix(node):
+            chain = []
+            while node >= 0 and node not in cache:
+                chain.append(node)
+                node = int(parent[node])
+            path = cache[node] if node >= 0 else self.roots[-1 - node]
+            if node < 0 and not path.endswith(("/", "\\")):
+                path += path_sep(path)
+            for d in reversed(chain):
+                path = cache[d] = path + dir_names[d] + path_sep(path)
+            return path
+
+        prefixes = {p: prefix(p) for p in np.unique(parents).tolist()}
+        return [prefixes[p] + name for p, name in zip(parents.tolist(), self.names.get_many(rows))]
+
+    def path(self, row):
+        return self.paths_of([row])[0]
+
+    # =========================
+    # 读取
+    # =========================
+    def record(self, row):
+        """把一行还原为与旧版 dict 结构一致的记录。"""
+        return self.records([row])[0]
+
+    def records(self, rows, path_cache=None):
+        """批量还原多行，列数据一次性取出后再组装 dict；path_cache 见 paths_of。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        exts = self.exts
+        out = []
+        append = out.append
+        for is_dir, name, name_lc, eid, path, size, ts in zip(
+                self.is_dir.values[rows].tolist(),
+                self.names.get_many(rows),
+                self.names_lc.get_many(rows),
+                self.ext_id.values[rows].tolist(),
+                self.paths_of(rows, path_cache),
+                self.size.values[rows].tolist(),
+                self.mtime.values[rows].tolist(),
+        ):
+            append({
+                "Type": "DIR" if is_dir else "FILE",
+                "Name": name,
+                "NameLC": name_lc,
+                "Ext": exts[eid],
+                "Path": path,
+                "RawSize": size,
+                "UpdateTime": filetime_ticks_to_str(ts),
+                "UpdateTS": ts,
+                "FP": (size, ts),
+            })
+        return out
+
+    @property
+    def nbytes(self):
+        total = 0
+        for attr in self.NUMERIC_COLUMNS:
+            total += getattr(self, attr).values.nbytes
+        for attr in self.STRING_COLUMNS:
+            total += getattr(self, attr).nbytes
+        return total
+
+    def materialize(self):
+        """把引用索引文件映射内存的列全部复制到内存（之后可以替换 / 删除该文件）。"""
+        for attr in self.NUMERIC_COLUMNS:
+            getattr(self, attr).materialize()
+        for attr in self.STRING_COLUMNS:
+            getattr(self, attr).materialize()
+
+    # =========================
+    # 序列化
+    # =========================
+    NUMERIC_COLUMNS = {
+        "size": np.int64,
+        "mtime": np.int64,
+        "is_dir": np.bool_,
+        "ext_id": np.int32,
+        "alive": np.bool_,
+        "parent": np.int32,
+        "scan_mtime": np.int64,
+    }
+    STRING_COLUMNS = ("names", "names_lc", "paths_lc", "pinyin")
+
+    @classmethod
+    def from_columns(cls, exts, roots, numeric, strings, copy=False):
+        """
+        由列数据组装存储。
+        numeric: {列名: 一维数组}；strings: {列名: (字节堆, 偏移数组)}；
+        copy=False 时直接引用传入的缓冲区（例如 mmap），写入时才复制。
+        """
+        store = cls()
+        for attr, dtype in cls.NUMERIC_COLUMNS.items():
+            setattr(store, attr, NumericColumn(dtype, numeric[attr], copy=copy))
+        for attr in cls.STRING_COLUMNS:
+            heap, offsets = strings[attr]
+            setattr(store, attr, StringColumn(heap, offsets, copy=copy))
+        store.exts = list(exts)
+        store._ext_ids = {e: i for i, e in enumerate(store.exts)}
+        store.roots = list(roots)
+        store._root_ids = {r: i for i, r in enumerate(store.roots)}
+        return store
+
+    @classmethod
+    def from_records(cls, records):
+        """从旧版 list[dict] 索引迁移；路径中没有对应记录的上级目录会补建为目录行。"""
+        store = cls()
+        dirs = {}  # 目录路径 -> 行号
+
+        def node_of(path):
+            node = dirs.get(path)
+            if node is not None:
+                return node
+            head, name = split_path(path)
+            if not name:
+                return store.root_node(path)
+            node = dirs[path] = store.append(name, True, 0, 0, node_of(head))
+            return node
+
+        for f in records:
+            path = f["Path"]
+            is_dir = f["Type"] == "DIR"
+            if is_dir and path in dirs:
+                continue
+            head, name = split_path(path)
+            row = store.append(name, is_dir, f.get("RawSize", 0), f.get("UpdateTS", 0), node_of(head))
+            if is_dir:
+                dirs[path] = row
+        return store
+
+
+# =========================
+# 路径拼接
+# =========================
+# 与 os.path.join 一致；以反斜杠分隔的路径（Windows 盘符路径）在其他平台上同样按反斜杠处理，
+# 使迁移旧索引、跨平台测试时拼出的路径与原路径相同。
+def path_sep(path):
+    if os.sep in path or "\\" not in path:
+        return os.sep
+    return "\\"
+
+
+def join_path(base, name):
+    if base.endswith(("/", "\\")):
+        return base + name
+    return base + path_sep(base) + name
+
+
+def split_path(path):
+    """(上级目录, 名称)；path 为根目录时名称为空。"""
+    sep = path_sep(path)
+    trimmed = path.rstrip(sep)
+    i = trimmed.rfind(sep)
+    if i < 0:
+        return path, ""
+    head = trimmed[:i]
+    if not head or head.endswith(":"):
+        head += sep  # "/" 或 "C:\\"
+    return head, trimmed[i + 1:]
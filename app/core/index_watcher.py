@@ -0,0 +1,245 @@
+import logging
+import os
+import stat
+import threading
+import time
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from app.core.windows_utils import unix_ns_to_filetime
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# 文件系统监听（实时增量更新）
+# =========================
+# watchdog 事件先按路径合并到 pending 中（同一路径只保留最后一次操作），
+# 事件停止到达 debounce 秒后（或距第一条事件超过 max_delay 秒）一次性应用到 DiskIndexer。
+# 每批只 stat 发生变化的路径，代价与变化数成正比，而不是重新扫描整个磁盘。
+# 应用后的变化最多每 save_interval 秒写入一次索引文件（indexer.save），停止监听时再写入一次，
+# 重启服务后不会丢失，也不会每批都重写整个索引文件。
+
+UPSERT = "upsert"  # 新增或修改：stat 后写入
+RESCAN = "rescan"  # 新建 / 移入的目录：连同子树一起写入
+DELETE = "delete"  # 删除 / 移出：目录连同子树一起删除
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        super().__init__()
+        self._watcher = watcher
+
+    def on_any_event(self, event):
+        self._watcher.dispatch(event)
+
+
+class IndexWatcher:
+    def __init__(
+            self, indexer, roots=None, debounce=0.5, max_delay=5.0, save_interval=30.0, observer_factory=Observer,
+    ):
+        self.indexer = indexer
+        self.roots = [os.path.abspath(r) for r in (roots or indexer.meta.get("drives") or [])]
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.save_interval = save_interval
+
+        self._observer_factory = observer_factory
+        self._observer = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+
+        self._pending = {}  # Path -> (操作, 是否目录)
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._unsaved = False  # 已应用到索引、尚未写入索引文件
+        self._saved_at = time.monotonic()
+
+        self.stats = {"events": 0, "batches": 0, "added": 0, "updated": 0, "removed": 0, "saves": 0}
+
+    # =========================
+    # 启停
+    # =========================
+    def start(self):
+        if self._observer is not None:
+            return
+        observer = self._observer_factory()
+        handler = _EventHandler(self)
+        for root in self.roots:
+            observer.schedule(handler, root, recursive=True)
+        observer.start()
+        self._observer = observer
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, flush=True):
+        """停止监听；flush 时先应用尚未处理的事件。已应用的变化总会写入索引文件。"""
+        if self._observer is None:
+            return
+        self._observer.stop()
+        self._observer.join()
+        self._observer = None
+
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        if flush:
+            self.flush()
+        self.save(force=True)
+
+    # =========================
+    # 事件收集
+    # =========================
+    def dispatch(self, event):
+        if event.event_type == "moved":
+            self._push(event.src_path, DELETE, event.is_directory)
+            self._push(event.dest_path, RESCAN if event.is_directory else UPSERT, event.is_directory)
+        elif event.event_type == "deleted":
+            self._push(event.src_path, DELETE, event.is_directory)
+        elif event.event_type == "created":
+            self._push(event.src_path, RESCAN if event.is_directory else UPSERT, event.is_directory)
+        elif event.event_type in ("modified", "closed"):
+            self._push(event.src_path, UPSERT, event.is_directory)
+
+    def _push(self, path, op, is_dir):
+        path = os.fsdecode(path)
+        if self._skipped(path, is_dir):
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            old = self._pending.get(path)
+            # 目录的 modified 不能覆盖尚未处理的 rescan
+            if not (old and old[0] == RESCAN and op == UPSERT):
+                self._pending[path] = (op, is_dir)
+            if not self._wake.is_set():
+                self._first_event = now
+            self._last_event = now
+            self.stats["events"] += 1
+        self._wake.set()
+
+    def _skipped(self, path, is_dir):
+        """与全量扫描保持一致：位于 skip_dirs 目录下，或本身就是 skip_dirs 目录。"""
+        root = next((r for r in self.roots if path == r or path.startswith(r.rstrip(os.sep) + os.sep)), None)
+        if root is None or path == root:
+            return True
+
+        parts = os.path.relpath(path, root).lower().split(os.sep)
+        if not is_dir:
+            parts = parts[:-1]
+        skip_dirs = self.indexer.skip_dirs
+        return any(p in skip_dirs for p in parts)
+
+    # =========================
+    # 批量应用
+    # =========================
+    def _loop(self):
+        while not self._stop.is_set():
+            if not self._wake.wait(timeout=1.0):
+                self._save_quietly()
+                continue
+
+            # 防抖：等事件停下来，或者积压超过 max_delay
+            while not self._stop.is_set():
+                now = time.monotonic()
+                with self._lock:
+                    quiet = now - self._last_event
+                    waited = now - self._first_event
+                if quiet >= self.debounce or waited >= self.max_delay:
+                    break
+                # 用 _stop 等待而不是 sleep：stop() 不必等完整个防抖时间
+                self._stop.wait(min(self.debounce - quiet, self.max_delay - waited))
+
+            if not self._stop.is_set():
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("索引实时更新失败")
+                self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception:
+            logger.exception("保存索引失败")
+
+    def save(self, force=False):
+        """距上次保存超过 save_interval 秒（或 force）且有已应用的变化时写入索引文件，返回是否写入。"""
+        with self._apply_lock:
+            if not self._unsaved:
+                return False
+            if not force and time.monotonic() - self._saved_at < self.save_interval:
+                return False
+            self.indexer.save()
+            self._unsaved = False
+            self._saved_at = time.monotonic()
+            self.stats["saves"] += 1
+            return True
+
+    def flush(self):
+        """立即应用所有待处理的变化，返回本批统计。"""
+        with self._apply_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._wake.clear()
+            if not pending:
+                return {"added": 0, "updated": 0, "removed": 0}
+
+            upserts, deletes = [], []
+            for path, (op, _) in pending.items():
+                if op == DELETE:
+                    deletes.append(path)
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    deletes.append(path)
+                    continue
+                is_dir = stat.S_ISDIR(st.st_mode)
+                upserts.append(self._entry(path, is_dir, st))
+                if op == RESCAN and is_dir:
+                    upserts.extend(self._walk(path))
+
+            result = self.indexer.apply_changes(upserts, deletes, self.roots)
+
+            self.stats["batches"] += 1
+            for k, v in result.items():
+                self.stats[k] += v
+            if any(result.values()):
+                self._unsaved = True
+            return result
+
+    @staticmethod
+    def _entry(path, is_dir, st):
+        return path, is_dir, 0 if is_dir else st.st_size, unix_ns_to_filetime(st.st_mtime_ns)
+
+    def _walk(self, root):
+        """新建 / 移入的目录：递归收集子树（跳过 skip_dirs）。"""
+        skip_dirs = self.indexer.skip_dirs
+        out = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                it = os.scandir(path)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir and entry.name.lower() in skip_dirs:
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    out.append(self._entry(entry.path, is_dir, st))
+                    if is_dir:
+                        stack.append(entry.path)
+        return out
@@ -0,0 +1,143 @@
+import json
+import threading
+
+from collections import OrderedDict
+
+from app.core.windows_utils import format_size
+
+# =========================
+# 预序列化的 JSON 记录
+# =========================
+# 大结果集的响应耗时主要花在 FastAPI 对每个 dict 做 jsonable_encoder + json.dumps 上。
+# 这里把每条记录（按字段投影后）序列化成一段 JSON 字节并缓存，响应时直接拼接成 "[a,b,...]"，
+# 用原始 Response 返回，不再构造 dict，也不经过 jsonable_encoder。
+# 缓存项属于某一代索引（行号与列值只在同一代内有效），发现代数变化时整体清空；按 LRU 淘汰，
+# 总大小不超过 max_bytes。
+
+# 记录的全部字段（与 IndexStore.records 一致），外加格式化后的大小 Size
+RECORD_FIELDS = ("Type", "Name", "NameLC", "Ext", "Path", "RawSize", "UpdateTime", "UpdateTS", "FP")
+FIELDS = RECORD_FIELDS + ("Size",)
+
+# 每项除片段本身外的估算开销（键、OrderedDict 节点等）
+_ENTRY_OVERHEAD = 160
+
+
+def parse_fields(text):
+    """逗号分隔的字段列表 -> 字段元组（去重、保持顺序）；为空时返回全部记录字段，含未知字段时抛出 ValueError。"""
+    if not text:
+        return RECORD_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in text.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段: {', '.join(unknown)}，可选: {', '.join(FIELDS)}")
+    return fields or RECORD_FIELDS
+
+
+def _dumps(obj):
+    try:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except UnicodeEncodeError:
+        # 文件名中不成对的代理字符无法编码为 UTF-8，转义输出
+        return json.dumps(obj, separators=(",", ":")).encode("ascii")
+
+
+def encode_record(record, fields):
+    item = {}
+    for f in fields:
+        item[f] = format_size(record["RawSize"]) if f == "Size" else record[f]
+    return _dumps(item)
+
+
+class RowFragments:
+    def __init__(self, max_bytes=32 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # (字段, 行号) -> JSON 片段
+        self._generation = None
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._items.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def encode(self, store, generation, rows, fields=RECORD_FIELDS, path_cache=None, keep=True):
+        """
+        rows 各行的 JSON 片段（与 rows 一一对应）；未缓存的行批量还原后序列化。
+        keep=False 时新序列化的片段不放入缓存（流式输出整个结果集时避免挤掉常用的分页结果）。
+        """
+        rows = [int(r) for r in rows]
+        out = [None] * len(rows)
+        with self._lock:
+            # 只读当前这一代的缓存；旧快照上的请求（例如索引更新前开始的流式输出）不清空新一代的缓存
+            if generation == self._generation:
+                items = self._items
+                for i, row in enumerate(rows):
+                    frag = items.get((fields, row))
+                    if frag is not None:
+                        items.move_to_end((fields, row))
+                        out[i] = frag
+        missing = [i for i, frag in enumerate(out) if frag is None]
+        if not missing:
+            with self._lock:
+                self.hits += len(rows)
+            return out
+
+        records = store.records([rows[i] for i in missing], path_cache)
+        for i, record in zip(missing, records):
+            out[i] = encode_record(record, fields)
+
+        with self._lock:
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+            # 编码期间索引已更新，片段属于旧的一代，不再缓存
+            if not keep or self._generation is not None and generation < self._generation:
+                return out
+            self._check_generation(generation)
+            for i in missing:
+                key = (fields, rows[i])
+                if key not in self._items:
+                    self._items[key] = out[i]
+                    self._bytes += len(out[i]) + _ENTRY_OVERHEAD
+            while self._bytes > self.max_bytes and self._items:
+                _, frag = self._items.popitem(last=False)
+                self._bytes -= len(frag) + _ENTRY_OVERHEAD
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def json_array(fragments):
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def json_page(fragments, total, next_cursor, generation, truncated=False):
+    """与 search_page 返回的 dict 结构相同的 JSON 字节。"""
+    return (
+        b'{"items":' + json_array(fragments)
+        + b',"total":' + str(int(total)).encode("ascii")
+        + b',"next_cursor":' + _dumps(next_cursor)
+        + b',"generation":' + str(int(generation)).encode("ascii")
+        + b',"truncated":' + (b"true" if truncated else b"false")
+        + b"}"
+    )
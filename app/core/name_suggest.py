@@ -0,0 +1,257 @@
+from bisect import bisect_left
+from heapq import merge
+
+import numpy as np
+
+from app.core.text_fold import fold
+from app.core.windows_utils import filetime_ticks_to_str
+
+# =========================
+# 文件名前缀补全
+# =========================
+# 把所有存活条目的小写文件名去重、排序成一个数组，同时记录每个名称出现的次数和最近的修改时间。
+# 以某个前缀开头的名称在数组中是连续的一段，两次二分即可定位 [lo, hi)。
+#
+# 区间较小时（<= HEAVY_ROWS）直接在区间内取 top-N；区间很大的前缀（例如单个字母）
+# 在构建时预先算好前 MAX_LIMIT 名，查询时直接查表，因此任何前缀都只需要微秒级。
+# 大区间前缀按长度逐层找出：排序数组中相邻名称的公共前缀长度 (LCP) < l 的位置
+# 就是长度为 l 的前缀分组的边界。
+#
+# 补全表随索引快照一起发布（见 DiskIndexer._publish），查询时不再构建。
+# 索引增量更新时不重建整张表：变化的名称重新统计后记入增量 (overlay)，覆盖基础表中的同名条目，
+# updated() 返回共享基础数组的新表（写时复制，旧快照的表不变）。查询时基础表中被覆盖的条目
+# 最多有「区间内被覆盖的名称数」个，多取这么多名再去掉它们，与增量合并后仍是准确的前 N 名。
+# 增量超过 OVERLAY_MAX 个名称时整体重建。
+
+HEAVY_ROWS = 2048
+MAX_LIMIT = 50
+LCP_WIDTH = 32  # 预计算覆盖的最长前缀；更长的前缀区间极少超过 HEAVY_ROWS，超过时直接计算
+_LCP_CHUNK = 65536
+
+OVERLAY_MAX = 4096
+
+RANKS = ("frequency", "recency")
+
+
+def _lcp(names, width):
+    """相邻名称的公共前缀长度（上限 width），lcp[0] = -1。"""
+    n = len(names)
+    lcp = np.empty(n, dtype=np.int32)
+    if not n:
+        return lcp
+    lcp[0] = -1
+    for lo in range(1, n, _LCP_CHUNK):
+        chunk = np.array(names[lo - 1:lo + _LCP_CHUNK], dtype=f"U{width}")
+        codes = chunk.view(np.uint32).reshape(len(chunk), width)
+        eq = codes[1:] == codes[:-1]
+        lcp[lo:lo + len(eq)] = np.where(eq.all(axis=1), width, eq.argmin(axis=1))
+    return lcp
+
+
+def _top(scores, lo, hi, k):
+    """区间内得分最高的 k 个下标（同分按名称顺序）。"""
+    s = scores[lo:hi]
+    if k < len(s):
+        kth = -np.partition(-s, k - 1)[k - 1]
+        idx = np.flatnonzero(s >= kth)
+    else:
+        idx = np.arange(len(s))
+    idx = idx[np.lexsort((idx, -s[idx]))][:k]
+    return idx + lo
+
+
+class NameSuggester:
+    __slots__ = ("names_lc", "names", "counts", "latest", "_heavy", "_overlay", "_overlay_keys", "_masked")
+
+    def __init__(self, store=None):
+        """按存储中的所有存活条目构建；store 为 None 时为空表。"""
+        if store is None:
+            self._build([], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), lambda idx: [])
+            return
+        rows = np.flatnonzero(store.alive.values)
+        self._build(
+            store.names_lc.get_many(rows),
+            np.ones(len(rows), dtype=np.int64),
+            store.mtime.values[rows].astype(np.int64),
+            lambda idx: store.names.get_many(rows[idx]),
+        )
+
+    @classmethod
+    def combine(cls, tables):
+        """多张补全表（按根目录分片的索引）合并成一张，同名条目的次数相加、最近修改时间取最大。"""
+        parts = [table.entries() for table in tables]
+        names = [name for part in parts for name in part[1]]
+        suggester = cls.__new__(cls)
+        suggester._build(
+            [name_lc for part in parts for name_lc in part[0]],
+            np.concatenate([part[2] for part in parts] or [np.empty(0, dtype=np.int64)]),
+            np.concatenate([part[3] for part in parts] or [np.empty(0, dtype=np.int64)]),
+            lambda idx: [names[i] for i in idx.tolist()],
+        )
+        return suggester
+
+    def _build(self, names_lc, counts, latest, display):
+        """
+        按每条的 (规范化名称, 次数, 修改时间) 构建，同名的次数相加、修改时间取最大；
+        display(下标数组) 返回这些条目的展示名称，每个名称取最近修改的那一条的原始大小写。
+        """
+        uniq, inverse = np.unique(np.array(names_lc, dtype=object), return_inverse=True)
+        inverse = inverse.reshape(-1)
+        self.names_lc = uniq.tolist()
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.int64)
+        self.latest = np.zeros(len(uniq), dtype=np.int64)
+        np.maximum.at(self.latest, inverse, latest)
+
+        by_time = np.argsort(latest, kind="stable")
+        shown = np.empty(len(uniq), dtype=np.int64)
+        shown[inverse[by_time]] = by_time
+        self.names = list(display(shown))
+
+        self._heavy = {}  # 前缀 -> {排序方式: 前 MAX_LIMIT 名的下标}
+        self._overlay = {}  # 规范化名称 -> (展示名称, 次数, 最近修改时间)，次数为 0 表示已不存在
+        self._overlay_keys = []  # _overlay 的键（升序）
+        self._masked = []  # _overlay 中同时存在于基础表的键（升序）
+        self._build_heavy()
+
+    def __len__(self):
+        """去重后的名称数。"""
+        n = len(self.names_lc)
+        for name_lc, (_, count, _) in self._overlay.items():
+            n += bool(count) - (self.find(name_lc) is not None)
+        return n
+
+    def _scores(self, rank):
+        return self.latest if rank == "recency" else self.counts
+
+    def _build_heavy(self):
+        names = self.names_lc
+        n = len(names)
+        if n <= HEAVY_ROWS:
+            return
+        self._heavy[""] = {rank: _top(self._scores(rank), 0, n, MAX_LIMIT) for rank in RANKS}
+        lcp = _lcp(names, LCP_WIDTH)
+        for length in range(1, LCP_WIDTH + 1):
+            starts = np.flatnonzero(lcp < length)
+            sizes = np.diff(np.append(starts, n))
+            heavy = sizes > HEAVY_ROWS
+            if not heavy.any():
+                break
+            for lo, size in zip(starts[heavy].tolist(), sizes[heavy].tolist()):
+                self._heavy[names[lo][:length]] = {
+                    rank: _top(self._scores(rank), lo, lo + size, MAX_LIMIT) for rank in RANKS
+                }
+
+    # =========================
+    # 增量
+    # =========================
+    @property
+    def overlay_size(self):
+        return len(self._overlay)
+
+    def updated(self, entries):
+        """
+        应用 entries（{规范化名称: (展示名称, 次数, 最近修改时间)}，次数为 0 表示已不存在）后的新表；
+        基础数组共享，本表不变。
+        """
+        table = NameSuggester.__new__(NameSuggester)
+        table.names_lc, table.names, table.counts, table.latest = self.names_lc, self.names, self.counts, self.latest
+        table._heavy = self._heavy
+        table._overlay = {**self._overlay, **entries}
+        new = sorted(k for k in entries if k not in self._overlay)
+        table._overlay_keys = list(merge(self._overlay_keys, new))
+        table._masked = list(merge(self._masked, [k for k in new if self.find(k) is not None]))
+        return table
+
+    def entry(self, name_lc):
+        """规范化名称当前的 (展示名称, 次数, 最近修改时间)，不存在时返回 None。"""
+        e = self._overlay.get(name_lc)
+        if e is not None:
+            return e if e[1] else None
+        i = self.find(name_lc)
+        return None if i is None else (self.names[i], int(self.counts[i]), int(self.latest[i]))
+
+    def entries(self):
+        """合并增量后的全部条目：(规范化名称列表, 展示名称列表, 次数数组, 最近修改时间数组)。"""
+        if not self._overlay:
+            return self.names_lc, self.names, self.counts, self.latest
+        overlay = self._overlay
+        keep = [i for i, name_lc in enumerate(self.names_lc) if name_lc not in overlay]
+        added = [(k, e) for k, e in overlay.items() if e[1]]
+        return (
+            [self.names_lc[i] for i in keep] + [k for k, _ in added],
+            [self.names[i] for i in keep] + [e[0] for _, e in added],
+            np.concatenate([self.counts[keep], np.array([e[1] for _, e in added], dtype=np.int64)]),
+            np.concatenate([self.latest[keep], np.array([e[2] for _, e in added], dtype=np.int64)]),
+        )
+
+    @staticmethod
+    def total(name_lc, tables):
+        """多张表中同一名称的合计 (展示名称, 次数, 最近修改时间)，都没有时次数为 0。"""
+        found = [e for e in (table.entry(name_lc) for table in tables) if e is not None]
+        if not found:
+            return "", 0, 0
+        latest = max(e[2] for e in found)
+        # 与 combine 一致：展示名称取最近修改的条目中排在最后的那张表
+        name = [e[0] for e in found if e[2] == latest][-1]
+        return name, sum(e[1] for e in found), latest
+
+    # =========================
+    # 查询
+    # =========================
+    def range(self, prefix):
+        """以 prefix 开头的名称在排序数组中的区间 [lo, hi)。"""
+        return _range(self.names_lc, prefix)
+
+    def find(self, name_lc):
+        """规范化名称在基础表排序数组中的下标，不存在时返回 None。"""
+        i = bisect_left(self.names_lc, name_lc)
+        return i if i < len(self.names_lc) and self.names_lc[i] == name_lc else None
+
+    def suggest(self, prefix, limit=10, rank="frequency"):
+        """前缀（不区分大小写）补全，按出现次数或最近修改时间排序，返回去重后的前 limit 个名称。"""
+        prefix = fold(prefix)
+        rank = rank if rank in RANKS else RANKS[0]
+        limit = max(0, min(limit, MAX_LIMIT))
+        if not limit:
+            return []
+
+        lo, hi = self.range(prefix)
+        olo, ohi = _range(self._overlay_keys, prefix)
+        mlo, mhi = _range(self._masked, prefix)
+        # 区间内被增量覆盖的基础条目有 mhi - mlo 个，多取这么多名，去掉它们后仍是准确的前 limit 名
+        k = limit + mhi - mlo
+        scores = self._scores(rank)
+        heavy = self._heavy.get(prefix) if hi - lo > HEAVY_ROWS else None
+        if heavy is not None and k <= MAX_LIMIT:
+            idx = heavy[rank][:k]
+        else:
+            idx = _top(scores, lo, hi, k) if lo < hi else []
+
+        overlay = self._overlay
+        hits = [
+            (int(scores[i]), self.names_lc[i], self.names[i], int(self.counts[i]), int(self.latest[i]))
+            for i in np.asarray(idx, dtype=np.int64).tolist() if self.names_lc[i] not in overlay
+        ]
+        for name_lc in self._overlay_keys[olo:ohi]:
+            name, count, latest = overlay[name_lc]
+            if count:
+                hits.append((latest if rank == "recency" else count, name_lc, name, count, latest))
+        # 同分按名称顺序，与基础表内的顺序一致
+        hits.sort(key=lambda h: (-h[0], h[1]))
+        return [
+            {
+                "Name": name,
+                "Count": count,
+                "UpdateTS": latest,
+                "UpdateTime": filetime_ticks_to_str(latest),
+            }
+            for _, _, name, count, latest in hits[:limit]
+        ]
+
+
+def _range(names, prefix):
+    """升序列表中以 prefix 开头的名称的区间 [lo, hi)。"""
+    lo = bisect_left(names, prefix)
+    # 以 prefix 开头的名称都排在 prefix + U+10FFFF 之前
+    hi = bisect_left(names, prefix + "\U0010ffff", lo)
+    return lo, hi
@@ -0,0 +1,219 @@
+from array import array
+
+import numpy as np
+
+# =========================
+# Trigram 倒排索引
+# =========================
+# 文本两端各补一个 "\0" 后切成三元组，每个三元组对应一个升序行号列表 (posting list)。
+#   - 关键词 >= 3 个字符：取其所有三元组的 posting list 求交集，得到候选行，再逐行校验。
+#   - 关键词 < 3 个字符（中文文件名里很常见）：由于补了边界符，任何 1~2 字符的子串都一定
+#     落在某个三元组内。预先记录「短子串 -> 包含它的三元组」，查询时对这些三元组的
+#     posting list 求并集即可，结果精确，不需要全表扫描也不需要校验。
+#
+# posting list 分两部分：
+#   base  - 从索引文件加载的冻结部分，所有三元组的行号连续存放在一个数组中（可为 mmap 视图）；
+#   delta - 加载之后新增的行，按三元组存放在 array("i") 中。
+# 行号单调递增地追加，base 中的行号总小于 delta 中的行号，拼接后仍然有序。
+#
+# clone() 生成写时复制的副本：posting 字典浅拷贝，某个三元组第一次被追加时才复制它的
+# array；短子串表的值为 tuple，新增时整体替换，不会修改原索引看到的对象。
+
+PAD = "\0"
+_GRAM_ENCODING = "utf-8"
+_GRAM_ERRORS = "surrogatepass"
+
+
+def _grams(text):
+    padded = f"{PAD}{text}{PAD}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _short_subs(gram):
+    subs = set()
+    for size in (1, 2):
+        for i in range(4 - size):
+            sub = gram[i:i + size]
+            if PAD not in sub:
+                subs.add(sub)
+    return subs
+
+
+class TrigramIndex:
+    __slots__ = ("_base_ids", "_base_offsets", "_base_rows", "_postings", "_owned", "_short")
+
+    def __init__(self):
+        self._base_ids = {}  # gram -> base 中的序号
+        self._base_offsets = np.zeros(1, dtype=np.int64)
+        self._base_rows = np.empty(0, dtype=np.int32)
+        self._postings = {}  # gram -> array("i") 行号（升序）
+        self._owned = None  # clone 后本索引已复制过的 gram；None 表示 postings 全部归本索引所有
+        self._short = None  # 1~2 字符子串 -> (gram, ...)，首次短查询时构建
+
+    def __len__(self):
+        return len(self._base_ids) + sum(1 for g in self._postings if g not in self._base_ids)
+
+    def add(self, row, text):
+        postings = self._postings
+        owned = self._owned
+        for g in _grams(text):
+            p = postings.get(g)
+            if p is None:
+                p = postings[g] = array("i")
+                if owned is not None:
+                    owned.add(g)
+                if self._short is not None and g not in self._base_ids:
+                    self._register_short(self._short, g)
+            elif owned is not None and g not in owned:
+                p = postings[g] = array("i", p)
+                owned.add(g)
+            p.append(row)
+
+    def clone(self):
+        """写时复制的副本：base 数组共享，delta 的 posting 首次追加时才复制。"""
+        index = TrigramIndex.__new__(TrigramIndex)
+        index._base_ids = self._base_ids
+        index._base_offsets = self._base_offsets
+        index._base_rows = self._base_rows
+        index._postings = dict(self._postings)
+        index._owned = set()
+        index._short = None if self._short is None else dict(self._short)
+        return index
+
+    @staticmethod
+    def _register_short(short, gram):
+        for sub in _short_subs(gram):
+            short[sub] = short.get(sub, ()) + (gram,)
+
+    def _build_short(self):
+        # 可能与其他读者并发构建，先在局部变量中建好再一次性赋值
+        short = {}
+        for g in self._base_ids.keys() | self._postings.keys():
+            for sub in _short_subs(g):
+                lst = short.get(sub)
+                if lst is None:
+                    short[sub] = [g]
+                else:
+                    lst.append(g)
+        self._short = {sub: tuple(grams) for sub, grams in short.items()}
+
+    def _rows(self, gram):
+        """某个三元组的全部行号 (int64, 升序)，不存在时返回 None。"""
+        i = self._base_ids.get(gram)
+        p = self._postings.get(gram)
+        if i is None and p is None:
+            return None
+
+        parts = []
+        if i is not None:
+            parts.append(self._base_rows[self._base_offsets[i]:self._base_offsets[i + 1]].astype(np.int64))
+        if p is not None:
+            parts.append(np.array(p, dtype=np.int64))
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _size(self, gram):
+        n = 0
+        i = self._base_ids.get(gram)
+        if i is not None:
+            n += int(self._base_offsets[i + 1] - self._base_offsets[i])
+        p = self._postings.get(gram)
+        if p is not None:
+            n += len(p)
+        return n
+
+    def estimate(self, kw):
+        """candidates(kw) 行数的上界，只看 posting list 长度，不取行号。"""
+        if len(kw) < 3:
+            if self._short is None:
+                self._build_short()
+            return sum(self._size(g) for g in self._short.get(kw, ()))
+        return min(self._size(kw[i:i + 3]) for i in range(len(kw) - 2))
+
+    def candidates(self, kw):
+        """
+        返回 (行号数组, 是否需要校验)。
+        行号数组升序、去重；需要校验时调用方应再确认 kw 确实是子串。
+        """
+        if len(kw) < 3:
+            if self._short is None:
+                self._build_short()
+            grams = self._short.get(kw)
+            if not grams:
+                return np.empty(0, dtype=np.int64), False
+            if len(grams) == 1:
+                return self._rows(grams[0]), False
+            return np.unique(np.concatenate([self._rows(g) for g in grams])), False
+
+        grams = list({kw[i:i + 3] for i in range(len(kw) - 2)})
+        sizes = [self._size(g) for g in grams]
+        if not all(sizes):
+            return np.empty(0, dtype=np.int64), False
+
+        # 从最短的 posting list 开始求交集，尽早缩小候选集
+        grams = [g for _, g in sorted(zip(sizes, grams))]
+        rows = self._rows(grams[0])
+        for g in grams[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, self._rows(g), assume_unique=True)
+
+        # 关键词恰好 3 个字符时，命中即为精确匹配
+        return rows, len(kw) > 3
+
+    def whole(self, text):
+        """可能整体等于 text 的行（含两端边界符的三元组都命中），调用方需再确认。"""
+        grams = sorted(_grams(text), key=self._size)
+        if not grams or not self._size(grams[0]):
+            return np.empty(0, dtype=np.int64)
+        rows = self._rows(grams[0])
+        for g in grams[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, self._rows(g), assume_unique=True)
+        return rows
+
+    def materialize(self):
+        """把 base 中引用 mmap 的数组复制到内存。"""
+        self._base_offsets = np.array(self._base_offsets)
+        self._base_rows = np.array(self._base_rows)
+
+    # =========================
+    # 序列化
+    # =========================
+    def to_arrays(self):
+        """
+        合并 base 与 delta，导出为连续数组：
+        grams_heap / grams_offsets - 三元组 UTF-8 字节与偏移；offsets / rows - 各三元组的行号区间。
+        """
+        grams = sorted(set(self._base_ids) | set(self._postings))
+        heap = bytearray()
+        gram_offsets = [0]
+        offsets = [0]
+        parts = []
+        for g in grams:
+            heap += g.encode(_GRAM_ENCODING, _GRAM_ERRORS)
+            gram_offsets.append(len(heap))
+            rows = self._rows(g)
+            parts.append(rows.astype(np.int32))
+            offsets.append(offsets[-1] + len(rows))
+
+        return {
+            "grams_heap": bytes(heap),
+            "grams_offsets": np.array(gram_offsets, dtype=np.int64),
+            "offsets": np.array(offsets, dtype=np.int64),
+            "rows": np.concatenate(parts) if parts else np.empty(0, dtype=np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """由 to_arrays 的结果构建；offsets / rows 可以是 mmap 视图，不会复制。"""
+        index = cls()
+        heap = arrays["grams_heap"]
+        bounds = np.asarray(arrays["grams_offsets"]).tolist()
+        index._base_ids = {
+            str(heap[s:e], _GRAM_ENCODING, _GRAM_ERRORS): i
+            for i, (s, e) in enumerate(zip(bounds, bounds[1:]))
+        }
+        index._base_offsets = arrays["offsets"]
+        index._base_rows = arrays["rows"]
+        return index
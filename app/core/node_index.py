@@ -0,0 +1,131 @@
+import numpy as np
+
+from app.core.index_store import path_sep
+
+# =========================
+# 路径 -> 行号 查找（写入方使用）
+# =========================
+# 存储中每行只有「父目录行号 + 名称」，不再保存完整路径，也不再以路径字符串为键建字典。
+# 这里按 hash((父目录, 名称)) -> 行号 建立整数字典，命中后再核对父目录与名称；
+# 极少数哈希冲突的条目放入 _overflow。完整路径逐级查找，代价与路径深度成正比。
+#
+# 子项列表：创建时由存储一次性分组 (child_lists)，之后新增的行记在 _extra 中；
+# 读取时按存活标记与父目录过滤，因此删除条目不需要维护列表。
+# 删除 / 移动一个目录只需要遍历它的子树，与索引总量无关。
+
+
+class NodeIndex:
+    def __init__(self, store):
+        self.store = store
+        self._rows = {}  # hash((父目录, 名称)) -> 行号
+        self._overflow = {}  # (父目录, 名称) -> 行号，哈希冲突时使用
+        self._extra = {}  # 父目录 -> [创建之后新增的子项行号]
+
+        live = np.flatnonzero(store.alive.values)
+        for row, parent, name in zip(live.tolist(), store.parent.values[live].tolist(), store.names.get_many(live)):
+            self._insert(row, parent, name)
+        self._child_rows, self._bounds = store.child_lists()
+
+    def bind(self, store):
+        """切换到同一存储的写时复制副本（行号不变）。"""
+        self.store = store
+
+    def __len__(self):
+        return len(self._rows) + len(self._overflow)
+
+    # =========================
+    # 查找
+    # =========================
+    def _is(self, row, parent, name):
+        store = self.store
+        return store.parent[row] == parent and store.names[row] == name
+
+    def _insert(self, row, parent, name):
+        h = hash((parent, name))
+        old = self._rows.get(h)
+        if old is None or self._is(old, parent, name):
+            self._rows[h] = row
+        else:
+            self._overflow[(parent, name)] = row
+
+    def get(self, parent, name):
+        row = self._rows.get(hash((parent, name)))
+        if row is not None and self._is(row, parent, name):
+            return row
+        return self._overflow.get((parent, name))
+
+    def resolve(self, path, cache=None):
+        """
+        路径对应的行号；path 为根目录时返回根目录编号（负数），不在索引中时返回 None。
+        cache 为 {目录路径: 行号}，逐层查找时先查上级目录，减少重复查找。
+        """
+        store = self.store
+        if cache is not None:
+            node = cache.get(path)
+            if node is not None:
+                return node
+
+        for rid, root in enumerate(store.roots):
+            sep = path_sep(root)
+            if path == root:
+                return -1 - rid
+            prefix = root if root.endswith(sep) else root + sep
+            if not path.startswith(prefix):
+                continue
+
+            node = -1 - rid
+            for name in path[len(prefix):].split(sep):
+                if name:
+                    node = self.get(node, name)
+                    if node is None:
+                        return None
+            if cache is not None:
+                cache[path] = node
+            return node
+        return None
+
+    # =========================
+    # 修改
+    # =========================
+    def add(self, row, parent, name):
+        self._insert(row, parent, name)
+        if parent >= 0:
+            self._extra.setdefault(parent, []).append(row)
+
+    def remove(self, rows):
+        """从查找表中移除（行本身由调用方打墓碑）。"""
+        store = self.store
+        rows = np.asarray(rows, dtype=np.int64)
+        for row, parent, name in zip(rows.tolist(), store.parent.values[rows].tolist(), store.names.get_many(rows)):
+            h = hash((parent, name))
+            if self._rows.get(h) == row:
+                del self._rows[h]
+            elif self._overflow.get((parent, name)) == row:
+                del self._overflow[(parent, name)]
+
+    # =========================
+    # 子树
+    # =========================
+    def children(self, node):
+        """目录的存活子项行号。"""
+        store = self.store
+        kids = self._child_rows[self._bounds[node]:self._bounds[node + 1]] if node + 1 < len(self._bounds) else None
+        extra = self._extra.get(node)
+        if extra:
+            extra = np.array(extra, dtype=np.int64)
+            kids = extra if kids is None else np.concatenate([kids, extra])
+        if kids is None:
+            return np.empty(0, dtype=np.int64)
+        return kids[store.alive.values[kids] & (store.parent.values[kids] == node)]
+
+    def subtree(self, node):
+        """目录下所有存活的后代行号（不含自身），代价与子树大小成正比。"""
+        is_dir = self.store.is_dir.values
+        out = []
+        stack = [node]
+        while stack:
+            kids = self.children(stack.pop())
+            if len(kids):
+                out.append(kids)
+                stack.extend(kids[is_dir[kids]].tolist())
+        return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
@@ -0,0 +1,128 @@
+import base64
+import heapq
+import json
+import zlib
+
+import numpy as np
+
+# =========================
+# Top-k 选择与游标分页
+# =========================
+# 结果顺序统一为 (排序键, 行号)：排序键按 reverse 升/降序，同值按行号升序，
+# 与旧版 list.sort(reverse=...) 的稳定排序结果一致。
+# 游标记录上一页最后一条的 (排序键, 行号)，下一页只取严格排在它之后的行 (keyset 分页)，
+# 同时记录索引代数与查询签名，索引更新或查询条件变化后旧游标失效。
+# 按根目录分片时，各分片的结果用 merge 按同样的顺序做 k 路归并。
+
+
+class CursorError(ValueError):
+    """游标无法解析、与查询不匹配或索引已更新。"""
+
+
+def query_signature(*params):
+    return format(zlib.crc32(repr(params).encode("utf-8")), "08x")
+
+
+def encode_cursor(generation, signature, key, row):
+    payload = {"g": generation, "q": signature, "k": key, "i": int(row)}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, generation, signature):
+    """返回 (排序键, 行号)。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        key, row = payload["k"], int(payload["i"])
+        gen, sig = payload["g"], payload["q"]
+    except (ValueError, TypeError, KeyError):
+        raise CursorError("无效的游标")
+
+    if sig != signature:
+        raise CursorError("游标与当前查询条件不匹配")
+    if gen != generation:
+        raise CursorError("索引已更新，请重新搜索")
+    return key, row
+
+
+def _after_mask(keys, rows, last_key, last_row, reverse):
+    if reverse:
+        return (keys < last_key) | ((keys == last_key) & (rows > last_row))
+    return (keys > last_key) | ((keys == last_key) & (rows > last_row))
+
+
+def top_k(rows, keys, k=None, reverse=True, after=None):
+    """
+    数值键的部分排序：先用 argpartition 选出前 k 个，再只对这 k 个排序。
+    after 为上一页最后一条的 (排序键, 行号)。
+    """
+    if after is not None:
+        m = _after_mask(keys, rows, after[0], after[1], reverse)
+        rows, keys = rows[m], keys[m]
+
+    kk = -keys if reverse else keys
+    if k is not None and k < len(rows):
+        if k <= 0:
+            return rows[:0]
+        # 第 k 小的值作为阈值，连同所有与阈值相等的行一起参与排序，保证同值按行号的顺序稳定
+        kth = kk[np.argpartition(kk, k - 1)[k - 1]]
+        m = kk <= kth
+        rows, kk = rows[m], kk[m]
+
+    order = np.lexsort((rows, kk))
+    if k is not None:
+        order = order[:k]
+    return rows[order]
+
+
+def top_k_by_text(rows, texts, k=None, reverse=True, after=None):
+    """字符串键的 top-k（heapq），texts 与 rows 一一对应。"""
+    pairs = zip(texts, rows.tolist())
+    if after is not None:
+        last_key, last_row = after
+        if reverse:
+            pairs = [p for p in pairs if p[0] < last_key or (p[0] == last_key and p[1] > last_row)]
+        else:
+            pairs = [p for p in pairs if p[0] > last_key or (p[0] == last_key and p[1] > last_row)]
+
+    if reverse:
+        # 键降序、行号升序
+        key = lambda p: (_Desc(p[0]), p[1])  # noqa: E731
+    else:
+        key = None
+
+    if k is None:
+        ordered = sorted(pairs, key=key)
+    else:
+        ordered = heapq.nsmallest(k, pairs, key=key)
+    return np.array([r for _, r in ordered], dtype=np.int64)
+
+
+def merge(parts, reverse=True, text=False):
+    """
+    k 路归并：parts 中每个序列（可以是生成器）的元素为 (排序键, 行号, ...)，已按 (排序键, 行号) 的结果顺序排好，
+    按同样的顺序流式产出，只在需要下一个元素时才从对应序列中读取。text 表示排序键为字符串。
+    """
+    if not reverse:
+        key = lambda p: (p[0], p[1])  # noqa: E731
+    elif text:
+        key = lambda p: (_Desc(p[0]), p[1])  # noqa: E731
+    else:
+        key = lambda p: (-p[0], p[1])  # noqa: E731
+    return heapq.merge(*parts, key=key)
+
+
+class _Desc:
+    """把字符串比较取反，用于 (降序键, 升序行号) 的组合排序。"""
+
+    __slots__ = ("s",)
+
+    def __init__(self, s):
+        self.s = s
+
+    def __lt__(self, other):
+        return self.s > other.s
+
+    def __eq__(self, other):
+        return self.s == other.s
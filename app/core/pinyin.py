@@ -0,0 +1,35 @@
+import re
+
+from functools import lru_cache
+
+# =========================
+# 文件名拼音
+# =========================
+# 用户常用拼音全拼或首字母搜索中文文件名，例如 "baogao" / "bg" 搜「报告」。
+# 建索引时为含汉字的文件名预先生成「全拼 \x01 首字母」（小写），存入 IndexStore.pinyin 列，
+# 并建立单独的三元组索引；查询时不再做任何拼音转换。
+# 非汉字部分原样保留："报告2023.docx" -> "baogao2023.docx\x01bg2023.docx"。
+# 分隔符 \x01 不会出现在查询中，因此不会匹配到跨越两部分的子串。
+# pypinyin 为可选依赖，未安装时拼音列为空，match=pinyin 退化为普通文件名匹配。
+
+try:
+    from pypinyin import Style, lazy_pinyin  # type: ignore
+except Exception:
+    Style = lazy_pinyin = None  # type: ignore
+
+SEP = "\x01"
+_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def available():
+    return lazy_pinyin is not None
+
+
+@lru_cache(maxsize=65536)
+def pinyin_text(name):
+    """文件名的「全拼 \\x01 首字母」，不含汉字或未安装 pypinyin 时为空字符串。"""
+    if lazy_pinyin is None or not _CJK.search(name):
+        return ""
+    full = "".join(lazy_pinyin(name, style=Style.NORMAL)).lower()
+    initials = "".join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return f"{full}{SEP}{initials}"
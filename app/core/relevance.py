@@ -0,0 +1,103 @@
+import numpy as np
+
+from app.core.pinyin import SEP
+
+# =========================
+# 相关度排序
+# =========================
+# sort_by=relevance 时按关键词在文件名中的命中方式给候选行打分，分档（每个关键词分别计分后相加）：
+#   完全相同（或去掉扩展名后相同） > 文件名以它开头 > 在单词边界处出现 > 文件名中任意位置出现
+# 文件夹模式下关键词可能只命中上级路径，这类行不得命中分；拼音模式同时按拼音全拼 / 首字母分档，取较高者。
+# 档内再按路径深度（越浅越好）和修改时间（在本次候选中越新越好）微调，微调总和小于相邻两档的差距，
+# 因此不会改变档次顺序。
+#
+# 打分不逐行解码字符串：把候选行的 UTF-8 字节拼接起来（StringColumn.chunks），用 numpy 逐字节比较找出
+# 关键词的所有命中位置，按命中处前后的字节（查表）判断档次，再用 searchsorted 换算成行，每行取最高档次。
+# 得到数值分数后复用 pagination.top_k 做部分排序与游标分页。
+
+TIER_SCORES = np.array([0.0, 100.0, 300.0, 600.0, 1000.0])  # 未命中 / 子串 / 单词边界 / 前缀 / 完全相同
+DEPTH_PENALTY = 10.0  # 每深一层扣分
+MAX_DEPTH = 10  # 超过该深度不再继续扣分
+RECENCY_BOOST = 80.0  # 候选中最新的行加满分，最旧的不加
+
+# 行首：拼接后各行以 \0 结尾，拼音的全拼与首字母以 SEP 分隔；单词边界另含常见的分隔字符
+_IS_START = np.zeros(256, dtype=np.bool_)
+_IS_START[[0, ord(SEP)]] = True
+_IS_BOUNDARY = _IS_START.copy()
+_IS_BOUNDARY[list(b" _-.,;+&@#~()[]{}")] = True
+_DOT = ord(".")
+
+
+def _classify(arr, hits, klen):
+    """按命中位置前后的字节判断档次：arr 为拼接后的字节（前面补了一个 \0），hits 为命中起始位置。"""
+    prev = arr[hits - 1]
+    tier = np.where(_IS_START[prev], 3, np.where(_IS_BOUNDARY[prev], 2, 1)).astype(np.int8)
+
+    # 前缀命中后面紧跟行尾，或只剩一段扩展名（下一个点在行尾之后）时为完全相同
+    after = hits + klen
+    exact = (tier == 3) & _IS_START[arr[after]]
+    ext = np.flatnonzero((tier == 3) & (arr[after] == _DOT))
+    if len(ext):
+        stops = np.flatnonzero(_IS_START[arr])
+        dots = np.append(np.flatnonzero(arr == _DOT), len(arr))
+        start = after[ext] + 1
+        exact[ext] = dots[np.searchsorted(dots, start)] > stops[np.searchsorted(stops, start)]
+    tier[exact] = 4
+    return tier
+
+
+def _find_all(arr, k):
+    """k 在 arr 中所有（可重叠的）出现位置：先取首字节相同的位置，再逐字节筛掉不匹配的。"""
+    hits = np.flatnonzero(arr[:len(arr) - len(k) + 1] == k[0])
+    for j in range(1, len(k)):
+        hits = hits[arr[hits + j] == k[j]]
+    return hits
+
+
+def tiers(col, rows, kw):
+    """kw 在 rows 各行文本中的命中档次（0 表示未命中）。"""
+    tier = np.zeros(len(rows), dtype=np.int8)
+    k = kw.encode("utf-8", "surrogatepass")
+    if not k:
+        return tier
+    for lo, buf, ends in col.chunks(rows):
+        # 前面补一个 \0，使第一行的行首也能按前一个字节判断
+        arr = np.frombuffer(b"\0" + buf, dtype=np.uint8)
+        hits = _find_all(arr, k)
+        if not len(hits):
+            continue
+        hit_tiers = _classify(arr, hits, len(k))
+        np.maximum.at(tier, lo + np.searchsorted(ends, hits - 1, side="right"), hit_tiers)
+    return tier
+
+
+def time_span(store, rows):
+    """候选行修改时间的 (最早, 最新)，作为新旧加分的基准。"""
+    if not len(rows):
+        return 0, 0
+    mtime = store.mtime.values[rows]
+    return int(mtime.min()), int(mtime.max())
+
+
+def score(store, rows, kws, target="name", span=None):
+    """
+    rows 各行的相关度分数（越大越相关）。
+    span 为加分基准 (最早, 最新)，默认取 rows 自身；翻页时为同一批候选中的单行计算游标键需要传入。
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    total = np.zeros(len(rows), dtype=np.float64)
+    if not len(rows):
+        return total
+
+    for kw in kws:
+        tier = tiers(store.names_lc, rows, kw)
+        if target == "pinyin":
+            tier = np.maximum(tier, tiers(store.pinyin, rows, kw))
+        total += TIER_SCORES[tier]
+
+    total -= DEPTH_PENALTY * np.minimum(store.depth_of(rows), MAX_DEPTH)
+
+    lo, hi = span if span is not None else time_span(store, rows)
+    if hi > lo:
+        total += RECENCY_BOOST * (store.mtime.values[rows] - lo) / (hi - lo)
+    return total
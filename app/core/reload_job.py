@@ -0,0 +1,173 @@
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# 后台重载任务
+# =========================
+# /file/v1/reload/index 不再在 HTTP 请求中同步扫描：请求只启动一个后台任务并立即返回任务 id，
+# 进度通过 /file/v1/reload/status 或 SSE 流 /file/v1/reload/events 查询。
+# 重叠的重载请求不会启动重叠的扫描（single-flight）：
+# - 已有任务覆盖请求的范围（全部根目录，或该根目录）且不弱于请求（full 包含增量）时，
+#   新的请求直接附加到该任务上，返回同一个任务 id；
+# - 否则新建一个后续任务：先等范围重叠但较弱的任务（例如请求 full 时运行中的增量任务）结束再扫描；
+#   已由足够强的任务覆盖的根目录（例如重载全部时运行中的单个根目录任务）不再重复扫描，等该任务完成即可。
+#   等待期间任务状态为 queued，waiting_for 中列出在等的任务。
+# 不同根目录的任务互不影响。
+# 进度来自 DiskIndexer 扫描过程中实时更新的 stats dict（列出 / 跳过的目录数，新增 / 修改 / 删除的条数）；
+# 分片索引按根目录分别记录在 stats["shards"] 中，状态中的计数为各分片之和。
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ReloadJob:
+    def __init__(self, job_id, full, drive=None):
+        self.id = job_id
+        self.full = full
+        self.drive = drive  # None 表示全部根目录
+        self.state = RUNNING
+        self.waiting_for = []  # 本任务完成前需要等待的任务（见 ReloadJobs.start）
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.requests = 1  # 发起 / 附加到本任务上的请求数
+        self.progress = {}  # 扫描线程原地更新
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def covers(self, full, drive):
+        """本任务完成后是否满足该请求：范围包含该根目录（drive 为 None 时须为全部根目录），且 full 不弱于请求。"""
+        return (self.drive is None or self.drive == drive) and (self.full or not full)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _finish(self, error=None):
+        self.finished_at = time.time()
+        self.error = error
+        self.state = FAILED if error else DONE
+        self._done.set()
+
+    def status(self):
+        end = self.finished_at or time.time()
+        status = {
+            "job_id": self.id,
+            "state": self.state,
+            "full": self.full,
+            "drive": self.drive,
+            "started_at": self.started_at,
+            "elapsed": round(end - self.started_at, 3),
+            "requests": self.requests,
+            **_totals(self.progress),
+        }
+        waiting = [job.id for job in self.waiting_for if not job.finished]
+        if waiting:
+            status["waiting_for"] = waiting
+        if self.finished_at is not None:
+            status["finished_at"] = self.finished_at
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+def _totals(progress):
+    """进度的副本；含各分片的进度时把计数累加到顶层。"""
+    progress = dict(progress)
+    shards = progress.get("shards")
+    if shards:
+        progress["shards"] = {root: dict(p) for root, p in shards.items()}
+        for p in progress["shards"].values():
+            for k, v in p.items():
+                if isinstance(v, int):
+                    progress[k] = progress.get(k, 0) + v
+    return progress
+
+
+class ReloadJobs:
+    def __init__(self, history=16):
+        self.history = history
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}  # 任务 id -> ReloadJob（保留最近 history 个）
+        self._running = []  # 尚未结束的任务（含排队中的）
+        self.current = None  # 最近启动的任务
+
+    def start(self, indexer, full=False, drive=None):
+        """
+        启动重载任务（drive 为只重载的根目录），已有覆盖该范围且不弱于请求的任务时附加到该任务上；
+        否则新建后续任务（见模块说明）。返回 (任务, 是否新建)。
+        """
+        with self._lock:
+            active = [job for job in self._running if not job.finished]
+            for job in active:  # 先启动的任务先结束
+                if job.covers(full, drive):
+                    job.requests += 1
+                    return job, False
+
+            job = ReloadJob(f"reload-{next(self._ids)}", full, drive)
+            # 重载全部时，已由足够强的单个根目录任务覆盖的根目录不再扫描，等该任务完成
+            delegated = []
+            if drive is None:
+                delegated = [j for j in active if j.drive is not None and j.covers(full, j.drive)]
+            drives = [drive] if drive else None
+            if delegated:
+                covered = {j.drive for j in delegated}
+                drives = [d for d in indexer.meta.get("drives") or [] if d not in covered]
+            # 范围重叠但较弱的任务：等它结束后再扫描
+            before = [
+                j for j in active
+                if j not in delegated and (drive is None or j.drive is None or j.drive == drive)
+            ]
+            job.waiting_for = before + delegated
+            if before:
+                job.state = QUEUED
+
+            self.current = job
+            self._running.append(job)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.pop(next(iter(self._jobs)))
+
+        threading.Thread(
+            target=self._run, args=(indexer, job, drives, before, delegated), name=job.id, daemon=True,
+        ).start()
+        return job, True
+
+    def _run(self, indexer, job, drives, before, delegated):
+        try:
+            for other in before:
+                other.wait()
+            job.state = RUNNING
+            if drives is None or drives:
+                indexer.update_index(drives, full=job.full, stats=job.progress)
+            for other in delegated:
+                other.wait()
+                if other.state == FAILED:
+                    raise RuntimeError(f"{other.id} 重载 {other.drive} 失败：{other.error}")
+        except Exception as e:
+            logger.warning("索引重载失败：%r", e)
+            job._finish(repr(e))
+        else:
+            job._finish()
+        finally:
+            with self._lock:
+                self._running.remove(job)
+
+    def get(self, job_id=None):
+        """指定 id 的任务；不指定时返回最近一个任务。找不到返回 None。"""
+        with self._lock:
+            if job_id is None:
+                return self.current
+            return self._jobs.get(job_id)
+
+
+reload_jobs = ReloadJobs()
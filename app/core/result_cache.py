@@ -0,0 +1,93 @@
+import threading
+
+from collections import OrderedDict
+
+# =========================
+# 查询结果缓存
+# =========================
+# 界面和脚本会反复发送相同的查询。这里按「规范化后的查询条件」缓存命中的行号数组（排序 / 分页之前），
+# 按 LRU 淘汰，总大小不超过 max_bytes。
+# 缓存项属于某一代索引：行号只在同一代内有意义，发现代数变化（重建 / 增量更新 / 实时监听 / 压缩）
+# 时整体清空，不需要写入方主动通知。
+
+# 每项除行号数组外的估算开销（键、OrderedDict 节点等）
+_ENTRY_OVERHEAD = 256
+
+
+class ResultCache:
+    def __init__(self, max_bytes=64 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # 查询键 -> 行号数组（只读）
+        self._generation = None
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    @staticmethod
+    def _size(rows):
+        return rows.nbytes + _ENTRY_OVERHEAD
+
+    def get(self, generation, key):
+        with self._lock:
+            self._check_generation(generation)
+            rows = self._items.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, generation, key, rows):
+        """缓存 rows（调用方之后不得修改）；超过总预算的单个结果不缓存。"""
+        size = self._size(rows)
+        if size > self.max_bytes:
+            return
+        rows.flags.writeable = False
+
+        with self._lock:
+            # 查询期间索引已更新，结果属于旧的一代，不再缓存
+            if self._generation is not None and generation < self._generation:
+                return
+            self._check_generation(generation)
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._items[key] = rows
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,357 @@
+import ctypes
+import logging
+import os
+import queue
+import sys
+import threading
+
+from ctypes import wintypes
+from typing import List, NamedTuple, Optional
+
+from app.core.windows_utils import get_available_drives, unix_ns_to_filetime
+
+logger = logging.getLogger(__name__)
+
+# =========================
+# 目录扫描后端
+# =========================
+# DiskIndexer 只依赖 Scanner 接口：
+#   roots()          -> 需要索引的根目录（Windows 为盘符，Linux 为挂载点或配置的目录）
+#   list_dir(path)   -> 该目录下的 DirEntry 列表，无法打开时返回 None
+#   excluded(path)   -> 该目录是否不应进入（例如 /proc 这类伪文件系统）
+#   dir_mtime(path)  -> 目录自身当前的修改时间 (FILETIME)，无法访问时返回 None
+# Kernel32Scanner 使用 FindFirstFileW/FindNextFileW，ScandirScanner 使用 os.scandir，
+# 两者返回的字段一致：大小、修改时间 (FILETIME)、是否目录，二者合起来即指纹。
+
+try:
+    import psutil  # type: ignore
+except Exception:
+    psutil = None  # type: ignore
+
+
+class DirEntry(NamedTuple):
+    name: str
+    is_dir: bool
+    size: int  # 目录恒为 0
+    mtime: int  # FILETIME (100ns, 1601 纪元)
+
+
+class Scanner:
+    # 父目录列表中给出的子目录修改时间是否准确。
+    # NTFS 目录项中的时间戳是延迟更新的，Windows 上判断目录是否变化前需要单独查询。
+    exact_dir_mtime = True
+
+    def roots(self) -> List[str]:
+        raise NotImplementedError
+
+    def list_dir(self, path) -> Optional[List[DirEntry]]:
+        raise NotImplementedError
+
+    def excluded(self, path) -> bool:
+        return False
+
+    def dir_mtime(self, path) -> Optional[int]:
+        try:
+            return unix_ns_to_filetime(os.stat(path).st_mtime_ns)
+        except OSError:
+            return None
+
+
+# =========================
+# Win32 FindFirstFileW
+# =========================
+INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+FILE_ATTRIBUTE_DIRECTORY = 0x10
+
+
+class WIN32_FILE_ATTRIBUTE_DATA(ctypes.Structure):
+    _fields_ = [
+        ("dwFileAttributes", wintypes.DWORD),
+        ("ftCreationTime", wintypes.FILETIME),
+        ("ftLastAccessTime", wintypes.FILETIME),
+        ("ftLastWriteTime", wintypes.FILETIME),
+        ("nFileSizeHigh", wintypes.DWORD),
+        ("nFileSizeLow", wintypes.DWORD),
+    ]
+
+
+GET_FILEEX_INFO_STANDARD = 0
+
+
+class WIN32_FIND_DATAW(ctypes.Structure):
+    _fields_ = [
+        ("dwFileAttributes", wintypes.DWORD),
+        ("ftCreationTime", wintypes.FILETIME),
+        ("ftLastAccessTime", wintypes.FILETIME),
+        ("ftLastWriteTime", wintypes.FILETIME),
+        ("nFileSizeHigh", wintypes.DWORD),
+        ("nFileSizeLow", wintypes.DWORD),
+        ("dwReserved0", wintypes.DWORD),
+        ("dwReserved1", wintypes.DWORD),
+        ("cFileName", wintypes.WCHAR * 260),
+        ("cAlternateFileName", wintypes.WCHAR * 14),
+    ]
+
+
+_kernel32 = None
+
+
+def _load_kernel32():
+    """首次使用时才加载 kernel32，使本模块在非 Windows 平台也能导入。"""
+    global _kernel32
+    if _kernel32 is None:
+        k = ctypes.WinDLL("kernel32", use_last_error=True)
+        k.FindFirstFileW.argtypes = [wintypes.LPCWSTR, ctypes.POINTER(WIN32_FIND_DATAW)]
+        k.FindFirstFileW.restype = wintypes.HANDLE
+        k.FindNextFileW.argtypes = [wintypes.HANDLE, ctypes.POINTER(WIN32_FIND_DATAW)]
+        k.FindNextFileW.restype = wintypes.BOOL
+        k.FindClose.argtypes = [wintypes.HANDLE]
+        k.FindClose.restype = wintypes.BOOL
+        k.GetFileAttributesExW.argtypes = [wintypes.LPCWSTR, ctypes.c_int, ctypes.c_void_p]
+        k.GetFileAttributesExW.restype = wintypes.BOOL
+        _kernel32 = k
+    return _kernel32
+
+
+def fd_to_entry(fd):
+    name = fd.cFileName
+    is_dir = bool(fd.dwFileAttributes & FILE_ATTRIBUTE_DIRECTORY)
+    size = 0 if is_dir else (fd.nFileSizeHigh << 32) + fd.nFileSizeLow
+    ts = (fd.ftLastWriteTime.dwHighDateTime << 32) | fd.ftLastWriteTime.dwLowDateTime
+    return DirEntry(name, is_dir, size, ts)
+
+
+class Kernel32Scanner(Scanner):
+    exact_dir_mtime = False
+
+    def __init__(self, roots=None):
+        self._roots = list(roots) if roots else None
+        self._k = _load_kernel32()
+
+    def roots(self):
+        if self._roots:
+            return list(self._roots)
+        return get_available_drives()
+
+    def list_dir(self, path):
+        k = self._k
+        fd = WIN32_FIND_DATAW()
+        h = k.FindFirstFileW(os.path.join(path, "*"), ctypes.byref(fd))
+        if h == INVALID_HANDLE_VALUE:
+            return None
+
+        entries = []
+        try:
+            while True:
+                if fd.cFileName not in (".", ".."):
+                    entries.append(fd_to_entry(fd))
+                if not k.FindNextFileW(h, ctypes.byref(fd)):
+                    break
+        finally:
+            k.FindClose(h)
+        return entries
+
+    def dir_mtime(self, path):
+        data = WIN32_FILE_ATTRIBUTE_DATA()
+        if not self._k.GetFileAttributesExW(path, GET_FILEEX_INFO_STANDARD, ctypes.byref(data)):
+            return None
+        ft = data.ftLastWriteTime
+        return (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+
+
+# =========================
+# 可移植的 os.scandir
+# =========================
+# 伪文件系统 / 运行时目录，扫描根目录 "/" 时不进入
+POSIX_EXCLUDED = {"/proc", "/sys", "/dev", "/run"}
+PSEUDO_FSTYPES = {"proc", "sysfs", "devtmpfs", "devpts", "tmpfs", "cgroup", "cgroup2"}
+
+
+class ScandirScanner(Scanner):
+    def __init__(self, roots=None, excluded=None):
+        self._roots = [os.path.abspath(r) for r in roots] if roots else None
+        self._excluded = set(POSIX_EXCLUDED if excluded is None else excluded)
+
+    def roots(self):
+        if self._roots:
+            return list(self._roots)
+        return mount_points()
+
+    def excluded(self, path):
+        return path in self._excluded
+
+    def list_dir(self, path):
+        try:
+            it = os.scandir(path)
+        except OSError:
+            return None
+
+        entries = []
+        with it:
+            for e in it:
+                try:
+                    is_dir = e.is_dir(follow_symlinks=False)
+                    st = e.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append(DirEntry(
+                    e.name,
+                    is_dir,
+                    0 if is_dir else st.st_size,
+                    unix_ns_to_filetime(st.st_mtime_ns),
+                ))
+        return entries
+
+
+def mount_points():
+    """真实文件系统的挂载点；嵌套在其他挂载点下的会被其父挂载点的扫描覆盖，不再单独列出。"""
+    points = []
+    if psutil is not None:
+        try:
+            points = [
+                p.mountpoint for p in psutil.disk_partitions(all=False)
+                if p.fstype not in PSEUDO_FSTYPES
+            ]
+        except Exception:
+            points = []
+    if not points:
+        points = [os.path.abspath(os.sep)]
+
+    points = sorted(set(points))
+    roots = []
+    for p in points:
+        if not any(p == r or p.startswith(r.rstrip(os.sep) + os.sep) for r in roots):
+            roots.append(p)
+    return roots
+
+
+def default_scanner(roots=None):
+    if sys.platform == "win32":
+        return Kernel32Scanner(roots)
+    return ScandirScanner(roots)
+
+
+# =========================
+# 目录遍历（顺序 / 并行）
+# =========================
+def _filtered(entries, skip_dirs):
+    return [e for e in entries if not (e.is_dir and e.name.lower() in skip_dirs)]
+
+
+def _lister(scanner, lister):
+    """lister(目录, 父目录列表中该目录的修改时间) -> 条目列表；默认直接列目录。根目录的修改时间为 None。"""
+    if lister is not None:
+        return lister
+    return lambda path, mtime: scanner.list_dir(path)
+
+
+def walk(scanner, roots, skip_dirs=(), workers=1, lister=None):
+    """
+    遍历 roots 下的所有目录，逐个产出 (目录, [DirEntry, ...])，skip_dirs 中的目录已被剔除。
+    父目录总是先于其子目录产出。
+    lister 可替换列目录的方式（例如增量扫描时对未变化的目录直接返回缓存的子项）。
+    workers > 1 时使用 parallel_walk。
+    """
+    if workers and workers > 1:
+        yield from parallel_walk(scanner, roots, skip_dirs, workers, lister)
+        return
+
+    list_dir = _lister(scanner, lister)
+    for root in roots:
+        stack = [(root, None)]
+        while stack:
+            path, mtime = stack.pop()
+            entries = list_dir(path, mtime)
+            if entries is None:
+                continue
+            entries = _filtered(entries, skip_dirs)
+            yield path, entries
+            for e in entries:
+                if e.is_dir:
+                    full = os.path.join(path, e.name)
+                    if not scanner.excluded(full):
+                        stack.append((full, e.mtime))
+
+
+def parallel_walk(scanner, roots, skip_dirs=(), workers=4, lister=None, max_pending=256):
+    """
+    多线程遍历：所有盘符的目录进入同一个共享任务栈，空闲线程随取随做（各盘并发、互相分担）。
+    每列出一个目录就放入有界结果队列，由调用方逐个取出处理，内存中最多缓存 max_pending 个目录，
+    不再缓存整盘的结果；调用方处理不过来时工作线程等待。
+    工作线程先放入结果、再把子目录压入任务栈，因此父目录先于子目录产出；
+    兄弟目录之间的顺序取决于线程调度。调用方提前结束迭代时工作线程随之退出。
+    """
+    if not roots:
+        return
+
+    list_dir = _lister(scanner, lister)
+    tasks = queue.LifoQueue()  # 深度优先，待列目录不会随目录树的宽度膨胀
+    results = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = [len(roots)]  # 已入栈、尚未处理完的目录数
+    failed = []
+    done = object()
+
+    def put(item):
+        """放入结果队列；调用方已停止迭代时放弃并返回 False。"""
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        while True:
+            item = tasks.get()
+            if item is None:
+                return
+            path, mtime = item
+            children = []
+            try:
+                entries = list_dir(path, mtime)
+                if entries is not None:
+                    entries = _filtered(entries, skip_dirs)
+                    if put((path, entries)):
+                        for e in entries:
+                            if e.is_dir:
+                                full = os.path.join(path, e.name)
+                                if not scanner.excluded(full):
+                                    children.append((full, e.mtime))
+            except Exception as e:
+                # 单个目录失败不影响整体；逐个目录只记 debug，遍历结束后汇总一条
+                failed.append(path)
+                logger.debug("扫描目录失败：%s %r", path, e)
+
+            # 子目录先计数再入栈：计数归零时不会再有新的目录
+            with lock:
+                pending[0] += len(children) - 1
+                finished = pending[0] == 0
+            for child in children:
+                tasks.put(child)
+            if finished:
+                put(done)
+
+    threads = [threading.Thread(target=worker, name=f"scan-{i}", daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+    for root in reversed(roots):
+        tasks.put((root, None))
+
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+
+    if failed:
+        logger.warning("扫描时 %d 个目录失败，例如 %s", len(failed), failed[0])
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+# =========================
+# 搜索执行器
+# =========================
+# 搜索在专用的线程池中执行，不占用 Starlette 默认线程池，突发查询时 /health、/file/v1/reload/index
+# 等接口仍能及时响应。
+# 同时在执行和排队的搜索不超过 workers + queue_size 个，超出时立即拒绝 (SearchOverloaded -> 429)，
+# 不再无限排队；排队时间计入请求的 timeout_ms，因此过载时延迟有上界。
+# 每个请求可带一个 Deadline：关键词匹配分块进行，块与块之间检查是否超时，超时后停止匹配，
+# 返回已经匹配到的部分结果并标记 truncated。
+
+
+class SearchOverloaded(RuntimeError):
+    """排队的搜索已满，请求被拒绝。"""
+
+
+class SearchUnavailable(RuntimeError):
+    """搜索线程池已关闭（服务正在停止）。"""
+
+
+class Deadline:
+    """请求的截止时间；expired() 在确实因超时而放弃剩余工作时调用，同时记下结果不完整。"""
+
+    __slots__ = ("at", "truncated")
+
+    def __init__(self, timeout_ms=None):
+        self.at = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000
+        self.truncated = False
+
+    def expired(self):
+        if self.at is not None and time.monotonic() >= self.at:
+            self.truncated = True
+            return True
+        return False
+
+
+class SearchExecutor:
+    def __init__(self, workers=4, queue_size=32):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+        self._lock = threading.Lock()
+        self._pending = 0  # 执行中 + 排队中
+
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn, *args, admit=True, **kwargs):
+        """
+        提交到搜索线程池，返回 concurrent.futures.Future。
+        admit=True 时做准入控制：执行中和排队中的搜索已达上限则抛出 SearchOverloaded。
+        """
+        with self._lock:
+            if admit and self._pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise SearchOverloaded(f"搜索排队已满（{self._pending}）")
+            self._pending += 1
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except RuntimeError:
+            self._done(None)
+            raise SearchUnavailable("搜索服务已停止")
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future is not None:
+                self.completed += 1
+
+    async def run(self, fn, *args, admit=True, **kwargs):
+        """在搜索线程池中执行 fn 并等待结果（不阻塞事件循环）。"""
+        return await asyncio.wrap_future(self.submit(fn, *args, admit=admit, **kwargs))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+def _env_int(name, default):
+    value = os.environ.get(name, "")
+    try:
+        return max(1, int(value)) if value else default
+    except ValueError:
+        print(f"{name} 无效，使用默认值：", value)
+        return default
+
+
+def configured_workers():
+    """FILE_SEARCH_WORKERS 环境变量指定搜索线程数，默认 CPU 核数（最多 8）。"""
+    return _env_int("FILE_SEARCH_WORKERS", min(8, os.cpu_count() or 4))
+
+
+def configured_queue_size():
+    """FILE_SEARCH_QUEUE 环境变量指定最多排队的搜索数，默认 32。"""
+    return _env_int("FILE_SEARCH_QUEUE", 32)
+
+
+search_executor = SearchExecutor(configured_workers(), configured_queue_size())
@@ -0,0 +1,93 @@
+from typing import Optional
+
+import numpy as np
+
+# =========================
+# 向量化过滤
+# =========================
+# 大小 / 时间 / 文件大类 / DIR-FILE 条件在列数组上一次性算出布尔掩码，
+# 关键词匹配只在掩码为 True 的行上进行。文件大类经扩展名 id -> 分类序号的查找表换算，
+# 「其他」与具体分类一样只是一次查表比较，不再逐个比对已知扩展名。
+# 传入 rows 时只计算这些行（与 rows 一一对应），范围搜索的代价因此只与子树大小有关。
+
+# FILE_TYPE_MAP 中的两个特殊分类
+FOLDER = "文件夹"
+OTHERS = "其他"
+
+
+def category_lut(store, type_map):
+    """
+    分类查找表：lut[ext_id] 为扩展名所属分类的序号（type_map 中带扩展名列表的分类按顺序从 1 编号，
+    0 表示不属于任何分类，即「其他」）。各分类的扩展名互不重叠，重复时归入靠前的分类。
+    扩展名表只增不减，查找表缓存在存储上，出现新扩展名后才重建。
+    """
+    cached = store.ext_categories
+    if cached is not None and cached[0] is type_map and len(cached[1]) == len(store.exts):
+        return cached[1]
+
+    category_of = {}
+    for cid, exts in enumerate((v for v in type_map.values() if isinstance(v, list)), 1):
+        for e in exts:
+            category_of.setdefault(e, cid)
+    lut = np.array([category_of.get(e, 0) for e in store.exts], dtype=np.int8)
+    store.ext_categories = (type_map, lut)
+    return lut
+
+
+def category_id(type_map, file_type):
+    """分类的序号（与 category_lut 一致），没有扩展名列表的分类返回 None。"""
+    cid = 0
+    for name, exts in type_map.items():
+        if isinstance(exts, list):
+            cid += 1
+            if name == file_type:
+                return cid
+    return None
+
+
+def _column(col, rows):
+    return col.values if rows is None else col.values[rows]
+
+
+def type_mask(store, file_type, type_map, rows=None):
+    """文件大类掩码：文件夹只保留 DIR，其余只保留 FILE 并按扩展名过滤。"""
+    is_dir = _column(store.is_dir, rows)
+    if file_type == FOLDER:
+        return is_dir.copy()
+
+    mask = ~is_dir
+    cid = 0 if file_type == OTHERS else category_id(type_map, file_type)
+    if cid is not None:
+        mask &= category_lut(store, type_map)[_column(store.ext_id, rows)] == cid
+    return mask
+
+
+def has_value_filter(min_size, max_size, min_time, max_time):
+    return any(v is not None for v in (min_size, max_size, min_time, max_time))
+
+
+def build_mask(
+        store,
+        file_type: Optional[str],
+        type_map,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        min_time: Optional[int] = None,
+        max_time: Optional[int] = None,
+        rows=None,
+):
+    """一次向量化遍历得到所有条件的组合掩码（已删除的行始终排除）。"""
+    mask = type_mask(store, file_type, type_map, rows)
+    mask &= _column(store.alive, rows)
+
+    if min_size is not None:
+        mask &= _column(store.size, rows) >= min_size
+    if max_size is not None:
+        mask &= _column(store.size, rows) <= max_size
+
+    if min_time is not None:
+        mask &= _column(store.mtime, rows) >= min_time
+    if max_time is not None:
+        mask &= _column(store.mtime, rows) <= max_time
+
+    return mask
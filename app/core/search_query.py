@@ -0,0 +1,37 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core import pagination
+
+# =========================
+# 搜索条件
+# =========================
+# 一次搜索的全部条件打包成一个不可变对象，从路由一路传到 DiskIndexer / ShardedIndexer 的内部方法，
+# 分片查询也直接转发同一个对象，不再逐层重复十几个位置参数。
+# 规范化（关键词折叠、去重，无效分类视为不限）由 DiskIndexer._query_key 完成，结果用作缓存键。
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    keywords: str = ""
+    file_type: Optional[str] = None
+    keyword_mode: str = "or"
+    min_size: Optional[int] = None  # 字节
+    max_size: Optional[int] = None
+    min_time: Optional[int] = None  # FILETIME (100ns)
+    max_time: Optional[int] = None
+    sort_by: str = "time"  # time / size / name / relevance
+    reverse: bool = True
+    limit: Optional[int] = None
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor
+    under: Optional[str] = None  # 只搜索该目录下的条目
+    session: Optional[str] = None  # 边输入边搜索的会话标识
+    match: str = "name"  # name / pinyin
+
+    def signature(self):
+        """游标绑定的查询签名：决定结果集合与顺序的条件（不含 limit / cursor / session）。"""
+        return pagination.query_signature(
+            self.keywords, self.file_type, self.keyword_mode,
+            self.min_size, self.max_size, self.min_time, self.max_time,
+            self.sort_by, self.reverse, self.under, self.match,
+        )
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+# =========================
+# 边输入边搜索的会话
+# =========================
+# 启动器里用户依次输入 "rep" / "repo" / "repor" / "report"，每次按键都是一次搜索。
+# 客户端带上同一个 session 时，服务端记住上一次的命中行号；新查询只是上一次的「收窄」时
+# （条件不变、关键词更长），直接在上一次的结果里逐行校验，代价与上一次结果的大小成正比。
+#
+# 收窄的判定（新结果一定包含于旧结果）：
+#   旧 and、新 and：旧的每个关键词都是某个新关键词的子串；
+#   旧 and、新 or ：每个新关键词都包含全部旧关键词；
+#   旧 or 、新 and：某个新关键词包含某个旧关键词；
+#   旧 or 、新 or ：每个新关键词都包含某个旧关键词。
+# 单个关键词时 and / or 等价，按 or 处理。
+# 会话只在同一代索引内有效，超过 ttl 秒未使用即丢弃，总数超过 max_sessions 时淘汰最久未用的。
+
+
+def narrows(old_kws, old_mode, new_kws, new_mode):
+    """new_kws 的结果是否一定包含于 old_kws 的结果。"""
+    if not old_kws or not new_kws:
+        return False
+    if old_mode == "and":
+        if new_mode == "and":
+            return all(any(o in n for n in new_kws) for o in old_kws)
+        return all(o in n for o in old_kws for n in new_kws)
+    if new_mode == "and":
+        return any(o in n for o in old_kws for n in new_kws)
+    return all(any(o in n for o in old_kws) for n in new_kws)
+
+
+class SearchSessions:
+    def __init__(self, ttl=30.0, max_sessions=1024):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # session -> (过期时间, 代数, 查询键, 行号)
+
+        self.refined = 0  # 在上一次结果上收窄的次数
+        self.rescanned = 0  # 无法收窄、完整搜索的次数
+
+    def __len__(self):
+        return len(self._items)
+
+    def _expire(self, now):
+        while self._items:
+            session, item = next(iter(self._items.items()))
+            if item[0] > now and len(self._items) <= self.max_sessions:
+                break
+            del self._items[session]
+
+    def get(self, session, generation):
+        """(查询键, 行号)；会话不存在、已过期或索引已更新时返回 None。"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._items.get(session)
+            if item is None or item[1] != generation:
+                return None
+            return item[2], item[3]
+
+    def put(self, session, generation, key, rows):
+        rows.flags.writeable = False
+        now = time.monotonic()
+        with self._lock:
+            self._items.pop(session, None)
+            self._items[session] = (now + self.ttl, generation, key, rows)
+            self._expire(now)
+
+    def drop(self, session):
+        with self._lock:
+            self._items.pop(session, None)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._items), "refined": self.refined, "rescanned": self.rescanned}
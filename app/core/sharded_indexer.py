@@ -0,0 +1,432 @@
+import os
+import re
+import threading
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from typing import Optional
+
+import numpy as np
+
+from app.core import json_rows, pagination, relevance
+from app.core.kernel32_search import DiskIndexer
+from app.core.name_suggest import OVERLAY_MAX, NameSuggester
+from app.core.scanners import default_scanner
+from app.core.search_query import SearchQuery
+
+# =========================
+# 按根目录分片的索引
+# =========================
+# 每个根目录（盘符 / 挂载点）一个分片，分片就是一个独立的 DiskIndexer：各自的存储、索引文件、代数、
+# 结果缓存和补全表。因此可以单独重建 / 重载某一个盘，其他盘的搜索和缓存不受影响。
+#
+# 查询并行分发到各分片（线程池，调用线程自己处理第一个分片）：各分片匹配后按游标取自己的 top-k
+# 并算出排序键，再用 pagination.merge 做 k 路归并，耗时接近最慢的分片，而不是各分片之和。
+# 流式输出时各分片只预先算好第一批，之后按归并的需要逐页向后取。
+#
+# 全局顺序为 (排序键, 全局行号)，全局行号 = 分片内行号 * 分片数 + 分片序号，与各分片内部
+# (排序键, 行号) 的顺序一致，游标沿用 pagination 的格式；代数为各分片代数之和（任一分片更新后旧游标失效）。
+# 相关度排序的新旧加分需要统一基准：先在所有分片匹配，取全部候选的时间范围，再分别打分。
+# 只有一个分片时直接交给该分片处理，结果与游标格式相同。
+
+
+def root_key(root):
+    """根目录的比较键（与 SubtreeIndex.resolve 一致：去掉末尾分隔符，不区分大小写）。"""
+    return root.rstrip("/\\").lower()
+
+
+def _under(key, root):
+    """比较键 key 是否为根目录 root（比较键）本身或位于其下。"""
+    return key == root or key.startswith(root) and key[len(root):len(root) + 1] in ("/", "\\")
+
+
+def top_roots(roots):
+    """去掉嵌套在其他根目录下的根目录（例如同时有 "/" 和 "/data" 时只保留 "/"），避免两个分片重复索引。"""
+    kept = []
+    for root in sorted(dict.fromkeys(roots), key=lambda r: len(root_key(r))):
+        if not any(_under(root_key(root), root_key(k)) for k in kept):
+            kept.append(root)
+    return [r for r in roots if r in kept]
+
+
+def shard_file(index_file, root):
+    """分片的索引文件：在扩展名前插入根目录的标识，例如 kernel32_index.C-xxxxxxxx.idx。"""
+    stem, ext = os.path.splitext(index_file)
+    slug = re.sub(r"[^0-9A-Za-z]+", "_", root).strip("_")[-32:] or "root"
+    crc = zlib.crc32(root.encode("utf-8", "surrogateescape"))
+    return f"{stem}.{slug}-{crc:08x}{ext}"
+
+
+class _ShardScanner:
+    """只报告一个根目录的扫描后端，其余方法转发给共享的扫描后端。"""
+
+    def __init__(self, scanner, root):
+        self._scanner = scanner
+        self._root = root
+
+    def roots(self):
+        return [self._root]
+
+    def __getattr__(self, name):
+        return getattr(self._scanner, name)
+
+
+class ShardedIndexer:
+    def __init__(
+            self,
+            index_file="kernel32_index.idx",
+            skip_dirs=None,
+            auto_build=True,
+            scanner=None,
+            roots=None,
+            scan_workers=1,
+            result_cache_bytes=64 * 1024 ** 2,
+            session_ttl=30.0,
+            fragment_cache_bytes=32 * 1024 ** 2,
+            search_workers=None,
+    ):
+        self.index_file = index_file
+        self.scanner = scanner or default_scanner(roots)
+        self.roots = top_roots(self.scanner.roots())
+        n = max(1, len(self.roots))
+        # 查询分发用的线程池（调用线程自己处理一个分片，所以每个查询最多占用 分片数 - 1 个线程）
+        self._pool = ThreadPoolExecutor(
+            max_workers=search_workers or min(32, 4 * n), thread_name_prefix="shard",
+        )
+
+        def open_shard(root):
+            # 缓存预算按分片均分
+            return DiskIndexer(
+                index_file=shard_file(index_file, root),
+                skip_dirs=skip_dirs,
+                auto_build=auto_build,
+                scanner=_ShardScanner(self.scanner, root),
+                scan_workers=scan_workers,
+                result_cache_bytes=result_cache_bytes // n,
+                session_ttl=session_ttl,
+                fragment_cache_bytes=fragment_cache_bytes // n,
+            )
+
+        # 各分片并行加载 / 构建，不同的盘互不等待
+        self.shards = self._each(lambda t: open_shard(self.roots[t]), range(len(self.roots)))
+        self.skip_dirs = self.shards[0].skip_dirs if self.shards else set()
+        self.meta = {"drives": list(self.roots)}
+        self.ready = all(shard.ready for shard in self.shards)
+
+        # 多个分片时维护一张合并的文件名补全表（同名条目的次数相加）：分片发布新一代时按其变化的名称增量更新
+        self._suggester = None
+        self._suggest_lock = threading.Lock()
+        if len(self.shards) > 1:
+            for shard in self.shards:
+                shard.on_publish = self._shard_published
+            with self._suggest_lock:
+                self._suggester = self._combine_suggesters()
+
+    # =========================
+    # Shards
+    # =========================
+    @property
+    def generation(self):
+        return sum(shard.generation for shard in self.shards)
+
+    def snapshots(self):
+        """各分片的当前快照（一次查询自始至终使用同一组快照）。"""
+        return [shard.snapshot() for shard in self.shards]
+
+    def shard_of(self, path):
+        """path 所在分片的序号（按最长的根目录匹配），不在任何根目录下时返回 None。"""
+        key = root_key(path)
+        best = None
+        for t, root in enumerate(self.roots):
+            rk = root_key(root)
+            if _under(key, rk) and (best is None or len(rk) > len(root_key(self.roots[best]))):
+                best = t
+        return best
+
+    def _targets(self, drives):
+        """drives 对应的分片序号，drives 为空时为全部分片；含有不是根目录的项时抛出 ValueError。"""
+        if not drives:
+            return list(range(len(self.shards)))
+        keys = {root_key(r): t for t, r in enumerate(self.roots)}
+        unknown = [d for d in drives if root_key(d) not in keys]
+        if unknown:
+            raise ValueError(f"不是索引的根目录: {', '.join(unknown)}")
+        return sorted({keys[root_key(d)] for d in drives})
+
+    def _fan_out(self, fn, *iterables):
+        """对每组参数并行执行 fn：第一组在当前线程执行，其余提交到查询线程池；按参数顺序返回结果。"""
+        calls = list(zip(*iterables))
+        if not calls:
+            return []
+        futures = [self._pool.submit(fn, *args) for args in calls[1:]]
+        first = fn(*calls[0])
+        return [first] + [f.result() for f in futures]
+
+    @staticmethod
+    def _each(fn, targets):
+        """对 targets 中的每个分片序号并行执行 fn（写操作各用一个线程，不占用查询线程池）。"""
+        targets = list(targets)
+        if len(targets) <= 1:
+            return [fn(t) for t in targets]
+        with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="shard-write") as pool:
+            return list(pool.map(fn, targets))
+
+    # =========================
+    # Build / Update
+    # =========================
+    def build_index(self, drives=None, force=False, stats=None):
+        """重建 drives（默认全部）对应的分片，各分片并行扫描。stats 同 update_index。"""
+        self._write(drives, stats, lambda shard, progress: shard.build_index(force=force, stats=progress))
+
+    def update_index(self, drives=None, full=False, stats=None):
+        """
+        增量更新 drives（默认全部）对应的分片，各分片并行扫描，未涉及的分片不受影响。
+        stats 为可选的 dict，stats["shards"] 按根目录实时记录各分片的扫描进度。
+        """
+        self._write(drives, stats, lambda shard, progress: shard.update_index(full=full, stats=progress))
+
+    def _write(self, drives, stats, fn):
+        targets = self._targets(drives)
+        # 先放好各分片的进度 dict，扫描期间只原地更新，读取方遍历时不会遇到新增的键
+        progress = {self.roots[t]: {} for t in targets}
+        if stats is not None:
+            stats["shards"] = progress
+        self._each(lambda t: fn(self.shards[t], progress[self.roots[t]]), targets)
+
+    @property
+    def scan_stats(self):
+        """各分片最近一次扫描的统计（按根目录）。"""
+        return {root: shard.scan_stats for root, shard in zip(self.roots, self.shards) if shard.scan_stats}
+
+    def apply_changes(self, upserts=(), deletes=(), roots=()):
+        """
+        按路径所在的根目录分发到各分片（见 DiskIndexer.apply_changes）；不在任何根目录下的路径忽略。
+        roots 只为与 DiskIndexer 的接口一致，分片的根目录在创建时就已确定。
+        """
+        parts = {}
+        for entry in upserts:
+            t = self.shard_of(entry[0])
+            if t is not None:
+                parts.setdefault(t, ([], []))[0].append(entry)
+        for path in deletes:
+            t = self.shard_of(path)
+            if t is not None:
+                parts.setdefault(t, ([], []))[1].append(path)
+
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        for t, (shard_upserts, shard_deletes) in sorted(parts.items()):
+            result = self.shards[t].apply_changes(shard_upserts, shard_deletes, [self.roots[t]])
+            for k, v in result.items():
+                stats[k] += v
+        return stats
+
+    def compact(self):
+        return sum(self._each(lambda t: self.shards[t].compact(), range(len(self.shards))))
+
+    def save(self):
+        """各分片保存尚未写入索引文件的实时更新（见 DiskIndexer.save），返回是否有分片写入。"""
+        return any(self._each(lambda t: self.shards[t].save(), range(len(self.shards))))
+
+    # =========================
+    # Search
+    # =========================
+    def search(self, keywords: str = "", file_type: Optional[str] = None, **options):
+        """参数与返回值同 DiskIndexer.search。"""
+        return self.search_page(SearchQuery(keywords, file_type, **options))["items"]
+
+    def search_page(self, query: SearchQuery, deadline=None):
+        """参数与返回值同 DiskIndexer.search_page。"""
+        if len(self.shards) == 1:
+            return self.shards[0].search_page(query, deadline)
+
+        snaps, page, total, next_cursor, generation = self._page_rows(query, deadline)
+        return {
+            "items": self._gather(page, lambda t, rows: snaps[t].store.records(rows)),
+            "total": total,
+            "next_cursor": next_cursor,
+            "generation": generation,
+            "truncated": bool(deadline and deadline.truncated),
+        }
+
+    def search_json(self, query: SearchQuery, fields=json_rows.RECORD_FIELDS, as_page: bool = True, deadline=None):
+        """参数与返回值同 DiskIndexer.search_json；JSON 片段缓存在各分片中。"""
+        if len(self.shards) == 1:
+            return self.shards[0].search_json(query, fields, as_page, deadline)
+
+        snaps, page, total, next_cursor, generation = self._page_rows(query, deadline)
+        fragments = self._gather(page, lambda t, rows: self.shards[t].row_fragments.encode(
+            snaps[t].store, snaps[t].generation, rows, fields,
+        ))
+        if not as_page:
+            return json_rows.json_array(fragments)
+        truncated = bool(deadline and deadline.truncated)
+        return json_rows.json_page(fragments, total, next_cursor, generation, truncated)
+
+    def _page_rows(self, query, deadline=None):
+        """
+        返回 (各分片快照, 本页 [(排序键, 全局行号, 分片序号, 行号), ...], 总数, 下一页游标, 代数)。
+        各分片只需给出游标之后的前 limit 条，归并后取前 limit 条。
+        """
+        snaps = self.snapshots()
+        generation = sum(snap.generation for snap in snaps)
+        signature = query.signature()
+        after = pagination.decode_cursor(query.cursor, generation, signature) if query.cursor else None
+
+        rows = self._match(snaps, query, lambda shard, snap: shard._query_rows(snap, query, after, deadline))
+        kws, target = DiskIndexer._ranking(query)
+        sort_by, reverse, limit = query.sort_by, query.reverse, query.limit
+        span = self._span(snaps, rows) if sort_by == "relevance" else None
+        n = len(self.shards)
+
+        def top(t, shard, snap, shard_rows):
+            shard_after = None
+            if after is not None:
+                # 全局游标 (键, 行号 * n + 序号) 之后的行：序号不大于游标所在分片的，同键时行号须更大
+                last, s = divmod(int(after[1]), n)
+                shard_after = (after[0], last if t <= s else last - 1)
+            page = shard._order_rows(snap, shard_rows, sort_by, reverse, limit, shard_after, kws, target, span)
+            return self._entries(t, snap, page, sort_by, kws, target, span)
+
+        parts = self._fan_out(top, range(n), self.shards, snaps, rows)
+        page = list(islice(pagination.merge(parts, reverse, sort_by == "name"), limit))
+
+        next_cursor = None
+        if limit is not None and len(page) == limit and len(page) and not (deadline and deadline.truncated):
+            key, gid = page[-1][:2]
+            next_cursor = pagination.encode_cursor(generation, signature, key, gid)
+        return snaps, page, sum(len(r) for r in rows), next_cursor, generation
+
+    def search_iter(self, query: SearchQuery, deadline=None):
+        """同 DiskIndexer.search_iter：按排序顺序分批产出记录 dict 的列表（各分片的结果流式归并）。"""
+        if len(self.shards) == 1:
+            yield from self.shards[0].search_iter(query, deadline)
+            return
+
+        path_caches = [{} for _ in self.shards]
+        for snaps, batch in self._iter_rows(query, deadline):
+            yield self._gather(batch, lambda t, rows: snaps[t].store.records(rows, path_caches[t]))
+
+    def search_ndjson(self, query: SearchQuery, fields=json_rows.RECORD_FIELDS, deadline=None):
+        """search_iter 的 NDJSON 字节版本。"""
+        if len(self.shards) == 1:
+            yield from self.shards[0].search_ndjson(query, fields, deadline)
+            return
+
+        path_caches = [{} for _ in self.shards]
+        for snaps, batch in self._iter_rows(query, deadline):
+            fragments = self._gather(batch, lambda t, rows: self.shards[t].row_fragments.encode(
+                snaps[t].store, snaps[t].generation, rows, fields, path_caches[t], keep=False,
+            ))
+            yield b"\n".join(fragments) + b"\n"
+
+    def _iter_rows(self, query, deadline=None):
+        """
+        按排序顺序分批产出 (各分片快照, [(排序键, 全局行号, 分片序号, 行号), ...])。
+        各分片的第一批并行算好，之后的页（倍增）只在归并取到该分片时才计算。
+        """
+        snaps = self.snapshots()
+        rows = self._match(snaps, query, lambda shard, snap: shard._cached_match_rows(snap, query, deadline))
+        kws, target = DiskIndexer._ranking(query)
+        sort_by, reverse, limit = query.sort_by, query.reverse, query.limit
+        span = self._span(snaps, rows) if sort_by == "relevance" else None
+        batch = DiskIndexer.STREAM_BATCH
+
+        firsts = self._fan_out(
+            lambda shard, snap, shard_rows: shard._order_rows(
+                snap, shard_rows, sort_by, reverse, batch, None, kws, target, span,
+            ),
+            self.shards, snaps, rows,
+        )
+
+        def entries(t, shard, snap, shard_rows, first):
+            for page in shard._sorted_pages(snap, shard_rows, sort_by, reverse, limit, kws, target, span, first):
+                yield from self._entries(t, snap, page, sort_by, kws, target, span)
+
+        streams = [entries(t, *args) for t, args in enumerate(zip(self.shards, snaps, rows, firsts))]
+        merged = islice(pagination.merge(streams, reverse, sort_by == "name"), limit)
+        while True:
+            chunk = list(islice(merged, batch))
+            if not chunk:
+                break
+            yield snaps, chunk
+
+    def _match(self, snaps, query, fn):
+        """
+        各分片并行执行 fn(分片, 快照) 得到匹配的行号；
+        限定目录时只有该目录所在的分片需要搜索（其他分片不必构建子树区间）。
+        """
+        if query.under:
+            empty = np.empty(0, dtype=np.int64)
+            t = self.shard_of(query.under)
+            return [fn(shard, snap) if i == t else empty for i, (shard, snap) in enumerate(zip(self.shards, snaps))]
+        return self._fan_out(fn, self.shards, snaps)
+
+    @staticmethod
+    def _span(snaps, rows):
+        """所有分片候选行的修改时间范围，作为相关度新旧加分的统一基准。"""
+        spans = [relevance.time_span(snap.store, r) for snap, r in zip(snaps, rows) if len(r)]
+        if not spans:
+            return 0, 0
+        return min(lo for lo, _ in spans), max(hi for _, hi in spans)
+
+    def _entries(self, t, snap, page, sort_by, kws, target, span):
+        """分片 t 中排好序的行号 -> [(排序键, 全局行号, 分片序号, 行号), ...]。"""
+        keys = DiskIndexer._sort_keys(snap, page, sort_by, kws, target, span)
+        page = np.asarray(page, dtype=np.int64)
+        return list(zip(keys, (page * len(self.shards) + t).tolist(), repeat(t), page.tolist()))
+
+    @staticmethod
+    def _gather(entries, fn):
+        """按分片分组批量调用 fn(分片序号, 行号列表)，再按 entries 的顺序排列结果。"""
+        groups = {}
+        for i, (_, _, t, row) in enumerate(entries):
+            idx, rows = groups.setdefault(t, ([], []))
+            idx.append(i)
+            rows.append(row)
+        out = [None] * len(entries)
+        for t, (idx, rows) in groups.items():
+            for i, value in zip(idx, fn(t, rows)):
+                out[i] = value
+        return out
+
+    # =========================
+    # Suggest
+    # =========================
+    def suggest(self, prefix: str, limit: int = 10, rank: str = "frequency"):
+        """文件名前缀补全：所有分片合并成一张补全表（同名条目的次数相加），结果与单个索引相同。"""
+        if len(self.shards) == 1:
+            return self.shards[0].suggest(prefix, limit, rank)
+        suggester = self._suggester
+        return suggester.suggest(prefix, limit, rank) if suggester is not None else []
+
+    def _tables(self):
+        return [snap.suggester for snap in self.snapshots() if snap.suggester is not None]
+
+    def _combine_suggesters(self):
+        return NameSuggester.combine(self._tables())
+
+    def _shard_published(self, shard, names):
+        """分片发布新一代后（在该分片的写锁内）：按变化的名称重新合计，names 为 None 或增量过大时整体合并。"""
+        if names is not None and not names:
+            return
+        with self._suggest_lock:
+            table = self._suggester
+            if table is None:
+                return  # 初始化尚未完成，稍后按各分片的当前表合并
+            if names is None or table.overlay_size + len(names) > OVERLAY_MAX:
+                self._suggester = self._combine_suggesters()
+            else:
+                tables = self._tables()
+                self._suggester = table.updated({n: NameSuggester.total(n, tables) for n in names})
+
+    # =========================
+    # Status
+    # =========================
+    def status(self):
+        shards = {root: shard.status() for root, shard in zip(self.roots, self.shards)}
+        return {
+            "total_files": sum(s["total_files"] for s in shards.values()),
+            "generation": self.generation,
+            "shards": shards,
+        }
@@ -0,0 +1,132 @@
+import numpy as np
+
+from app.core.index_store import path_sep
+from app.core.text_fold import fold
+
+# =========================
+# 子树区间（先序编号）
+# =========================
+# 对一代索引中所有存活的行做先序编号：每个目录的后代恰好占据 (pos[d], end[d]) 这一段连续编号。
+# 「只搜 D:\Projects 下面」因此变成一次区间判断，不需要对每条路径做 startswith。
+# 根目录作为虚拟节点参与编号，编号为 len(store) + 根目录序号。
+#
+# 编号只依赖父目录列，按层向量化计算（层数 = 目录深度），每一代快照首次做范围搜索时才构建。
+
+_POS_DTYPE = np.int32
+
+
+def _children(child_rows, bounds, nodes):
+    """nodes 的子项（按 nodes 的顺序分组拼接）以及每个节点的子项数。"""
+    starts = bounds[nodes]
+    counts = bounds[nodes + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return child_rows[:0], counts
+    first = np.cumsum(counts) - counts
+    idx = np.repeat(starts - first, counts) + np.arange(total)
+    return child_rows[idx], counts
+
+
+class SubtreeIndex:
+    __slots__ = ("store", "pos", "end", "order", "_child_rows", "_bounds")
+
+    def __init__(self, store):
+        n = len(store)
+        nroots = len(store.roots)
+        self.store = store
+
+        # 按父节点分组的存活行（根目录下的行归到虚拟节点 n + 根目录序号）
+        live = np.flatnonzero(store.alive.values)
+        parents = store.parent.values[live].astype(np.int64)
+        parents = np.where(parents >= 0, parents, n - 1 - parents)
+        order = np.argsort(parents, kind="stable")
+        self._child_rows = live[order]
+        self._bounds = np.searchsorted(parents[order], np.arange(n + nroots + 1))
+
+        # 自上而下分层，再自下而上累加子树大小
+        levels = [np.arange(n, n + nroots, dtype=np.int64)]
+        groups = []
+        while True:
+            kids, counts = _children(self._child_rows, self._bounds, levels[-1])
+            if not len(kids):
+                break
+            levels.append(kids)
+            groups.append(counts)
+
+        size = np.ones(n + nroots, dtype=np.int64)
+        for parent_level, counts, level in zip(reversed(levels[:-1]), reversed(groups), reversed(levels[1:])):
+            np.add.at(size, np.repeat(parent_level, counts), size[level])
+
+        # 自上而下分配编号：子项编号 = 父目录编号 + 1 + 同一目录中排在它前面的兄弟子树大小之和
+        pos = np.full(n + nroots, -1, dtype=np.int64)
+        pos[levels[0]] = np.cumsum(size[levels[0]]) - size[levels[0]]
+        for parent_level, counts, level in zip(levels, groups, levels[1:]):
+            sizes = size[level]
+            before = np.cumsum(sizes) - sizes
+            first = np.cumsum(counts) - counts
+            base = np.repeat(np.concatenate([[0], np.cumsum(sizes)])[first], counts)
+            pos[level] = np.repeat(pos[parent_level], counts) + 1 + before - base
+
+        reached = pos >= 0
+        self.pos = pos.astype(_POS_DTYPE)
+        self.end = np.where(reached, pos + size, -1).astype(_POS_DTYPE)
+        self.order = np.empty(int(size[levels[0]].sum()), dtype=np.int64)
+        self.order[pos[reached]] = np.flatnonzero(reached)
+
+    # =========================
+    # 查找
+    # =========================
+    def children(self, node):
+        return self._child_rows[self._bounds[node]:self._bounds[node + 1]]
+
+    def _child(self, node, name):
+        kids = self.children(node)
+        if not len(kids):
+            return None
+        names = self.store.names.get_many(kids)
+        if name in names:
+            return int(kids[names.index(name)])
+        # Windows 路径不区分大小写
+        names_lc = self.store.names_lc.get_many(kids)
+        name = fold(name)
+        if name in names_lc:
+            return int(kids[names_lc.index(name)])
+        return None
+
+    def resolve(self, path):
+        """目录路径对应的节点（根目录为虚拟节点），不在索引中时返回 None。"""
+        store = self.store
+        sep = path_sep(path)
+        # 根目录可能互相嵌套（例如 "/" 与 "/data"），优先匹配最长的，找不到时再试其他根目录
+        for rid, root in sorted(enumerate(store.roots), key=lambda r: -len(r[1])):
+            root_key = root.rstrip("/\\").lower()
+            head = path[:len(root_key)]
+            rest = path[len(root_key):]
+            if head.lower() != root_key or (rest and rest[0] not in "/\\"):
+                continue
+
+            node = len(store) + rid
+            for name in rest.split(sep):
+                if name:
+                    node = self._child(node, name)
+                    if node is None:
+                        break
+            else:
+                return node
+        return None
+
+    # =========================
+    # 区间
+    # =========================
+    def size(self, node):
+        """节点的存活后代数（不含自身）。"""
+        return int(self.end[node]) - int(self.pos[node]) - 1
+
+    def rows_under(self, node):
+        """节点的所有后代行号（不含自身，升序）。"""
+        return np.sort(self.order[self.pos[node] + 1:self.end[node]])
+
+    def contains(self, node, rows):
+        """rows 中哪些位于节点的子树内（不含自身）。"""
+        p = self.pos[rows]
+        return (p > self.pos[node]) & (p < self.end[node])
@@ -0,0 +1,17 @@
+import unicodedata
+
+# =========================
+# 查询用的文本规范化
+# =========================
+# 建索引和查询时对文件名 / 路径 / 关键词做同一种规范化：Unicode NFKC 再 casefold。
+#   - NFKC 把全角字母数字、兼容字符统一成常规形式："ＲＥＰＯＲＴ２０２３" -> "report2023"；
+#   - casefold 比 lower 更彻底："Straße" -> "strasse"。
+# 规范化后的文本在建索引时一次性存入 IndexStore（names_lc / paths_lc 列），查询时不再逐行转换。
+# 纯 ASCII 文本两者都等价于 lower()，走快速路径。
+
+
+def fold(text):
+    """NFKC + casefold；纯 ASCII 时等价于 lower()。"""
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize("NFKC", text).casefold()
@@ -1,6 +1,6 @@
 import ctypes
-import datetime
 import sys
+import time
 from typing import List
 
 
@@ -40,20 +40,33 @@ def filetime_to_str(ft):
     将 Windows FILETIME 结构转换为可读字符串 (YYYY-MM-DD HH:MM:SS)
     """
     quad = (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+    return filetime_ticks_to_str(quad)
 
+
+def filetime_ticks_to_str(quad):
+    """
+    将 FILETIME 64 位整数 (100ns, 自 1601-01-01 起) 转换为可读字符串
+    """
     if quad == 0:
         return ""
 
     try:
         # 转换为 Unix 时间戳 (秒)
-        unix_timestamp = (quad - 116444736000000000) / 10000000
-        # 格式化为本地时间字符串
-        return datetime.datetime.fromtimestamp(unix_timestamp).strftime('%Y-%m-%d %H:%M:%S')
-    except (OSError, ValueError):
+        unix_timestamp = (quad - 116444736000000000) // 10000000
+        # 格式化为本地时间字符串（time.strftime 比 datetime.strftime 快一倍，批量返回结果时更明显）
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(unix_timestamp))
+    except (OSError, ValueError, OverflowError):
         # 处理某些极端异常的时间戳
         return ""
 
 
+def unix_ns_to_filetime(ns):
+    """
+    将 Unix 纳秒时间戳 (os.stat().st_mtime_ns) 转换为 FILETIME 64 位整数
+    """
+    return ns // 100 + 116444736000000000
+
+
 def format_size(size_bytes):
     """
     将字节大小转换为 KB, MB, GB 格式
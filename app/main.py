@@ -1,15 +1,33 @@
+import logging
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from app.core.index_service import index_service
+from app.core.search_executor import search_executor
 from app.routers import health as health_router
 from app.routers import file_search as file_search_router
 
 import uvicorn
 
+# 索引扫描 / 压缩等后台任务通过 logging 输出（app.core.*），默认显示 INFO 级别
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 索引在后台线程加载 / 构建，不阻塞服务启动
+    index_service.start()
+    yield
+    index_service.stop()
+    search_executor.shutdown()
+
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="FastAPI Demo",
         version="1.0.0",
-        description="FastAPI 项目初始化示例"
+        description="FastAPI 项目初始化示例",
+        lifespan=lifespan,
     )
 
     # 注册路由
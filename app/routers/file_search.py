@@ -1,31 +1,219 @@
-from fastapi import APIRouter
+import asyncio
+import json
 
-from app.core.kernel32_search import DiskIndexer
-from app.vo.file_search import SearchRequest
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core import json_rows
+from app.core.index_service import IndexNotReady, index_service
+from app.core.pagination import CursorError
+from app.core.reload_job import reload_jobs
+from app.core.search_executor import Deadline, SearchOverloaded, SearchUnavailable, search_executor
+from app.core.search_query import SearchQuery
+from app.core.sharded_indexer import root_key
 
 router = APIRouter()
 
-indexer = DiskIndexer()
+
+def get_indexer():
+    """索引未就绪时返回 503，并带上当前初始化状态。"""
+    try:
+        return index_service.get()
+    except IndexNotReady as e:
+        raise HTTPException(status_code=503, detail=e.status, headers={"Retry-After": "5"})
+
+
+async def run_search(fn, *args, **kwargs):
+    """在搜索执行器中运行；排队已满返回 429，执行器已停止返回 503。"""
+    try:
+        return await search_executor.run(fn, *args, **kwargs)
+    except SearchOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def ndjson_stream(request: Request, batches, first):
+    """逐批输出 NDJSON（每行一条记录）；每批之前检查客户端是否已断开，断开后不再继续处理剩余结果。"""
+    try:
+        chunk = first
+        while chunk is not None:
+            yield chunk
+            if await request.is_disconnected():
+                print("客户端断开，停止输出搜索结果")
+                break
+            # 后续批次已经通过准入，在搜索线程池中继续序列化，不阻塞事件循环
+            chunk = await search_executor.run(next, batches, None, admit=False)
+    except asyncio.CancelledError:
+        print("搜索结果流被取消")
+        raise
+    finally:
+        try:
+            batches.close()
+        except ValueError:
+            # 被取消时生成器可能仍在搜索线程中执行这一批，执行完后随对象回收关闭
+            pass
+
 
 @router.get("/v1/search")
-def search(query: str, file_type: str = None):
+async def search(
+        request: Request,
+        query: str = "",
+        file_type: str = None,
+        keyword_mode: str = "or",
+        min_size: int = None,
+        max_size: int = None,
+        min_time: int = None,
+        max_time: int = None,
+        sort_by: str = "time",
+        reverse: bool = True,
+        limit: int = Query(None, ge=1),
+        cursor: str = None,
+        under: str = None,
+        session: str = None,
+        match: str = Query("name", pattern="^(name|pinyin)$"),
+        output: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+        fields: str = None,
+        timeout_ms: int = Query(None, ge=1),
+):
     """
     文件搜索接口
-    - q: 关键字
+    - q: 关键字（可为空，此时按类型 / 大小 / 时间条件筛选）
+    - min_size / max_size: 文件大小范围（字节）
+    - min_time / max_time: 修改时间范围（FILETIME，100ns）
+    - sort_by: time / size / name；relevance 按相关度（文件名完全相同 > 开头 > 单词边界 > 包含，再看路径深度与修改时间）
+    - limit / cursor: 分页，下一页传入上一页返回的 next_cursor
+    - under: 只搜索该目录下的条目，例如 D:\\Projects（可不带关键词，列出整个子树）
+    - match: name 按文件名匹配；pinyin 同时按中文文件名的拼音全拼 / 首字母匹配（如 bg 搜「报告」）
+    - session: 边输入边搜索时由客户端生成并在每次按键时带上，关键词变长时服务端在上一次的结果中收窄
+    - format: json 一次性返回；ndjson 按排序顺序流式输出（每行一条记录，只受 limit 限制，忽略 cursor / session）
+    - fields: 只返回这些字段，逗号分隔，例如 Name,Path,Size,UpdateTime,Type（Size 为格式化后的大小）；默认返回全部字段
+    - timeout_ms: 截止时间（含排队时间），到期后返回已匹配到的部分结果，响应头 X-Search-Truncated: 1，
+      分页结果中 truncated 为 true；搜索排队已满时返回 429
     返回: [{"name": 文件名, "size": 文件大小, "path": 文件完整路径}, ...]
+    分页时返回: {"items": [...], "total": 总数, "next_cursor": 下一页游标, "generation": 索引代数}
     """
-    searchQuery = SearchRequest()
-    searchQuery.keyword = query
-    searchQuery.file_type = file_type
-    results = indexer.search(query,file_type)
-    return results
+    try:
+        fields = json_rows.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    indexer = get_indexer()
+    deadline = Deadline(timeout_ms)
+    search_query = SearchQuery(
+        query, file_type, keyword_mode,
+        min_size=min_size, max_size=max_size, min_time=min_time, max_time=max_time,
+        sort_by=sort_by, reverse=reverse, limit=limit, cursor=cursor,
+        under=under, session=session, match=match,
+    )
+    if output == "ndjson":
+        batches = indexer.search_ndjson(search_query, fields=fields, deadline=deadline)
+        # 第一批（包含匹配）在这里执行，排队已满时还能返回 429
+        first = await run_search(next, batches, None)
+        return StreamingResponse(
+            ndjson_stream(request, batches, first),
+            media_type="application/x-ndjson",
+            headers=truncated_headers(deadline),
+        )
 
+    # 记录的 JSON 片段直接拼接成响应体，不经过 jsonable_encoder
+    try:
+        body = await run_search(
+            indexer.search_json, search_query, fields=fields,
+            as_page=not (limit is None and cursor is None and session is None), deadline=deadline,
+        )
+    except CursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/json", headers=truncated_headers(deadline))
 
-@router.get("/v1/reload/index")
-def reload_index():
+
+def truncated_headers(deadline):
+    return {"X-Search-Truncated": "1"} if deadline.truncated else None
+
+
+@router.get("/v1/suggest")
+def suggest(
+        prefix: str = "",
+        limit: int = Query(10, ge=1, le=50),
+        rank: str = Query("frequency", pattern="^(frequency|recency)$"),
+):
     """
-    文件搜索接口
-    - q: 关键字
-    返回: [{"name": 文件名, "size": 文件大小, "path": 文件完整路径}, ...]
+    文件名前缀补全
+    - prefix: 文件名前缀（不区分大小写）
+    - rank: frequency 按同名条目数排序，recency 按最近修改时间排序
+    返回: [{"Name": 文件名, "Count": 同名条目数, "UpdateTS": 最近修改时间, "UpdateTime": ...}, ...]
+    """
+    return get_indexer().suggest(prefix, limit, rank)
+
+
+@router.post("/v1/reload/index", status_code=202)
+def reload_index(full: bool = False, drive: str = None):
+    """
+    在后台更新索引，立即返回任务状态
+    - full: 默认 false 为增量重载，跳过修改时间未变化的目录，只发现新增 / 删除 / 重命名，
+      不会发现这些目录中只改了内容的文件（大小、修改时间）；需要时传 full=true 重新列出所有目录
+    - drive: 只重载这一个根目录（盘符 / 挂载点）的分片，默认全部
+    已有覆盖该范围、且不弱于请求（full 包含增量）的重载任务时不再启动新的扫描，返回该任务（attached=true）；
+    否则新建后续任务，等范围重叠的任务结束后再扫描（state=queued，waiting_for 为在等的任务 id），
+    已由其他任务覆盖的根目录不重复扫描。
+    进度查询: /file/v1/reload/status?job_id=...，或 SSE 流 /file/v1/reload/events?job_id=...
     """
-    indexer.update_index()
+    indexer = get_indexer()
+    if drive is not None:
+        roots = {root_key(r): r for r in indexer.meta.get("drives") or []}
+        if root_key(drive) not in roots:
+            raise HTTPException(status_code=400, detail=f"不是索引的根目录: {drive}，可选: {', '.join(roots.values())}")
+        drive = roots[root_key(drive)]
+    job, created = reload_jobs.start(indexer, full=full, drive=drive)
+    return {**job.status(), "skips_unchanged_dirs": not job.full, "attached": not created}
+
+
+@router.get("/v1/reload/index", status_code=202, include_in_schema=False)
+def reload_index_legacy(full: bool = True, drive: str = None):
+    """仅为兼容旧的调用方式保留；保持原来的语义，默认 full=true 重新列出所有目录。"""
+    return reload_index(full, drive)
+
+
+def get_job(job_id):
+    """指定 id 的重载任务，不指定时为最近一个；找不到时返回 404。"""
+    job = reload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"重载任务不存在: {job_id}" if job_id else "还没有重载任务")
+    return job
+
+
+@router.get("/v1/reload/status")
+def reload_status(job_id: str = None):
+    """
+    重载任务进度
+    返回: job_id、state（queued / running / done / failed）、elapsed（秒），以及扫描进度：
+    dirs_listed / dirs_skipped（列出 / 跳过的目录数）、added / updated / removed（新增 / 修改 / 删除的条数）
+    """
+    return get_job(job_id).status()
+
+
+async def reload_event_stream(request: Request, job, interval):
+    """每隔 interval 秒推送一次任务状态（SSE），任务结束后推送最终状态并关闭。"""
+    try:
+        while True:
+            if await request.is_disconnected():
+                print("客户端断开，任务是：", job.id)
+                break
+
+            status = job.status()
+            yield f"data: {json.dumps(status, ensure_ascii=False)}\n\n"
+            if job.finished:
+                break
+            await asyncio.sleep(interval)
+    except asyncio.CancelledError:
+        print("重载进度流被取消，任务是：", job.id)
+        raise
+
+
+@router.get("/v1/reload/events")
+async def reload_events(request: Request, job_id: str = None, interval: float = Query(1.0, gt=0, le=60)):
+    """重载任务进度的 SSE 流，字段同 /file/v1/reload/status"""
+    return StreamingResponse(
+        reload_event_stream(request, get_job(job_id), interval),
+        media_type="text/event-stream"
+    )
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 import asyncio
 from pydantic import BaseModel
 
+from app.core.index_service import index_service
+from app.core.reload_job import reload_jobs
+from app.core.search_executor import search_executor
+
 router = APIRouter()
 
 
@@ -39,4 +43,19 @@ async def stream(
 
 @router.get("/")
 def health_check():
-    return {"status": "ok"}
+    job = reload_jobs.get()
+    return {
+        "status": "ok",
+        "index": index_service.status(),
+        "search": search_executor.stats(),
+        "reload": job.status() if job is not None else None,
+    }
+
+
+@router.get("/ready")
+def readiness_check():
+    """就绪探针：索引加载完成前返回 503。"""
+    status = index_service.status()
+    if not index_service.ready:
+        raise HTTPException(status_code=503, detail=status)
+    return {"status": "ready", "index": status}
@@ -0,0 +1,617 @@
+"""
+DiskIndexer 基准测试：旧版 list[dict] 布局 vs 列式 IndexStore。
+
+用法：
+    python -m app.test.bench_indexer [条目数] [扫描目录]
+不指定扫描目录时，在临时目录下生成一棵测试目录树（Linux / Windows 均可运行）。
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.core import json_rows, pinyin, search_filter
+from app.core.index_store import IndexStore
+from app.core.kernel32_search import DiskIndexer, FILE_TYPE_MAP
+from app.core.name_suggest import NameSuggester
+from app.core.node_index import NodeIndex
+from app.core.scanners import default_scanner, walk
+from app.core.search_query import SearchQuery
+from app.core.sharded_indexer import ShardedIndexer
+
+WORDS = ["report", "docker", "报告", "数据", "photo", "movie", "song", "readme", "backup", "项目", "final", "draft"]
+EXTS = [".pdf", ".txt", ".jpg", ".mp4", ".mp3", ".py", ".exe", ".docx", ".zip", ""]
+
+
+def make_records(n, seed=42):
+    rnd = random.Random(seed)
+    records = []
+    for i in range(n):
+        is_dir = rnd.random() < 0.1
+        name = f"{rnd.choice(WORDS)}_{rnd.choice(WORDS)}_{i}" + ("" if is_dir else rnd.choice(EXTS))
+        path = "D:\\" + "\\".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 5))) + "\\" + name
+        ts = 132000000000000000 + rnd.randint(0, 10 ** 16)
+        size = 0 if is_dir else rnd.randint(0, 4 * 1024 ** 3)
+        records.append({
+            "Type": "DIR" if is_dir else "FILE",
+            "Name": name,
+            "NameLC": name.lower(),
+            "Ext": "" if is_dir else os.path.splitext(name)[1].lower(),
+            "Path": path,
+            "RawSize": size,
+            "UpdateTime": "",
+            "UpdateTS": ts,
+            "FP": (size >> 32, size & 0xFFFFFFFF, ts & 0xFFFFFFFF, ts >> 32),
+        })
+    return records
+
+
+def legacy_search(files, keywords, file_type):
+    """旧版逐条 dict 扫描（仅关键词 + 类型 + 时间排序）。"""
+    kws = [k.lower() for k in keywords.split() if k.strip()]
+    exts = FILE_TYPE_MAP.get(file_type)
+    results = []
+    for f in files:
+        if f["Type"] != "FILE":
+            continue
+        if isinstance(exts, list) and f["Ext"] not in exts:
+            continue
+        if not any(k in f["NameLC"] for k in kws):
+            continue
+        results.append(f)
+    results.sort(key=lambda x: x.get("UpdateTS", 0), reverse=True)
+    return results
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = fn()
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, elapsed
+
+
+def timeit(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_store(n):
+    legacy, legacy_mem, _ = measure(lambda: make_records(n))
+    store, store_mem, build_s = measure(lambda: IndexStore.from_records(legacy))
+
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(store)
+
+    print(f"== 列式存储 ({n} 条) ==")
+    print(f"内存  list[dict]: {legacy_mem / 1024 ** 2:8.1f} MB   IndexStore: {store_mem / 1024 ** 2:8.1f} MB")
+    print(f"IndexStore 构建: {build_s:.2f}s")
+
+    # 路径 -> 行号：旧版以完整路径为键的 dict（路径字符串由扫描时拼接生成） vs (父目录, 名称) 哈希
+    rows = range(len(store))
+    _, path_map_mem, _ = measure(lambda: dict(zip(store.paths_of(rows), rows)))
+    _, nodes_mem, _ = measure(lambda: NodeIndex(store))
+    cached = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False)
+    cached._set_store(store)
+
+    print(f"路径查找  dict[Path]: {path_map_mem / 1024 ** 2:8.1f} MB   NodeIndex: {nodes_mem / 1024 ** 2:8.1f} MB")
+
+    for kw, ft in [("report", None), ("报告 final", "文档"), ("_12345", None)]:
+        hits = len(indexer._search_rows(SearchQuery(kw, ft)))
+        t_old = timeit(lambda: legacy_search(legacy, kw, ft))
+        t_rows = timeit(lambda: indexer._search_rows(SearchQuery(kw, ft)))
+        t_new = timeit(lambda: indexer.search(kw, ft))
+        t_cached = timeit(lambda: cached.search_page(SearchQuery(kw, ft, limit=100)))
+        print(
+            f"查询 {kw!r:14} {str(ft):5} 命中 {hits:7}  list[dict]: {t_old * 1000:7.1f} ms   "
+            f"IndexStore 行号: {t_rows * 1000:7.1f} ms  含还原 dict: {t_new * 1000:7.1f} ms  "
+            f"缓存命中(前 100 条): {t_cached * 1000:6.1f} ms"
+        )
+
+
+def legacy_filter(files, exts, min_size, min_time):
+    """旧版逐条 if 判断大小 / 时间 / 类型。"""
+    return [
+        f for f in files
+        if f["Type"] == "FILE" and f["Ext"] in exts
+        and f["RawSize"] >= min_size and f["UpdateTS"] >= min_time
+    ]
+
+
+def bench_filter(n):
+    legacy = make_records(n)
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(legacy))
+
+    # 「本月修改的 1GB 以上视频」
+    min_size = 1024 ** 3
+    min_time = int(indexer.store.mtime.values.max()) - 30 * 24 * 3600 * 10 ** 7
+    exts = FILE_TYPE_MAP["视频"]
+
+    hits = len(indexer._search_rows(SearchQuery("", "视频", min_size=min_size, min_time=min_time)))
+    t_old = timeit(lambda: legacy_filter(legacy, exts, min_size, min_time))
+    t_new = timeit(lambda: indexer._search_rows(SearchQuery("", "视频", min_size=min_size, min_time=min_time)))
+    print(f"== 向量化过滤 ({n} 条) ==")
+    print(f"1GB 以上本月视频 命中 {hits}  逐条 if: {t_old * 1000:7.1f} ms   掩码: {t_new * 1000:7.1f} ms")
+
+
+def bench_scoped(n):
+    """限定目录的搜索：对每条路径 startswith vs 先序区间。"""
+    legacy = make_records(n)
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(legacy))
+
+    print(f"== 限定目录搜索 ({n} 条) ==")
+    snap = indexer.snapshot()
+    t0 = time.perf_counter()
+    snap.subtree
+    print(f"子树区间构建: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    for under, kw in [("D:\\项目", "report"), ("D:\\项目\\report\\数据", ""), ("D:\\报告\\final\\backup", "_1")]:
+        prefix = under.lower() + "\\"
+        hits = len(indexer._search_rows(SearchQuery(kw, under=under)))
+        t_old = timeit(lambda: [
+            f for f in legacy_search(legacy, kw or "_", None) if f["Path"].lower().startswith(prefix)
+        ])
+        t_new = timeit(lambda: indexer._search_rows(SearchQuery(kw, under=under)))
+        print(f"{under!r:28} {kw!r:9} 命中 {hits:6}  startswith: {t_old * 1000:7.1f} ms   区间: {t_new * 1000:7.1f} ms")
+
+
+def bench_typeahead(n):
+    """边输入边搜索：每次按键完整搜索 vs 带会话在上一次结果中收窄。"""
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(make_records(n)))
+    min_size = 1024 ** 3
+
+    print(f"== 边输入边搜索 ({n} 条) ==")
+    for word, ft in [("report_final", None), ("backup_项目", "文档")]:
+        typed = [word[:i] for i in range(3, len(word) + 1)]
+        t_full = t_session = 0.0
+        for i, q in enumerate(typed):
+            t0 = time.perf_counter()
+            indexer.search_page(SearchQuery(q, ft, min_size=min_size, limit=50))
+            t1 = time.perf_counter()
+            indexer.search_page(SearchQuery(q, ft, min_size=min_size, limit=50, session=f"bench-{word}"))
+            t_full += t1 - t0
+            t_session += time.perf_counter() - t1
+        print(
+            f"{word!r:16} {str(ft):5} {len(typed)} 次按键  完整搜索: {t_full * 1000:7.1f} ms   "
+            f"会话收窄: {t_session * 1000:7.1f} ms"
+        )
+    print("会话统计：", indexer.search_sessions.stats())
+
+
+def bench_suggest(n):
+    """文件名补全：完整搜索后去重 vs 排序名称数组二分。"""
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(make_records(n)))
+
+    print(f"== 文件名补全 ({n} 条) ==")
+    t0 = time.perf_counter()
+    suggester = NameSuggester(indexer.store)
+    print(f"补全表构建: {time.perf_counter() - t0:.2f}s  去重名称 {len(suggester)}")
+    path = indexer.store.records(np.flatnonzero(~indexer.store.is_dir.values)[:1])[0]["Path"]
+    ticks = iter(range(1, 1 << 30))
+    t_delta = timeit(lambda: indexer.apply_changes(upserts=[(path, False, 1, next(ticks))]), repeat=20)
+    print(f"修改一条后发布（含补全表增量更新）: {t_delta * 1000:.2f} ms")
+    for prefix in ["r", "report_", "报告_数据_1"]:
+        t_search = timeit(lambda: {f["NameLC"] for f in indexer.search(prefix, None) if f["NameLC"].startswith(prefix)})
+        t_suggest = timeit(lambda: indexer.suggest(prefix, 10), repeat=100)
+        print(f"{prefix!r:14} 搜索后去重: {t_search * 1000:8.1f} ms   补全: {t_suggest * 1e6:7.1f} us")
+
+
+def bench_pinyin(n):
+    """拼音搜索：查询时逐个文件名转换拼音 vs 预先建立的拼音索引。"""
+    print(f"== 拼音搜索 ({n} 条) ==")
+    if not pinyin.available():
+        print("未安装 pypinyin，跳过")
+        return
+
+    legacy = make_records(n)
+    t0 = time.perf_counter()
+    store = IndexStore.from_records(legacy)
+    print(f"IndexStore 构建（含拼音）: {time.perf_counter() - t0:.2f}s")
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(store)
+
+    def convert_all(kw):
+        pinyin.pinyin_text.cache_clear()
+        return [f for f in legacy if kw in f["NameLC"] or kw in pinyin.pinyin_text(f["Name"])]
+
+    for kw in ["bg", "baogao", "sjbg"]:
+        hits = len(indexer._search_rows(SearchQuery(kw, match="pinyin")))
+        t_old = timeit(lambda: convert_all(kw), repeat=1)
+        t_new = timeit(lambda: indexer._search_rows(SearchQuery(kw, match="pinyin")))
+        print(f"{kw!r:10} 命中 {hits:7}  查询时转换: {t_old * 1000:8.1f} ms   拼音索引: {t_new * 1000:7.1f} ms")
+
+
+def bench_relevance(n):
+    """相关度排序：逐行打分 + 全量排序 vs 批量打分 + top-k，对比按时间排序。"""
+    legacy = make_records(n)
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(legacy))
+
+    def score_each(f, kw):
+        name = f["NameLC"]
+        stem = os.path.splitext(name)[0]
+        tier = 4 if kw in (name, stem) else 3 if name.startswith(kw) else 2 if f"_{kw}" in name else 1
+        return tier * 1000 - f["Path"].count("\\") * 10 + f["UpdateTS"] / 1e17
+
+    print(f"== 相关度排序 ({n} 条) ==")
+    for kw in ["report", "final_1", "数据"]:
+        hits = len(indexer._search_rows(SearchQuery(kw, sort_by="relevance")))
+        t_each = timeit(lambda: sorted(legacy_search(legacy, kw, None), key=lambda f: score_each(f, kw), reverse=True)[:50], repeat=1)
+        t_time = timeit(lambda: indexer._search_rows(SearchQuery(kw, limit=50)))
+        t_rel = timeit(lambda: indexer._search_rows(SearchQuery(kw, sort_by="relevance", limit=50)))
+        print(
+            f"{kw!r:10} 命中 {hits:7}  逐行打分: {t_each * 1000:8.1f} ms   "
+            f"按时间 top-50: {t_time * 1000:7.1f} ms   相关度 top-50: {t_rel * 1000:7.1f} ms"
+        )
+
+
+def bench_fields(n):
+    """每条记录的匹配代价：逐条拼接 / 转小写 / 遍历已知扩展名 vs 预先规范化的列 + 分类查找表。"""
+    legacy = make_records(n)
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(legacy))
+    snap = indexer.snapshot()
+    store = snap.store
+
+    def is_known_ext(ext):
+        return any(isinstance(v, list) and ext in v for v in FILE_TYPE_MAP.values())
+
+    def per_item(kw, file_type):
+        results = []
+        for f in legacy:
+            if file_type == "文件夹":
+                if f["Type"] != "DIR":
+                    continue
+                text = f'{f["NameLC"]} {f["Path"].lower()}'
+            else:
+                if f["Type"] != "FILE" or (file_type == "其他" and is_known_ext(f["Ext"])):
+                    continue
+                text = f["NameLC"].lower()
+            if kw in text:
+                results.append(f)
+        return results
+
+    def paths_per_query(kw):
+        dirs = np.flatnonzero(search_filter.build_mask(store, "文件夹", FILE_TYPE_MAP))
+        return [p for p in store.paths_of(dirs) if kw in p.lower()]
+
+    def columns(kw, file_type):
+        rows = np.flatnonzero(search_filter.build_mask(store, file_type, FILE_TYPE_MAP))
+        return indexer._verify_rows(snap, rows, kw, indexer._target(file_type, "name"))
+
+    print(f"== 预先规范化的字段 ({n} 条) ==")
+    for kw, ft in [("项目", "文件夹"), ("report", "其他")]:
+        hits = len(columns(kw, ft))
+        t_old = timeit(lambda: per_item(kw, ft), repeat=1)
+        t_new = timeit(lambda: columns(kw, ft))
+        line = (
+            f"{kw!r:10} {ft:4} 命中 {hits:7}  逐条: {t_old * 1e9 / n:6.0f} ns/条   "
+            f"规范化列: {t_new * 1e9 / n:5.0f} ns/条"
+        )
+        if ft == "文件夹":
+            line += f"   （每次查询拼路径: {timeit(lambda: paths_per_query(kw), repeat=1) * 1e9 / n:5.0f} ns/条）"
+        print(line)
+
+
+def bench_stream(n):
+    """大结果集：一次性构造列表再序列化 vs 流式分批输出 NDJSON（首条结果耗时 / 峰值内存）。"""
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(make_records(n)))
+
+    def whole():
+        return json.dumps(indexer.search("", "其他"), ensure_ascii=False)
+
+    def stream():
+        first = None
+        for items in indexer.search_iter(SearchQuery("", "其他")):
+            "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+            if first is None:
+                first = time.perf_counter()
+        return first
+
+    print(f"== 流式输出 ({n} 条) ==")
+    hits = len(indexer._search_rows(SearchQuery("", "其他")))
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    whole()
+    t_whole = time.perf_counter() - t0
+    peak_whole = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = stream()
+    t_stream = time.perf_counter() - t0
+    peak_stream = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"命中 {hits}  一次性: 首条 {t_whole * 1000:7.1f} ms  峰值 {peak_whole / 1024 ** 2:6.1f} MB   "
+        f"流式: 首条 {(first - t0) * 1000:6.1f} ms  全部 {t_stream * 1000:7.1f} ms  峰值 {peak_stream / 1024 ** 2:6.1f} MB"
+    )
+
+
+def bench_encode(n, count=10_000):
+    """响应编码：dict + jsonable_encoder vs 预序列化的 JSON 片段拼接（每 1 万条结果的耗时）。"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(make_records(n)))
+    query = SearchQuery("", "其他", limit=count)
+    fields = ("Name", "Path", "Size", "UpdateTime", "Type")
+    hits = len(indexer._search_rows(query))
+    scale = 10_000 / max(hits, 1)
+
+    def old():
+        return JSONResponse(jsonable_encoder(indexer.search("", "其他", limit=count))).body
+
+    def new(fields):
+        return indexer.search_json(query, fields=fields, as_page=False)
+
+    print(f"== 响应编码 ({n} 条，取 {hits} 条) ==")
+    t_old = timeit(old, repeat=3)
+    line = f"jsonable_encoder: {t_old * scale * 1000:7.1f} ms/万条"
+    for name, f in [("全部字段", json_rows.RECORD_FIELDS), ("5 个字段", fields)]:
+        indexer.row_fragments.clear()
+        t_cold = timeit(lambda: new(f), repeat=1)
+        t_warm = timeit(lambda: new(f))
+        size = len(new(f))
+        line += f"   片段[{name}]: 首次 {t_cold * scale * 1000:6.1f} / 缓存 {t_warm * scale * 1000:5.1f} ms/万条 {size / 1024:6.0f} KB"
+    print(line)
+
+
+def bench_overload(n, burst=200, workers=4, queue_size=16, timeout_ms=200):
+    """突发查询：Starlette 默认线程池（40 线程，无限排队） vs 搜索执行器（有界排队 + 截止时间）的 p50 / p99 延迟。"""
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.core.search_executor import Deadline, SearchExecutor, SearchOverloaded
+
+    indexer = DiskIndexer(index_file=os.path.join(tempfile.mkdtemp(), "bench.idx"), auto_build=False, result_cache_bytes=0)
+    indexer._set_store(IndexStore.from_records(make_records(n)))
+    queries = [f"_{i % 97} _{i % 89}" for i in range(burst)]
+
+    def percentile(values, p):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+    async def unbounded():
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(40)
+
+        async def one(q):
+            t0 = time.perf_counter()
+            await loop.run_in_executor(pool, lambda: indexer.search_json(SearchQuery(q, limit=50)))
+            return time.perf_counter() - t0
+
+        latencies = await asyncio.gather(*(one(q) for q in queries))
+        pool.shutdown()
+        return latencies, 0, 0
+
+    async def bounded():
+        executor = SearchExecutor(workers, queue_size)
+        rejected = truncated = 0
+
+        async def one(q):
+            nonlocal rejected, truncated
+            t0 = time.perf_counter()
+            deadline = Deadline(timeout_ms)
+            try:
+                await executor.run(indexer.search_json, SearchQuery(q, limit=50), deadline=deadline)
+            except SearchOverloaded:
+                rejected += 1
+            truncated += deadline.truncated
+            return time.perf_counter() - t0
+
+        latencies = await asyncio.gather(*(one(q) for q in queries))
+        executor.shutdown()
+        return latencies, rejected, truncated
+
+    print(f"== 突发查询 ({n} 条，{burst} 个并发查询) ==")
+    for name, run in [("默认线程池", unbounded), (f"执行器 {workers}+{queue_size} / {timeout_ms}ms", bounded)]:
+        latencies, rejected, truncated = asyncio.run(run())
+        print(
+            f"{name:22} p50 {percentile(latencies, 0.5):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  "
+            f"拒绝 {rejected:3}  截断 {truncated:3}"
+        )
+
+
+def make_tree(root, n, seed=42, fanout=20):
+    """生成约 n 个条目的目录树，每个目录 fanout 个子项。"""
+    rnd = random.Random(seed)
+    dirs = [root]
+    count = 0
+    while count < n:
+        parent = dirs[rnd.randrange(len(dirs))]
+        name = f"{rnd.choice(WORDS)}_{count}"
+        path = os.path.join(parent, name)
+        if rnd.random() < 1 / fanout:
+            os.mkdir(path)
+            dirs.append(path)
+        else:
+            with open(path + rnd.choice(EXTS), "wb") as f:
+                f.write(b"x" * rnd.randint(0, 64))
+        count += 1
+
+
+class FixedRoots:
+    """只提供根目录列表的扫描后端（基准测试直接把数据写入存储，不扫描磁盘）。"""
+
+    def __init__(self, roots):
+        self._roots = roots
+
+    def roots(self):
+        return list(self._roots)
+
+
+def bench_shards(n, shards=4):
+    """按根目录分片：单个索引 vs 各分片依次搜索 vs 并行搜索 + k 路归并（top-50，不使用结果缓存）。"""
+    roots = [f"{chr(ord('C') + i)}:\\" for i in range(shards)]
+    parts = []
+    for i, root in enumerate(roots):
+        records = make_records(n // shards, seed=i)
+        for f in records:
+            f["Path"] = root + f["Path"][3:]
+        parts.append(records)
+
+    tmp = tempfile.mkdtemp()
+    single = DiskIndexer(index_file=os.path.join(tmp, "single.idx"), auto_build=False, result_cache_bytes=0)
+    single._set_store(IndexStore.from_records([f for records in parts for f in records]))
+    sharded = ShardedIndexer(
+        index_file=os.path.join(tmp, "bench.idx"), auto_build=False, scanner=FixedRoots(roots), result_cache_bytes=0,
+    )
+    for shard, records in zip(sharded.shards, parts):
+        shard._set_store(IndexStore.from_records(records))
+
+    print(f"== 分片搜索 ({n} 条，{shards} 个分片) ==")
+    queries = [("report", None), ("final_1", None), ("数据 photo", None), ("", "视频"), ("a", "文件夹")]
+    for kw, ft in queries:
+        hits = sharded.search_page(SearchQuery(kw, ft, limit=1))["total"]
+        t_single = timeit(lambda: single.search_json(SearchQuery(kw, ft, limit=50)))
+        t_each = [timeit(lambda: shard.search_json(SearchQuery(kw, ft, limit=50))) for shard in sharded.shards]
+        t_sharded = timeit(lambda: sharded.search_json(SearchQuery(kw, ft, limit=50)))
+        print(
+            f"{kw or ft!r:14} 命中 {hits:7}  单个索引: {t_single * 1000:7.1f} ms   "
+            f"分片依次: {sum(t_each) * 1000:7.1f} ms (最慢 {max(t_each) * 1000:6.1f} ms)   "
+            f"并行 + 归并: {t_sharded * 1000:7.1f} ms"
+        )
+
+    t_single = timeit(lambda: list(single.search_ndjson(SearchQuery("", "其他"))), repeat=1)
+    t_sharded = timeit(lambda: list(sharded.search_ndjson(SearchQuery("", "其他"))), repeat=1)
+    print(f"流式输出全部「其他」: 单个索引 {t_single:.2f}s   分片流式归并 {t_sharded:.2f}s")
+
+
+def bench_scan(n, root=None, scanner=None, workers_list=(1, 8)):
+    tmp = None
+    if root is None:
+        tmp = tempfile.mkdtemp()
+        root = os.path.join(tmp, "tree")
+        os.mkdir(root)
+        make_tree(root, n)
+
+    try:
+        scanner = scanner or default_scanner([root])
+        index_file = os.path.join(tmp or tempfile.gettempdir(), "bench_scan.idx")
+        print(f"== 扫描 {type(scanner).__name__} {root} ==")
+
+        for workers in workers_list:
+            indexer = DiskIndexer(index_file=index_file, auto_build=False, scanner=scanner, scan_workers=workers)
+
+            # 只遍历目录、不写索引，单独衡量扫描本身的墙钟时间
+            t0 = time.perf_counter()
+            for _ in walk(scanner, scanner.roots(), indexer.skip_dirs, workers):
+                pass
+            t_walk = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            indexer.build_index(force=True)
+            t_build = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            indexer.update_index(full=True)
+            t_full = time.perf_counter() - t0
+
+            # 目录均未变化：只查询目录修改时间，不再列出目录
+            t0 = time.perf_counter()
+            indexer.update_index()
+            t_update = time.perf_counter() - t0
+            skipped = indexer.scan_stats["dirs_skipped"]
+
+            t_search = timeit(lambda: indexer.search("report", None))
+            total = indexer.store.live_count
+            print(
+                f"{workers:2} 线程  {total} 条  遍历: {t_walk:.2f}s   "
+                f"build_index: {t_build:.2f}s ({total / t_build:,.0f} 条/s)   "
+                f"update_index(full): {t_full:.2f}s   update_index: {t_update:.2f}s (跳过 {skipped} 个目录)   "
+                f"search: {t_search * 1000:.1f} ms"
+            )
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def legacy_remove(records, paths):
+    """旧版删除：对每个删除的路径执行 list.remove，每次 O(N)。"""
+    by_path = {f["Path"]: f for f in records}
+    for p in paths:
+        records.remove(by_path[p])
+
+
+def bench_rescan(n, fraction=0.5):
+    """删除一部分文件后 update_index 的耗时：旧版 list.remove（抽样估算） vs 墓碑。"""
+    tmp = tempfile.mkdtemp()
+    root = os.path.join(tmp, "tree")
+    os.mkdir(root)
+    make_tree(root, n)
+
+    try:
+        indexer = DiskIndexer(
+            index_file=os.path.join(tmp, "bench_rescan.idx"),
+            auto_build=False, scanner=default_scanner([root]), scan_workers=1,
+        )
+        indexer.build_index(force=True)
+        total = indexer.store.live_count
+
+        files = [os.path.join(d, f) for d, _, names in os.walk(root) for f in names]
+        removed = random.Random(1).sample(files, int(len(files) * fraction))
+        for p in removed:
+            os.remove(p)
+        print(f"== 删除后重新扫描 ({total} 条，删除 {len(removed)} 个文件) ==")
+
+        # 旧版：抽样 1000 次 list.remove，按比例估算全部删除的耗时
+        legacy = indexer.store.records(range(total))
+        sample = removed[:1000]
+        t0 = time.perf_counter()
+        legacy_remove(legacy, sample)
+        t_legacy = (time.perf_counter() - t0) * len(removed) / len(sample)
+
+        t0 = time.perf_counter()
+        indexer.update_index()
+        t_update = time.perf_counter() - t0
+
+        # 墓碑较多时 update_index 已启动后台压缩，等待其完成
+        t0 = time.perf_counter()
+        if indexer._compactor is not None:
+            indexer._compactor.join()
+        t_compact = time.perf_counter() - t0
+
+        print(
+            f"list.remove（估算）: {t_legacy:.2f}s   墓碑 update_index: {t_update:.2f}s   "
+            f"等待后台压缩: {t_compact:.2f}s   剩余 {len(indexer.store)} 行"
+        )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    bench_store(total)
+    bench_filter(total)
+    bench_scoped(total)
+    bench_typeahead(total)
+    bench_suggest(total)
+    bench_pinyin(total)
+    bench_relevance(total)
+    bench_fields(total)
+    bench_stream(total)
+    bench_encode(total)
+    bench_overload(total)
+    bench_shards(total)
+    bench_scan(min(total, 50_000), sys.argv[2] if len(sys.argv) > 2 else None)
+    bench_rescan(min(total, 50_000))
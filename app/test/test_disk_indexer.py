@@ -0,0 +1,298 @@
+"""
+DiskIndexer + ScandirScanner：在临时目录树上建立索引，修改目录树后 update_index / apply_changes，
+检查搜索结果和文件名补全。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+import shutil
+
+import pytest
+
+from app.core.kernel32_search import DiskIndexer
+from app.core.name_suggest import NameSuggester
+from app.core.scanners import ScandirScanner, walk
+from app.core.sharded_indexer import ShardedIndexer
+
+
+def write(path, data="x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(data)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    write(str(root / "docs" / "报告_2024.docx"))
+    write(str(root / "docs" / "notes.txt"), "hello")
+    write(str(root / "docs" / "archive" / "old_report.pdf"))
+    write(str(root / "photos" / "holiday.jpg"))
+    write(str(root / "AppData" / "pkg" / "index.js"))  # 默认跳过的目录（不区分大小写）
+    return str(root)
+
+
+def make_indexer(tree, tmp_path, **kwargs):
+    kwargs.setdefault("scan_workers", 1)
+    return DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([tree]),
+        **kwargs,
+    )
+
+
+def found(indexer, keywords, file_type=None):
+    """命中条目相对根目录的路径集合。"""
+    root = indexer.meta["drives"][0]
+    return {os.path.relpath(r["Path"], root) for r in indexer.search(keywords, file_type)}
+
+
+def test_build_index(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    assert found(indexer, "report") == {os.path.join("docs", "archive", "old_report.pdf")}
+    assert found(indexer, "报告") == {os.path.join("docs", "报告_2024.docx")}
+    assert found(indexer, "archive", "文件夹") == {os.path.join("docs", "archive")}
+    assert found(indexer, "index") == set()  # AppData 未被扫描
+    item = indexer.search("notes", None)[0]
+    assert item["RawSize"] == 5 and item["Type"] == "FILE"
+
+
+def test_update_index_finds_added_removed_and_renamed(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    write(os.path.join(tree, "docs", "new_report.txt"))
+    os.remove(os.path.join(tree, "photos", "holiday.jpg"))
+    os.rename(os.path.join(tree, "docs", "archive"), os.path.join(tree, "docs", "backup"))
+
+    indexer.update_index()
+
+    assert found(indexer, "report") == {
+        os.path.join("docs", "new_report.txt"),
+        os.path.join("docs", "backup", "old_report.pdf"),
+    }
+    assert found(indexer, "holiday") == set()
+    assert found(indexer, "archive", "文件夹") == set()
+    assert found(indexer, "backup", "文件夹") == {os.path.join("docs", "backup")}
+
+    shutil.rmtree(os.path.join(tree, "docs", "backup"))
+    indexer.update_index()
+    assert found(indexer, "report") == {os.path.join("docs", "new_report.txt")}
+
+
+def test_update_index_full_finds_content_changes(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    notes = os.path.join(tree, "docs", "notes.txt")
+    st = os.stat(os.path.dirname(notes))
+    write(notes, "hello world")
+    # 只改文件内容时目录的修改时间不变（显式还原，避免依赖文件系统的行为）
+    os.utime(os.path.dirname(notes), ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    indexer.update_index()  # 增量更新跳过修改时间未变化的目录
+    assert indexer.search("notes", None)[0]["RawSize"] == 5
+
+    indexer.update_index(full=True)
+    assert indexer.search("notes", None)[0]["RawSize"] == 11
+
+
+def test_update_index_without_changes_keeps_generation(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    generation = indexer.generation
+    saved = os.stat(indexer.index_file).st_mtime_ns
+
+    indexer.update_index()
+    indexer.update_index(full=True)
+    assert indexer.generation == generation
+    assert os.stat(indexer.index_file).st_mtime_ns == saved
+    assert indexer.scan_stats["mode"] == "full" and indexer.scan_stats["dirs_listed"] > 0
+
+    write(os.path.join(tree, "docs", "new_report.txt"))
+    indexer.update_index()
+    assert indexer.generation == generation + 1
+
+
+def test_apply_changes(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    docs = os.path.join(tree, "docs")
+
+    stats = indexer.apply_changes(
+        upserts=[
+            (os.path.join(docs, "summary_report.md"), False, 42, 1000),  # 新增
+            (os.path.join(docs, "notes.txt"), False, 7, 2000),  # 修改
+            (os.path.join(docs, "notes.txt"), False, 7, 2000),  # 指纹未变，不计
+        ],
+        deletes=[os.path.join(docs, "archive")],  # 目录连同子树删除
+    )
+
+    assert stats == {"added": 1, "updated": 1, "removed": 2}
+    assert found(indexer, "report") == {os.path.join("docs", "summary_report.md")}
+    assert found(indexer, "archive", "文件夹") == set()
+    item = indexer.search("notes", None)[0]
+    assert (item["RawSize"], item["UpdateTS"]) == (7, 2000)
+
+    # 文件变成同名目录：按删除后新增处理
+    stats = indexer.apply_changes(upserts=[(os.path.join(docs, "notes.txt"), True, 0, 3000)])
+    assert stats == {"added": 1, "updated": 0, "removed": 1}
+    assert found(indexer, "notes", "文件夹") == {os.path.join("docs", "notes.txt")}
+
+
+def test_changes_survive_save_and_reload(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    write(os.path.join(tree, "photos", "beach_report.jpg"))
+    indexer.update_index()
+
+    reloaded = make_indexer(tree, tmp_path)  # 从索引文件加载，不重新扫描
+    assert found(reloaded, "report") == {
+        os.path.join("docs", "archive", "old_report.pdf"),
+        os.path.join("photos", "beach_report.jpg"),
+    }
+
+
+def test_parallel_walk(tree, tmp_path):
+    for i in range(30):
+        write(os.path.join(tree, "many", f"d{i}", "sub", f"f{i}.txt"))
+    scanner = ScandirScanner([tree])
+    skip = {"appdata"}
+    sequential = {path: sorted(entries) for path, entries in walk(scanner, [tree], skip, workers=1)}
+
+    seen = set()
+    for path, entries in walk(scanner, [tree], skip, workers=4):
+        assert path == tree or os.path.dirname(path) in seen  # 父目录先于子目录
+        seen.add(path)
+        assert sorted(entries) == sequential[path]
+    assert seen == set(sequential)
+
+    # 提前结束迭代：工作线程退出，不会卡住
+    it = walk(scanner, [tree], skip, workers=4)
+    next(it)
+    it.close()
+
+    indexer = make_indexer(tree, tmp_path, scan_workers=4)
+    assert indexer.store.live_count == sum(len(e) for e in sequential.values())
+    assert found(indexer, "f7") == {os.path.join("many", "d7", "sub", "f7.txt")}
+
+
+def test_apply_changes_are_saved(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    docs = os.path.join(tree, "docs")
+    assert indexer.save() is False  # 没有未保存的变化
+
+    indexer.apply_changes(upserts=[(os.path.join(docs, "live_report.md"), False, 1, 1000)])
+    assert found(make_indexer(tree, tmp_path), "live") == set()  # 还没写入索引文件
+    assert indexer.save() is True and indexer.save() is False
+    assert found(make_indexer(tree, tmp_path), "live") == {os.path.join("docs", "live_report.md")}
+
+    # 没有发现变化的重载也会写入尚未保存的实时更新
+    indexer.apply_changes(deletes=[os.path.join(docs, "live_report.md")])
+    indexer.update_index()
+    assert found(make_indexer(tree, tmp_path), "live") == set()
+
+
+SUGGEST_PREFIXES = ["", "n", "notes", "r", "报", "x"]
+
+
+def suggestions(suggest):
+    return [
+        [(s["Name"], s["Count"], s["UpdateTS"]) for s in suggest(prefix, 50, rank)]
+        for prefix in SUGGEST_PREFIXES for rank in ("frequency", "recency")
+    ]
+
+
+def test_suggester_updated_from_changes(tree, tmp_path):
+    indexer = make_indexer(tree, tmp_path)
+    docs = os.path.join(tree, "docs")
+
+    def check():
+        # 增量更新的表与按当前存储整体构建的表结果相同
+        assert suggestions(indexer.suggest) == suggestions(NameSuggester(indexer.store).suggest)
+
+    table = indexer.snapshot().suggester
+    indexer.apply_changes(upserts=[
+        (os.path.join(docs, "archive", "notes.txt"), False, 1, 500),  # 同名文件：次数相加
+        (os.path.join(docs, "Notes.TXT"), False, 1, 9000),  # 大小写不同：展示最近修改的那个
+        (os.path.join(docs, "xylophone.md"), False, 1, 100),
+    ])
+    assert indexer.snapshot().suggester.overlay_size == 2  # notes.txt、xylophone.md
+    assert table.overlay_size == 0  # 上一代的表不变
+    check()
+    assert indexer.suggest("notes")[0]["Count"] == 3
+
+    indexer.apply_changes(deletes=[os.path.join(docs, "archive")])
+    indexer.apply_changes(upserts=[(os.path.join(docs, "xylophone.md"), False, 1, 200)])
+    check()
+
+    # 只存在于实时更新中的条目（磁盘上没有）在全量重新列出时删除
+    write(os.path.join(tree, "photos", "notes.txt"))
+    indexer.update_index(full=True)
+    check()
+    assert indexer.suggest("x") == []
+
+    indexer.compact()
+    assert indexer.store.dead_count == 0
+    check()
+
+
+def test_sharded_suggester_updated_from_changes(tmp_path):
+    roots = [str(tmp_path / "a"), str(tmp_path / "b")]
+    for root in roots:
+        write(os.path.join(root, "notes.txt"))
+        write(os.path.join(root, "docs", "report.txt"))
+    sharded = ShardedIndexer(
+        index_file=str(tmp_path / "index.idx"), scanner=ScandirScanner(roots), result_cache_bytes=0,
+    )
+
+    def check():
+        combined = NameSuggester.combine([NameSuggester(shard.store) for shard in sharded.shards])
+        assert suggestions(sharded.suggest) == suggestions(combined.suggest)
+
+    check()
+    assert sharded.suggest("notes")[0]["Count"] == 2
+
+    sharded.shards[0].apply_changes(upserts=[(os.path.join(roots[0], "docs", "notes.txt"), False, 1, 7)])
+    sharded.shards[1].apply_changes(deletes=[os.path.join(roots[1], "notes.txt")])
+    check()
+    assert sharded.suggest("notes")[0]["Count"] == 2
+
+    sharded.shards[1].build_index(force=True)  # 整个分片重建：合并表整体重建
+    check()
+
+
+def under(indexer, folder, keywords=""):
+    """under= 范围搜索命中的文件相对根目录的路径集合。"""
+    root = indexer.meta["drives"][0]
+    return {os.path.relpath(r["Path"], root) for r in indexer.search(keywords, None, under=os.path.join(root, folder))}
+
+
+@pytest.mark.parametrize("scope_scan_rows", [0, DiskIndexer.SCOPE_SCAN_ROWS])
+def test_under_after_moves_and_compaction(tree, tmp_path, scope_scan_rows):
+    indexer = make_indexer(tree, tmp_path)
+    indexer.SCOPE_SCAN_ROWS = scope_scan_rows  # 0：带关键词时总是取全局候选再按子树区间筛选
+    docs = os.path.join(tree, "docs")
+    old_report = os.path.join("docs", "archive", "old_report.pdf")
+    assert under(indexer, "docs") == {os.path.join("docs", "报告_2024.docx"), os.path.join("docs", "notes.txt"), old_report}
+    assert under(indexer, os.path.join("docs", "archive")) == {old_report}
+
+    # 目录移动到另一个目录下（扫描发现）：旧位置下不再有，新位置下有
+    shutil.move(os.path.join(docs, "archive"), os.path.join(tree, "photos", "archive"))
+    indexer.update_index()
+    moved = os.path.join("photos", "archive", "old_report.pdf")
+    assert under(indexer, "docs") == {os.path.join("docs", "报告_2024.docx"), os.path.join("docs", "notes.txt")}
+    assert under(indexer, "photos") == {os.path.join("photos", "holiday.jpg"), moved}
+    assert under(indexer, os.path.join("photos", "archive"), "report") == {moved}
+    assert under(indexer, os.path.join("docs", "archive")) == set()
+
+    # 重命名（实时更新）：删除旧路径的子树，写入新路径
+    renamed = os.path.join(tree, "photos", "backup")
+    indexer.apply_changes(
+        upserts=[(renamed, True, 0, 1), (os.path.join(renamed, "old_report.pdf"), False, 1, 1)],
+        deletes=[os.path.join(tree, "photos", "archive")],
+    )
+    backup = os.path.join("photos", "backup", "old_report.pdf")
+    assert under(indexer, "photos") == {os.path.join("photos", "holiday.jpg"), backup}
+    assert under(indexer, os.path.join("photos", "backup")) == {backup}
+    assert under(indexer, os.path.join("photos", "archive")) == set()
+
+    indexer.compact()
+    assert indexer.store.dead_count == 0
+    assert under(indexer, "photos") == {os.path.join("photos", "holiday.jpg"), backup}
+    assert under(indexer, os.path.join("photos", "backup"), "report") == {backup}
+    assert under(indexer, "docs", "notes") == {os.path.join("docs", "notes.txt")}
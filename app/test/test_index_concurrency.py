@@ -0,0 +1,126 @@
+"""
+搜索与写入并发：发布出去的快照正在被搜索读取时，apply_changes / update_index 不能失败
+（曾因写入方在共享的字节堆上原地扩容而抛出 BufferError）。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from app.core.kernel32_search import DiskIndexer
+from app.core.scanners import ScandirScanner
+
+DURATION = 1.5  # 秒
+
+
+def make_tree(root, dirs=20, files=50):
+    for i in range(dirs):
+        d = os.path.join(root, f"项目_report_{i}")
+        os.makedirs(d)
+        for j in range(files):
+            with open(os.path.join(d, f"数据_draft_{j}.txt"), "w") as f:
+                f.write("x")
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    make_tree(str(root))
+    return DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([str(root)]),
+        scan_workers=1,
+        result_cache_bytes=0,  # 每次都真正扫描列数据
+    )
+
+
+# 覆盖各种读取字节堆的路径：三元组候选校验、整堆正则扫描（文件夹 / 拼音）、相关度打分（拼接字节）
+QUERIES = [
+    dict(keywords="draft", file_type=None),
+    dict(keywords="_", file_type=None),
+    dict(keywords="report", file_type="文件夹"),
+    dict(keywords="shuju", file_type=None, match="pinyin"),
+    dict(keywords="draft 1", file_type=None, sort_by="relevance", limit=20),
+    dict(keywords="数据", file_type=None, sort_by="name", limit=20),
+]
+
+
+def run_concurrently(indexer, write, queries=QUERIES):
+    """一个线程反复搜索，当前线程反复写入 DURATION 秒，返回 (写入次数, 写入异常, 搜索异常)。"""
+    stop = threading.Event()
+    search_errors = []
+
+    def searcher():
+        while not stop.is_set():
+            for q in queries:
+                try:
+                    indexer.search(**q)
+                except Exception as e:  # noqa: BLE001
+                    search_errors.append(repr(e))
+
+    thread = threading.Thread(target=searcher)
+    thread.start()
+    writes, write_errors = 0, []
+    deadline = time.monotonic() + DURATION
+    try:
+        while time.monotonic() < deadline:
+            try:
+                write(writes)
+            except Exception as e:  # noqa: BLE001
+                write_errors.append(repr(e))
+            writes += 1
+    finally:
+        stop.set()
+        thread.join()
+    return writes, write_errors, search_errors
+
+
+def test_apply_changes_while_searching(indexer):
+    root = indexer.meta["drives"][0]
+    parent = os.path.join(root, "项目_report_0")
+
+    def write(i):
+        indexer.apply_changes(upserts=[(os.path.join(parent, f"数据_new_{i}.txt"), False, i, 1000 + i)])
+
+    writes, write_errors, search_errors = run_concurrently(indexer, write)
+    assert writes > 0
+    assert write_errors == []
+    assert search_errors == []
+    # 写入全部生效
+    assert len(indexer.search("数据_new_", None)) == writes
+
+
+def test_directory_changes_while_searching(indexer):
+    """新增目录会追加目录路径列（文件夹模式整堆扫描的对象）。"""
+    root = indexer.meta["drives"][0]
+
+    def write(i):
+        d = os.path.join(root, f"new_report_dir_{i}")
+        indexer.apply_changes(upserts=[(d, True, 0, 1), (os.path.join(d, "数据.txt"), False, 1, 1)])
+        if i % 3 == 2:
+            indexer.apply_changes(deletes=[os.path.join(root, f"new_report_dir_{i - 1}")])
+
+    writes, write_errors, search_errors = run_concurrently(indexer, write)
+    assert write_errors == []
+    assert search_errors == []
+    folders = indexer.search("new_report_dir_", "文件夹")
+    assert len(folders) == writes - writes // 3
+
+
+def test_update_index_while_searching(indexer):
+    root = indexer.meta["drives"][0]
+
+    def write(i):
+        with open(os.path.join(root, f"项目_report_{i % 20}", f"draft_scan_{i}.txt"), "w") as f:
+            f.write("y")
+        indexer.update_index()
+
+    writes, write_errors, search_errors = run_concurrently(indexer, write)
+    assert write_errors == []
+    assert search_errors == []
+    assert len(indexer.search("draft_scan_", None)) == writes
@@ -0,0 +1,164 @@
+"""
+IndexWatcher：在 Linux 上用 inotify 监听临时目录树，增删改、重命名文件和目录后 flush()，检查索引内容。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+import shutil
+import sys
+import time
+
+import pytest
+
+if not sys.platform.startswith("linux"):
+    pytest.skip("inotify 仅在 Linux 上可用", allow_module_level=True)
+inotify = pytest.importorskip("watchdog.observers.inotify")
+
+from app.core.index_service import IndexService
+from app.core.index_watcher import IndexWatcher
+from app.core.kernel32_search import DiskIndexer
+from app.core.scanners import ScandirScanner
+
+
+def write(path, data="x"):
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def found(indexer, keywords, file_type=None):
+    """命中条目相对根目录的路径 -> 大小。"""
+    root = indexer.meta["drives"][0]
+    return {os.path.relpath(r["Path"], root): r["RawSize"] for r in indexer.search(keywords, file_type)}
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "root"
+    (root / "docs").mkdir(parents=True)
+    write(str(root / "docs" / "old_report.txt"))
+    return str(root)
+
+
+@pytest.fixture
+def indexer(root, tmp_path):
+    return DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([root]),
+        scan_workers=1,
+        result_cache_bytes=0,
+    )
+
+
+@pytest.fixture
+def watcher(indexer):
+    # 防抖时间足够长，批次只由测试里的 flush() 应用
+    w = IndexWatcher(indexer, debounce=60, max_delay=60, observer_factory=inotify.InotifyObserver)
+    w.start()
+    yield w
+    w.stop(flush=False)
+
+
+def settle(watcher, check, timeout=5.0):
+    """inotify 事件异步到达：反复 flush() 直到 check() 成立或超时。"""
+    deadline = time.monotonic() + timeout
+    while True:
+        watcher.flush()
+        if check() or time.monotonic() > deadline:
+            return
+        time.sleep(0.05)
+
+
+def test_files(root, indexer, watcher):
+    docs = os.path.join(root, "docs")
+
+    write(os.path.join(docs, "new_report.txt"))
+    expected = {"docs/old_report.txt": 1, "docs/new_report.txt": 1}
+    settle(watcher, lambda: found(indexer, "report") == expected)
+    assert found(indexer, "report") == expected
+
+    write(os.path.join(docs, "new_report.txt"), "modified")
+    expected = {"docs/old_report.txt": 1, "docs/new_report.txt": 8}
+    settle(watcher, lambda: found(indexer, "report") == expected)
+    assert found(indexer, "report") == expected
+
+    os.rename(os.path.join(docs, "new_report.txt"), os.path.join(docs, "renamed_report.txt"))
+    expected = {"docs/old_report.txt": 1, "docs/renamed_report.txt": 8}
+    settle(watcher, lambda: found(indexer, "report") == expected)
+    assert found(indexer, "report") == expected
+
+    os.remove(os.path.join(docs, "old_report.txt"))
+    expected = {"docs/renamed_report.txt": 8}
+    settle(watcher, lambda: found(indexer, "report") == expected)
+    assert found(indexer, "report") == expected
+    assert watcher.stats["added"] == 2 and watcher.stats["removed"] == 2
+
+
+def test_directories(root, indexer, watcher, tmp_path):
+    # 新建目录后再往里写文件
+    os.mkdir(os.path.join(root, "project"))
+    write(os.path.join(root, "project", "plan.txt"))
+    settle(watcher, lambda: "project/plan.txt" in found(indexer, "plan"))
+    assert found(indexer, "plan") == {"project/plan.txt": 1}
+    assert found(indexer, "project", "文件夹") == {"project": 0}
+
+    # 从监听范围外移入整棵子树：连同子树一起写入
+    outside = tmp_path / "outside" / "album"
+    (outside / "2024").mkdir(parents=True)
+    write(str(outside / "2024" / "beach.jpg"))
+    shutil.move(str(outside), os.path.join(root, "album"))
+    settle(watcher, lambda: found(indexer, "beach") == {"album/2024/beach.jpg": 1})
+    assert found(indexer, "beach") == {"album/2024/beach.jpg": 1}
+
+    # 重命名目录：旧路径下的子树删除，新路径下的子树写入
+    os.rename(os.path.join(root, "project"), os.path.join(root, "archive"))
+    settle(watcher, lambda: found(indexer, "plan") == {"archive/plan.txt": 1})
+    assert found(indexer, "plan") == {"archive/plan.txt": 1}
+    assert found(indexer, "project", "文件夹") == {}
+    assert found(indexer, "archive", "文件夹") == {"archive": 0}
+
+    # 删除目录：连同子树删除
+    shutil.rmtree(os.path.join(root, "album"))
+    settle(watcher, lambda: found(indexer, "beach") == {})
+    assert found(indexer, "beach") == {}
+    assert found(indexer, "album", "文件夹") == {}
+
+    # skip_dirs 中的目录与全量扫描一致，不写入索引
+    os.makedirs(os.path.join(root, "AppData"))
+    write(os.path.join(root, "AppData", "cache.bin"))
+    write(os.path.join(root, "marker.txt"))
+    settle(watcher, lambda: "marker.txt" in found(indexer, "marker"))
+    assert found(indexer, "cache") == {}
+
+
+def test_applied_changes_are_saved(root, indexer, tmp_path):
+    w = IndexWatcher(indexer, debounce=60, max_delay=60, save_interval=60, observer_factory=inotify.InotifyObserver)
+    w.start()
+    try:
+        write(os.path.join(root, "docs", "saved_report.txt"))
+        settle(w, lambda: "docs/saved_report.txt" in found(indexer, "saved"))
+        assert w.save() is False  # 未到 save_interval
+    finally:
+        w.stop(flush=False)
+    assert w.stats["saves"] == 1
+
+    # 只从索引文件加载，不扫描
+    reloaded = DiskIndexer(index_file=indexer.index_file, scanner=ScandirScanner([root]), auto_build=False)
+    assert found(reloaded, "saved") == {"docs/saved_report.txt": 1}
+
+
+def test_service_watches_only_configured_roots(root, indexer):
+    def start(**kwargs):
+        service = IndexService(factory=lambda **_: indexer, **kwargs)
+        service.start()
+        service._thread.join()
+        return service
+
+    assert start().watcher is None  # 默认不监听
+    assert start(watch=True).watcher is None  # 没有显式配置根目录时不监听（默认根目录可能是 "/"）
+
+    service = start(watch=True, roots=[root])
+    try:
+        assert service.watcher.roots == [root]
+    finally:
+        service.stop()
@@ -0,0 +1,79 @@
+"""
+分页：每种 sort_by × reverse 在大量同分条目下，逐页取完的结果与一次不分页搜索的顺序完全一致；
+游标在索引更新后或查询条件不同时失效 (CursorError)。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+
+import pytest
+
+from app.core.kernel32_search import DiskIndexer
+from app.core.pagination import CursorError
+from app.core.scanners import ScandirScanner
+from app.core.search_query import SearchQuery
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    indexer = DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([str(root)]),
+        scan_workers=1,
+    )
+    # 名称、大小、修改时间都只有少数几种取值，每种排序方式下都有大量同分条目
+    upserts = []
+    for d in range(8):
+        folder = os.path.join(str(root), f"d{d}")
+        upserts.append((folder, True, 0, 1000))
+        for i, name in enumerate(["report.txt", "Report_a.txt", "my report.txt", "old_report", "report"]):
+            upserts.append((os.path.join(folder, name), False, (d + i) % 3, 1000 * (1 + (d * i) % 2)))
+    indexer.apply_changes(upserts=upserts)
+    return indexer
+
+
+def all_pages(indexer, query):
+    items, cursor = [], None
+    while True:
+        page = indexer.search_page(SearchQuery(**{**query, "cursor": cursor}))
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, page["total"]
+
+
+@pytest.mark.parametrize("sort_by", ["time", "size", "name", "relevance"])
+@pytest.mark.parametrize("reverse", [True, False])
+@pytest.mark.parametrize("limit", [1, 7, 40])
+def test_pages_match_unpaged_search(indexer, sort_by, reverse, limit):
+    query = dict(keywords="report", sort_by=sort_by, reverse=reverse)
+    expected = indexer.search(**query)
+    assert len(expected) == 40
+
+    items, total = all_pages(indexer, {**query, "limit": limit})
+    assert total == len(expected)
+    assert [r["Path"] for r in items] == [r["Path"] for r in expected]
+
+
+def test_stale_or_mismatched_cursor(indexer):
+    query = SearchQuery("report", limit=5)
+    cursor = indexer.search_page(query)["next_cursor"]
+    assert indexer.search_page(SearchQuery("report", limit=5, cursor=cursor))["items"]
+
+    # 查询条件不同（limit 不计入）
+    with pytest.raises(CursorError):
+        indexer.search_page(SearchQuery("report", limit=5, cursor=cursor, sort_by="size"))
+    with pytest.raises(CursorError):
+        indexer.search_page(SearchQuery("old", limit=5, cursor=cursor))
+    assert indexer.search_page(SearchQuery("report", limit=9, cursor=cursor))["items"]
+    with pytest.raises(CursorError):
+        indexer.search_page(SearchQuery("report", limit=5, cursor="not-a-cursor"))
+
+    # 索引更新后旧游标失效
+    root = indexer.meta["drives"][0]
+    indexer.apply_changes(upserts=[(os.path.join(root, "d0", "new_report.txt"), False, 1, 1)])
+    with pytest.raises(CursorError):
+        indexer.search_page(SearchQuery("report", limit=5, cursor=cursor))
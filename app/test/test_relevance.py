@@ -0,0 +1,105 @@
+"""
+sort_by=relevance：档次顺序为 完全相同 > 开头 > 单词边界 > 包含，档内路径越浅越靠前，再按修改时间越新越靠前；
+match=pinyin 时拼音全拼 / 首字母也参与分档（用替身 pinyin_text，不依赖 pypinyin）。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+
+import pytest
+
+from app.core import index_store
+from app.core.kernel32_search import DiskIndexer
+from app.core.pinyin import SEP
+from app.core.scanners import ScandirScanner
+
+PINYIN = {
+    "报告.docx": f"baogao.docx{SEP}bg.docx",
+    "年度报告.docx": f"niandubaogao.docx{SEP}ndbg.docx",
+    "报告书_2024.pdf": f"baogaoshu_2024.pdf{SEP}bgs_2024.pdf",
+}
+
+
+@pytest.fixture
+def make_indexer(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_store, "pinyin_text", lambda name: PINYIN.get(name, ""))
+    root = tmp_path / "root"
+
+    def make(files):
+        """files: {相对路径: 修改时间（秒）}。"""
+        for rel, mtime in files.items():
+            path = root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x")
+            os.utime(path, (mtime, mtime))
+        return DiskIndexer(
+            index_file=str(tmp_path / "index.idx"),
+            scanner=ScandirScanner([str(root)]),
+            scan_workers=1,
+            result_cache_bytes=0,
+        )
+
+    return make
+
+
+def ranked(indexer, keywords, **options):
+    root = indexer.meta["drives"][0]
+    items = indexer.search(keywords, None, sort_by="relevance", **options)
+    return [os.path.relpath(r["Path"], root).replace(os.sep, "/") for r in items]
+
+
+T = 1_600_000_000
+
+
+def test_tiers(make_indexer):
+    indexer = make_indexer({
+        "myreport.txt": T + 50,  # 包含
+        "my_report.txt": T + 40,  # 单词边界
+        "reports_2024.txt": T + 30,  # 开头
+        "report.pdf": T,  # 去掉扩展名后完全相同
+        "Report": T + 10,  # 完全相同（不区分大小写）
+    })
+    assert ranked(indexer, "report") == ["Report", "report.pdf", "reports_2024.txt", "my_report.txt", "myreport.txt"]
+    assert ranked(indexer, "report", reverse=False) == ranked(indexer, "report")[::-1]
+
+
+def test_depth_and_recency_within_tier(make_indexer):
+    indexer = make_indexer({
+        "a/b/report.txt": T,
+        "a/report.txt": T,
+        "report.txt": T,
+        "c/report.txt": T + 100,
+        "a/b/c/d/report_old.txt": T + 100,
+        "notes.txt": T,
+    })
+    # 同一档内修改时间相同时浅的优先；c/report.txt 深一层但最新，新旧加分超过一层深度的扣分。
+    # 再深、再新的前缀命中也排在任何完全相同之后
+    assert ranked(indexer, "report") == [
+        "c/report.txt", "report.txt", "a/report.txt", "a/b/report.txt", "a/b/c/d/report_old.txt",
+    ]
+
+
+def test_keywords_add_up(make_indexer):
+    indexer = make_indexer({
+        "annual_report.txt": T,  # 两个关键词都在单词边界
+        "report_draft.txt": T + 10,  # report 开头，annual 未命中
+        "annualreport.txt": T + 20,  # annual 开头，report 包含
+    })
+    assert ranked(indexer, "report annual") == ["annual_report.txt", "annualreport.txt", "report_draft.txt"]
+
+
+def test_pinyin_tiers(make_indexer):
+    indexer = make_indexer({
+        "年度报告.docx": T + 30,  # 首字母 ndbg 中包含
+        "bg_notes.txt": T + 20,  # 文件名开头
+        "报告书_2024.pdf": T + 10,  # 首字母 bgs 开头
+        "报告.docx": T,  # 首字母去掉扩展名后完全相同
+        "logbg.txt": T + 40,  # 文件名中包含
+    })
+    assert ranked(indexer, "bg", match="pinyin") == [
+        "报告.docx", "bg_notes.txt", "报告书_2024.pdf", "logbg.txt", "年度报告.docx",
+    ]
+    assert ranked(indexer, "baogao", match="pinyin") == ["报告.docx", "报告书_2024.pdf", "年度报告.docx"]
+    # 不按拼音匹配时只看文件名
+    assert ranked(indexer, "bg") == ["bg_notes.txt", "logbg.txt"]
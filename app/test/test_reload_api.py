@@ -0,0 +1,128 @@
+"""
+/file/v1/reload/index：POST 默认增量重载（并在响应中说明），旧的 GET 调用方式默认全量重载；
+ReloadJobs：重叠的请求只附加到覆盖范围且不弱于请求的任务上，否则排队后续任务。
+
+用法：
+    python -m pytest -q app/test
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core.reload_job import DONE, QUEUED, ReloadJobs
+from app.routers import file_search
+
+
+class FakeIndexer:
+    def __init__(self):
+        self.meta = {"drives": ["/data"]}
+        self.calls = []
+
+    def update_index(self, drives=None, full=False, stats=None):
+        self.calls.append((drives, full))
+
+
+@pytest.fixture
+def indexer(monkeypatch):
+    indexer = FakeIndexer()
+    monkeypatch.setattr(file_search.index_service, "get", lambda: indexer)
+    monkeypatch.setattr(file_search, "reload_jobs", ReloadJobs())
+    return indexer
+
+
+def request(method, url, **params):
+    app = FastAPI()
+    app.include_router(file_search.router, prefix="/file")
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await client.request(method, url, params=params)
+
+    r = asyncio.run(send())
+    assert r.status_code == 202
+    file_search.reload_jobs.get(r.json()["job_id"]).wait(5)
+    return r.json()
+
+
+def test_post_defaults_to_incremental(indexer):
+    body = request("POST", "/file/v1/reload/index")
+    assert body["full"] is False and body["skips_unchanged_dirs"] is True
+    body = request("POST", "/file/v1/reload/index", full="true")
+    assert body["full"] is True and body["skips_unchanged_dirs"] is False
+    assert indexer.calls == [(None, False), (None, True)]
+
+
+def test_legacy_get_defaults_to_full(indexer):
+    body = request("GET", "/file/v1/reload/index")
+    assert body["full"] is True and body["skips_unchanged_dirs"] is False
+    request("GET", "/file/v1/reload/index", full="false", drive="/data")
+    assert indexer.calls == [(None, True), (["/data"], False)]
+
+
+class GatedIndexer(FakeIndexer):
+    """update_index 阻塞到 release() 为止，模拟正在运行的扫描。"""
+
+    def __init__(self):
+        super().__init__()
+        self.meta = {"drives": ["/a", "/b"]}
+        self.started = threading.Semaphore(0)
+        self.gate = threading.Event()
+
+    def update_index(self, drives=None, full=False, stats=None):
+        super().update_index(drives, full, stats)
+        self.started.release()
+        self.gate.wait(5)
+
+
+def run_jobs(indexer, *requests):
+    """依次发起 (full, drive) 请求，第一个任务开始扫描后才发起后续请求；全部结束后返回任务列表。"""
+    jobs = ReloadJobs()
+    first, _ = jobs.start(indexer, *requests[0])
+    assert indexer.started.acquire(timeout=5)
+    started = [(first, True)] + [jobs.start(indexer, *r) for r in requests[1:]]
+    indexer.gate.set()
+    for job, _ in started:
+        assert job.wait(5) and job.state == DONE
+    return started
+
+
+def test_full_request_queues_after_incremental():
+    indexer = GatedIndexer()
+    jobs = ReloadJobs()
+    incremental, _ = jobs.start(indexer, False, None)
+    assert indexer.started.acquire(timeout=5)
+
+    full, created = jobs.start(indexer, True, None)
+    assert created and full is not incremental and full.full
+    assert full.status()["state"] == QUEUED and full.status()["waiting_for"] == [incremental.id]
+    # 之后的 full / 增量请求都附加到排队中的 full 任务上
+    assert jobs.start(indexer, True, None) == (full, False)
+    assert jobs.start(indexer, False, "/a") == (incremental, False)
+
+    indexer.gate.set()
+    assert full.wait(5) and full.state == DONE and full.requests == 2
+    assert indexer.calls == [(None, False), (None, True)]
+
+
+def test_incremental_request_attaches_to_full():
+    indexer = GatedIndexer()
+    (full, _), (job, created) = run_jobs(indexer, (True, None), (False, None))
+    assert job is full and not created
+    assert indexer.calls == [(None, True)]
+
+
+def test_reload_all_skips_drive_being_reloaded():
+    indexer = GatedIndexer()
+    (single, _), (everything, created) = run_jobs(indexer, (False, "/a"), (False, None))
+    assert created and everything.drive is None
+    # /a 由运行中的任务负责，不再扫描一次
+    assert indexer.calls == [(["/a"], False), (["/b"], False)]
+
+
+def test_full_reload_all_rescans_drive_after_incremental():
+    indexer = GatedIndexer()
+    run_jobs(indexer, (False, "/a"), (True, None))
+    assert indexer.calls == [(["/a"], False), (None, True)]
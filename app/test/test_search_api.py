@@ -0,0 +1,257 @@
+"""
+/file/v1/search：通过路由发起搜索，检查分页游标失效时返回 400；format=ndjson 的顺序、limit，
+以及客户端断开后不再继续取后续批次；fields= 投影与缓存的 JSON 片段在索引更新后失效；
+搜索执行器排队已满返回 429、停止后返回 503，截止时间到期时返回部分结果 (X-Search-Truncated)。
+
+用法：
+    python -m pytest -q app/test
+"""
+import asyncio
+import json
+import os
+import threading
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.core import json_rows
+from app.core.kernel32_search import DiskIndexer
+from app.core.scanners import ScandirScanner
+from app.core.search_executor import Deadline, SearchExecutor
+from app.core.search_query import SearchQuery
+from app.core.windows_utils import format_size
+from app.routers import file_search
+
+
+@pytest.fixture
+def indexer(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    for i in range(20):
+        (root / f"report_{i:02d}.txt").write_text("x" * i)
+    indexer = DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([str(root)]),
+        scan_workers=1,
+    )
+    monkeypatch.setattr(file_search.index_service, "get", lambda: indexer)
+    return indexer
+
+
+def search(**params):
+    app = FastAPI()
+    app.include_router(file_search.router, prefix="/file")
+
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await client.get("/file/v1/search", params=params)
+
+    return asyncio.run(send())
+
+
+def test_cursor_errors(indexer):
+    r = search(query="report", limit=5, sort_by="size")
+    assert r.status_code == 200
+    cursor = r.json()["next_cursor"]
+    r = search(query="report", limit=5, sort_by="size", cursor=cursor)
+    assert r.status_code == 200 and len(r.json()["items"]) == 5
+
+    # 查询条件不同
+    assert search(query="report", limit=5, sort_by="name", cursor=cursor).status_code == 400
+    assert search(query="report", limit=5, sort_by="size", reverse="false", cursor=cursor).status_code == 400
+    assert search(query="report", limit=5, cursor="garbage").status_code == 400
+
+    # 索引已更新
+    root = indexer.meta["drives"][0]
+    indexer.apply_changes(upserts=[(os.path.join(root, "report_new.txt"), False, 1, 1)])
+    r = search(query="report", limit=5, sort_by="size", cursor=cursor)
+    assert r.status_code == 400
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # 每批 3 条、内部页大小最多 8 条，少量条目也会分成多批
+    monkeypatch.setattr(DiskIndexer, "STREAM_BATCH", 3)
+    monkeypatch.setattr(DiskIndexer, "STREAM_MAX_BATCH", 8)
+
+
+@pytest.mark.parametrize("sort_by", ["size", "name", "relevance"])
+def test_ndjson_order_and_limit(indexer, small_batches, sort_by):
+    expected = [r["Path"] for r in indexer.search("report", None, sort_by=sort_by, reverse=False)]
+    assert len(expected) == 20
+
+    batches = list(indexer.search_ndjson(SearchQuery("report", sort_by=sort_by, reverse=False)))
+    assert len(batches) == 7
+    lines = b"".join(batches).splitlines()
+    assert [json.loads(line)["Path"] for line in lines] == expected
+
+    for limit in (1, 5, 19, 50):
+        r = search(query="report", sort_by=sort_by, reverse="false", limit=limit, format="ndjson")
+        assert r.status_code == 200 and r.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line)["Path"] for line in r.text.splitlines()] == expected[:limit]
+
+    r = search(query="report", sort_by=sort_by, format="ndjson", fields="Name,RawSize")
+    assert all(set(json.loads(line)) == {"Name", "RawSize"} for line in r.text.splitlines())
+
+
+class DisconnectingRequest:
+    """is_disconnected() 在被问到第 after 次时开始返回 True。"""
+
+    def __init__(self, after):
+        self.after = after
+        self.calls = 0
+
+    async def is_disconnected(self):
+        self.calls += 1
+        return self.calls >= self.after
+
+
+@pytest.mark.parametrize("after", [1, 2])
+def test_ndjson_stops_on_disconnect(indexer, small_batches, after):
+    pulled = []
+    closed = []
+
+    def batches():
+        try:
+            for chunk in indexer.search_ndjson(SearchQuery("report", sort_by="size")):
+                pulled.append(chunk)
+                yield chunk
+        finally:
+            closed.append(True)
+
+    async def consume():
+        gen = batches()
+        stream = file_search.ndjson_stream(DisconnectingRequest(after), gen, next(gen))
+        return [chunk async for chunk in stream]
+
+    sent = asyncio.run(consume())
+    # 断开前已发送的批次之后不再取下一批，生成器被关闭
+    assert len(sent) == after and pulled == sent
+    assert closed == [True]
+
+
+def test_fields(indexer):
+    expected = indexer.search_page(SearchQuery("report", sort_by="size", limit=8))
+    r = search(query="report", sort_by="size", limit=8)
+    assert r.json() == json.loads(json.dumps({**expected, "truncated": False}))  # FP 元组输出为数组
+
+    r = search(query="report", sort_by="size", limit=8, fields="Path, Size,Name,Path")
+    items = r.json()["items"]
+    assert [list(item) for item in items] == [["Path", "Size", "Name"]] * 8
+    assert [item["Size"] for item in items] == [format_size(x["RawSize"]) for x in expected["items"]]
+    assert [item["Path"] for item in items] == [x["Path"] for x in expected["items"]]
+
+    # 不分页时返回数组
+    r = search(query="report_07", fields="Name")
+    assert r.json() == [{"Name": "report_07.txt"}]
+
+    r = search(query="report", fields="Name,Bogus")
+    assert r.status_code == 400 and "Bogus" in r.json()["detail"]
+
+
+def test_fragments_follow_generation(indexer):
+    root = indexer.meta["drives"][0]
+    fragments = indexer.row_fragments
+    assert search(query="report_03", fields="Name,RawSize").json() == [{"Name": "report_03.txt", "RawSize": 3}]
+    misses = fragments.misses
+    assert search(query="report_03", fields="Name,RawSize").json() == [{"Name": "report_03.txt", "RawSize": 3}]
+    assert fragments.misses == misses  # 第二次直接使用缓存的片段
+
+    indexer.apply_changes(upserts=[(os.path.join(root, "report_03.txt"), False, 42, 1)])
+    assert search(query="report_03", fields="Name,RawSize").json() == [{"Name": "report_03.txt", "RawSize": 42}]
+    assert fragments.misses == misses + 1
+    assert len(fragments) == 1  # 上一代的片段已清空
+
+
+def test_fragments_from_older_generation_are_not_cached(indexer):
+    store = indexer.store
+    fragments = json_rows.RowFragments()
+    assert fragments.encode(store, 5, [0, 1], ("Name",)) == [b'{"Name":"%s"}' % store.names[r].encode() for r in (0, 1)]
+    assert len(fragments) == 2
+
+    # 旧快照上的请求：不清空也不写入新一代的缓存
+    fragments.encode(store, 4, [2], ("Name",))
+    assert len(fragments) == 2 and fragments.stats()["misses"] == 3
+
+    fragments.encode(store, 6, [2], ("Name",))
+    assert len(fragments) == 1
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = SearchExecutor(workers=1, queue_size=1)
+    monkeypatch.setattr(file_search, "search_executor", executor)
+    yield executor
+    executor.shutdown()
+
+
+def test_overloaded_and_stopped(indexer, executor):
+    gate = threading.Event()
+    started = threading.Event()
+
+    def busy():
+        started.set()
+        gate.wait(5)
+
+    # 一个在执行、一个在排队：已达 workers + queue_size
+    running = [executor.submit(busy), executor.submit(gate.wait, 5)]
+    assert started.wait(5)
+    try:
+        r = search(query="report")
+        assert r.status_code == 429 and r.headers["retry-after"] == "1"
+        assert search(query="report", format="ndjson").status_code == 429
+        assert executor.stats()["rejected"] == 2
+    finally:
+        gate.set()
+    for future in running:
+        future.result(5)
+    assert search(query="report").status_code == 200
+
+    executor.shutdown()
+    assert search(query="report").status_code == 503
+
+
+class ExpiringDeadline(Deadline):
+    """第 after 次检查时到期（与真实时间无关，结果可重复）。"""
+
+    def __init__(self, after):
+        super().__init__()
+        self.after = after
+        self.checks = 0
+
+    def expired(self):
+        self.checks += 1
+        if self.checks >= self.after:
+            self.truncated = True
+            return True
+        return False
+
+
+def test_deadline_truncates(indexer, monkeypatch):
+    monkeypatch.setattr(DiskIndexer, "DEADLINE_CHUNK", 4)
+
+    # 开始匹配时未到期，校验完第一块后到期：只返回第一块中的命中
+    deadline = ExpiringDeadline(2)
+    page = indexer.search_page(SearchQuery("report", sort_by="name", reverse=False, limit=3), deadline)
+    assert page["truncated"] and page["total"] == 4 and page["next_cursor"] is None
+
+    # 不完整的结果不进入结果缓存
+    full = [r["Path"] for r in indexer.search("report", None, sort_by="name", reverse=False)]
+    assert len(full) == 20 and {r["Path"] for r in page["items"]} < set(full)
+
+    indexer.result_cache.clear()
+    monkeypatch.setattr(file_search, "Deadline", lambda timeout_ms: ExpiringDeadline(2 if timeout_ms else 1 << 30))
+    r = search(query="report", sort_by="name", limit=3, timeout_ms=5)
+    assert r.headers["x-search-truncated"] == "1"
+    assert r.json()["truncated"] is True and r.json()["total"] == 4
+    r = search(query="report", sort_by="name", timeout_ms=5, format="ndjson")
+    assert r.headers["x-search-truncated"] == "1" and len(r.text.splitlines()) == 4
+
+    r = search(query="report", sort_by="name", limit=3)
+    assert "x-search-truncated" not in r.headers and r.json()["total"] == 20
+
+    # 排队时已经到期：不做任何匹配
+    deadline = ExpiringDeadline(1)
+    assert indexer.search_page(SearchQuery("report_1"), deadline)["items"] == [] and deadline.truncated
+    assert len(indexer.search("report_1")) == 10
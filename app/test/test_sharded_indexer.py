@@ -0,0 +1,111 @@
+"""
+ShardedIndexer：两个根目录分成两个分片，与同一目录树上的单个 DiskIndexer 对比搜索结果
+（各分片 top-k 的 k 路归并、全局行号游标分页）、under= 范围搜索，以及只重载其中一个根目录。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+
+import pytest
+
+from app.core.kernel32_search import DiskIndexer
+from app.core.scanners import ScandirScanner
+from app.core.search_query import SearchQuery
+from app.core.sharded_indexer import ShardedIndexer
+
+NAMES = ["report.txt", "Report_2024.docx", "my report.pdf", "notes.txt", "report"]
+
+
+def write(path, data, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(data)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def roots(tmp_path):
+    """两个根目录下有同名文件；大小、修改时间各不相同，按时间 / 大小 / 相关度排序没有同分。"""
+    roots = [str(tmp_path / "a"), str(tmp_path / "b")]
+    n = 0
+    for root in roots:
+        for d in ["docs", "docs/archive", "misc"]:
+            for name in NAMES:
+                n += 1
+                write(os.path.join(root, d, name), "x" * n, 1_600_000_000 + 3600 * n)
+    return roots
+
+
+@pytest.fixture
+def indexers(roots, tmp_path):
+    single = DiskIndexer(
+        index_file=str(tmp_path / "single.idx"), scanner=ScandirScanner(roots), scan_workers=1,
+    )
+    sharded = ShardedIndexer(
+        index_file=str(tmp_path / "sharded.idx"), scanner=ScandirScanner(roots), scan_workers=1,
+    )
+    assert len(sharded.shards) == 2
+    return single, sharded
+
+
+def paths(items):
+    return [r["Path"] for r in items]
+
+
+def all_pages(indexer, query):
+    items, cursor = [], None
+    while True:
+        page = indexer.search_page(SearchQuery(**{**query, "cursor": cursor}))
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+@pytest.mark.parametrize("sort_by", ["time", "size", "name", "relevance"])
+@pytest.mark.parametrize("reverse", [True, False])
+def test_matches_single_indexer(indexers, sort_by, reverse):
+    single, sharded = indexers
+    for keywords in ["report", "txt", "report notes"]:
+        query = dict(keywords=keywords, sort_by=sort_by, reverse=reverse)
+        expected = single.search(**query)
+        items = sharded.search(**query)
+        assert len(items) == len(expected) > 0
+        if sort_by == "name":
+            # 同名条目之间按行号排序，两种索引的行号不同，只比较名称顺序和集合
+            assert [r["NameLC"] for r in items] == [r["NameLC"] for r in expected]
+            assert set(paths(items)) == set(paths(expected))
+        else:
+            assert paths(items) == paths(expected)
+
+        # 分页（游标中是全局行号）逐页取完与不分页一致
+        for limit in (1, 4, 7):
+            assert paths(all_pages(sharded, {**query, "limit": limit})) == paths(items)
+
+
+def test_under(indexers, roots):
+    single, sharded = indexers
+    for under in [roots[0], os.path.join(roots[1], "docs"), os.path.join(roots[1], "docs", "archive")]:
+        for keywords in ["report", ""]:
+            expected = single.search(keywords, None, under=under, sort_by="size")
+            items = sharded.search(keywords, None, under=under, sort_by="size")
+            assert paths(items) == paths(expected) and items
+            assert all(p.startswith(under + os.sep) for p in paths(items))
+            assert paths(all_pages(sharded, dict(keywords=keywords, under=under, sort_by="size", limit=3))) == paths(items)
+    assert sharded.search("report", None, under=os.path.join(roots[0], "missing")) == []
+
+
+def test_reload_one_root(indexers, roots):
+    _, sharded = indexers
+    generations = [shard.generation for shard in sharded.shards]
+    write(os.path.join(roots[0], "misc", "fresh_report.txt"), "y", 1_700_000_000)
+    write(os.path.join(roots[1], "misc", "other_report.txt"), "y", 1_700_000_000)
+
+    sharded.update_index(drives=[roots[0]])
+    assert [shard.generation for shard in sharded.shards] == [generations[0] + 1, generations[1]]
+    assert paths(sharded.search("fresh")) == [os.path.join(roots[0], "misc", "fresh_report.txt")]
+    assert sharded.search("other") == []
+
+    sharded.update_index()
+    assert paths(sharded.search("other")) == [os.path.join(roots[1], "misc", "other_report.txt")]
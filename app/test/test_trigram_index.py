@@ -0,0 +1,151 @@
+"""
+TrigramIndex 与整表子串扫描的结果对比：1~2 字符的短关键词、base（索引文件加载）+ delta（之后追加）
+的合并、clone 后的写时复制；以及 DiskIndexer 在 apply_changes、压缩之后的 and / or 搜索。
+
+用法：
+    python -m pytest -q app/test
+"""
+import os
+import random
+
+import numpy as np
+import pytest
+
+from app.core.kernel32_search import DiskIndexer
+from app.core.ngram_index import TrigramIndex
+from app.core.scanners import ScandirScanner
+
+ALPHABET = "abc_报告."  # 字符集小，短关键词的命中行多，也会出现重复的三元组
+
+
+def random_names(rng, n):
+    return ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 8))) for _ in range(n)]
+
+
+def all_keywords():
+    """所有 1~2 字符的关键词，加上若干 3~5 字符的。"""
+    rng = random.Random(1)
+    kws = set(ALPHABET) | {a + b for a in ALPHABET for b in ALPHABET}
+    kws |= {"".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 5))) for _ in range(200)}
+    return sorted(kws)
+
+
+def lookup(index, names, kw):
+    rows, verify = index.candidates(kw)
+    rows = rows.tolist()
+    assert rows == sorted(set(rows))
+    return {r for r in rows if not verify or kw in names[r]}
+
+
+def brute_force(names, kw):
+    return {i for i, name in enumerate(names) if kw in name}
+
+
+def check(index, names):
+    for kw in all_keywords():
+        assert lookup(index, names, kw) == brute_force(names, kw), kw
+        assert index.estimate(kw) >= len(lookup(index, names, kw))
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_brute_force(seed):
+    names = random_names(random.Random(seed), 400)
+    index = TrigramIndex()
+    for i, name in enumerate(names):
+        index.add(i, name)
+    check(index, names)
+
+
+def test_base_and_delta():
+    rng = random.Random(2)
+    names = random_names(rng, 300)
+    built = TrigramIndex()
+    for i, name in enumerate(names):
+        built.add(i, name)
+    # 从导出的数组加载为 base，之后追加的行进入 delta
+    index = TrigramIndex.from_arrays(built.to_arrays())
+    check(index, names)
+
+    for name in random_names(rng, 100):
+        index.add(len(names), name)
+        names.append(name)
+    check(index, names)
+
+    # clone 后在副本上追加，原索引的结果不变（短子串表已构建，新三元组也要登记）
+    before = list(names)
+    copy = index.clone()
+    for name in ["报告报告_x", "xyz", "a.b.c"]:
+        copy.add(len(names), name)
+        names.append(name)
+    check(copy, names)
+    check(index, before)
+    assert lookup(copy, names, "xy") == {len(names) - 2}
+    assert lookup(index, before, "xy") == set()
+
+    # base + delta 再导出、加载，结果不变
+    check(TrigramIndex.from_arrays(copy.to_arrays()), names)
+
+
+def test_whole():
+    names = ["report", "report.txt", "my_report", "report", "rep"]
+    index = TrigramIndex()
+    for i, name in enumerate(names):
+        index.add(i, name)
+    assert set(index.whole("report").tolist()) == {0, 3}
+    assert set(index.whole("rep").tolist()) == {4}
+    assert index.whole("missing").tolist() == []
+
+
+@pytest.fixture
+def indexer(tmp_path):
+    root = tmp_path / "root"
+    rng = random.Random(3)
+    for d in range(4):
+        os.makedirs(root / f"dir_{d}")
+        for name in set(random_names(rng, 60)):
+            (root / f"dir_{d}" / f"{name}.txt").write_text("x")
+    return DiskIndexer(
+        index_file=str(tmp_path / "index.idx"),
+        scanner=ScandirScanner([str(root)]),
+        scan_workers=1,
+        result_cache_bytes=0,
+    )
+
+
+def search_rows(indexer, keywords, mode):
+    return {r["Path"] for r in indexer.search(keywords, None, keyword_mode=mode)}
+
+
+def expected_rows(indexer, keywords, mode):
+    store = indexer.store
+    rows = np.flatnonzero(store.alive.values & ~store.is_dir.values)  # 不限分类时只搜索文件
+    names = store.names_lc.get_many(rows)
+    kws = keywords.split()
+    match = all if mode == "and" else any
+    hits = [r for r, name in zip(rows.tolist(), names) if match(k in name for k in kws)]
+    return {r["Path"] for r in store.records(hits)}
+
+
+QUERIES = ["a", "报", "_b", "告.", "abc", "a_b c", "报告 a", "txt", "c. 报 _"]
+
+
+def check_searches(indexer):
+    for keywords in QUERIES:
+        for mode in ("or", "and"):
+            assert search_rows(indexer, keywords, mode) == expected_rows(indexer, keywords, mode), (keywords, mode)
+
+
+def test_indexer_matches_brute_force(indexer):
+    check_searches(indexer)
+
+    root = indexer.meta["drives"][0]
+    rng = random.Random(4)
+    upserts = [(os.path.join(root, "dir_0", f"new_{name}"), False, 1, 1000) for name in set(random_names(rng, 50))]
+    upserts.append((os.path.join(root, "报告_dir"), True, 0, 1000))
+    upserts.append((os.path.join(root, "报告_dir", "abc报告.txt"), False, 1, 1000))
+    indexer.apply_changes(upserts=upserts, deletes=[os.path.join(root, "dir_1")])
+    check_searches(indexer)
+
+    indexer.compact()
+    assert indexer.store.dead_count == 0
+    check_searches(indexer)